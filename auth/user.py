@@ -1,6 +1,9 @@
 import requests
 import streamlit as st
 
+# Sessão HTTP do módulo: reaproveita a conexão com a API entre as chamadas
+sessao = requests.Session()
+
 
 def authenticate_user(cpf, senha):
     """
@@ -15,7 +18,7 @@ def authenticate_user(cpf, senha):
         None caso contrário.
     """
     try:
-        response = requests.post(
+        response = sessao.post(
             "https://vs15-internet-banking-back.onrender.com/auth",
             json={"cpf": cpf, "senha": senha},
         )
@@ -42,7 +45,7 @@ def get_logged_user():
     try:
         token = st.session_state.get("token")
         headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(
+        response = sessao.get(
             "https://vs15-internet-banking-back.onrender.com/conta/logado",
             headers=headers,
         )
@@ -65,7 +68,7 @@ def get_user_cpf():
             return None
 
         headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(
+        response = sessao.get(
             "https://vs15-internet-banking-back.onrender.com/conta/logado",
             headers=headers,
         )
@@ -115,7 +118,7 @@ def get_user_data_by_cpf(cpf):
 
         # Tentar obter dados diretamente da conta logada primeiro para obter o CPF
         try:
-            response_conta = requests.get(
+            response_conta = sessao.get(
                 "https://vs15-internet-banking-back.onrender.com/conta/logado",
                 headers=headers,
             )
@@ -0,0 +1,316 @@
+"""
+Avaliação vetorizada das carteiras de investimento.
+
+Recebe as posições de fundos, criptomoedas e ações (como retornadas por
+`db.db.get_carteira`) e um snapshot de cotações, e calcula de uma vez, com
+operações sobre colunas inteiras, se cada posição está ativa, o valor atual
+(juros compostos para fundos e preço de mercado para criptos e ações), a
+rentabilidade e a alocação por perfil de risco. Não depende do Streamlit nem do
+banco, então pode ser usada pelas páginas, pelo ETL e por rotinas em lote.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from etl.cotacoes import simbolo_acao, simbolo_cripto
+
+# Perfis de risco na ordem exibida nas páginas
+PERFIS_RISCO = ["BAIXO", "MODERADO", "ALTO"]
+
+# Percentual ideal de cada perfil de risco por perfil de investidor
+ALOCACAO_IDEAL = {
+    "CONSERVADOR": [70, 30, 0],
+    "MODERADO": [40, 50, 10],
+    "ARROJADO": [20, 30, 50],
+}
+
+# Colunas do DataFrame de investimentos usado pelas páginas
+COLUNAS_INVESTIMENTOS = [
+    "id",
+    "nome",
+    "tipo",
+    "valor_investido",
+    "valor_atual",
+    "perfil_risco",
+    "rentabilidade",
+    "data_aplicacao",
+]
+
+_ORDEM_TIPOS = {"Fundo": 0, "Cripto": 1, "Ações": 2}
+
+# Resultado da avaliação: as posições ativas de cada tipo, já avaliadas, o
+# DataFrame consolidado de investimentos e os símbolos que ficaram sem cotação
+CarteiraAvaliada = namedtuple(
+    "CarteiraAvaliada", ["fundos", "criptos", "acoes", "investimentos", "sem_cotacao"]
+)
+
+
+def numeros(serie):
+    """Converte uma coluna em um array float64 (valores inválidos viram NaN)."""
+    return pd.to_numeric(serie, errors="coerce").astype("float64").to_numpy()
+
+
+def dividir(numerador, denominador, padrao):
+    """Divide elemento a elemento, usando `padrao` onde o denominador não é positivo."""
+    numerador = np.broadcast_to(np.asarray(numerador, dtype="float64"), denominador.shape)
+    padrao = np.broadcast_to(np.asarray(padrao, dtype="float64"), denominador.shape)
+    positivo = denominador > 0
+    return np.divide(numerador, denominador, out=padrao.copy(), where=positivo)
+
+
+def posicoes_ativas(df, agora=None):
+    """
+    Indica as posições ativas (sem data de encerramento ou encerradas no futuro).
+
+    Returns:
+        ndarray: Máscara booleana com uma entrada por linha de `df`.
+    """
+    if "data_encerramento" not in df.columns:
+        return np.ones(len(df), dtype=bool)
+    agora = pd.Timestamp(agora or datetime.now())
+    encerramento = pd.to_datetime(df["data_encerramento"], errors="coerce")
+    return (encerramento.isna() | (encerramento > agora)).to_numpy()
+
+
+def meses_decorridos(datas, agora=None):
+    """Retorna os meses de calendário entre cada data e `agora` (como no cálculo dos fundos)."""
+    agora = pd.Timestamp(agora or datetime.now())
+    datas = pd.to_datetime(datas, errors="coerce")
+    return ((agora.year - datas.dt.year) * 12 + agora.month - datas.dt.month).to_numpy(dtype="float64")
+
+
+def avaliar_fundos(df_fundos, agora=None):
+    """
+    Avalia os fundos ativos com juros compostos pela rentabilidade mensal.
+
+    Returns:
+        DataFrame: Fundos ativos com 'valor_investido', 'valor_atual' e
+        'rentabilidade' (a rentabilidade mensal do fundo).
+    """
+    df = df_fundos[posicoes_ativas(df_fundos, agora)].copy()
+    valor_investido = numeros(df["valor_investido"])
+    rentabilidade = numeros(df["rentabilidade"])
+
+    df["valor_investido"] = valor_investido
+    df["rentabilidade"] = rentabilidade
+    df["valor_atual"] = valor_investido * (1 + rentabilidade) ** meses_decorridos(
+        df["data_aplicacao"], agora
+    )
+    return df
+
+
+def avaliar_criptos(df_criptos, cotacoes, taxa_usdbrl, agora=None):
+    """
+    Avalia as criptomoedas ativas pela cotação em dólar convertida para real.
+
+    Args:
+        df_criptos (DataFrame): Posições com 'nome', 'valor_investido' e 'preco_compra' (em R$).
+        cotacoes (dict): Símbolo do Yahoo Finance -> preço em US$.
+        taxa_usdbrl (float): Cotação do dólar em reais.
+
+    Returns:
+        DataFrame: Criptos ativas com as colunas de `etl.criptomoedas.get_current_prices`
+        ('preco_atual_us', 'preco_atual_br', 'preco_compra_br', 'valor_investido_br',
+        'variacao_percentual_br') e 'valor_atual' e 'rentabilidade'. Criptos sem
+        cotação ficam com os preços e a variação em NaN e valem o valor investido.
+    """
+    df = df_criptos[posicoes_ativas(df_criptos, agora)].copy()
+    simbolos = df["nome"].map(simbolo_cripto)
+
+    df["preco_atual_us"] = numeros(simbolos.map(cotacoes))
+    df["preco_atual_br"] = df["preco_atual_us"].to_numpy() * taxa_usdbrl
+    df["preco_compra_br"] = numeros(df["preco_compra"])
+    df["valor_investido_br"] = numeros(df["valor_investido"])
+
+    preco_atual = df["preco_atual_br"].to_numpy()
+    preco_compra = df["preco_compra_br"].to_numpy()
+    valor_investido = df["valor_investido_br"].to_numpy()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["variacao_percentual_br"] = np.round((preco_atual - preco_compra) / preco_compra * 100, 2)
+    df["valor_investido"] = valor_investido
+    # Sem preço de compra ou sem cotação, o valor atual é o próprio valor investido
+    # (como em carteira.nav)
+    cotada = ~np.isnan(preco_atual)
+    df["valor_atual"] = np.where(
+        cotada, dividir(valor_investido * preco_atual, preco_compra, valor_investido), valor_investido
+    )
+    df["rentabilidade"] = np.where(cotada, dividir(preco_atual, preco_compra, 1.0) - 1, 0.0)
+    return df
+
+
+def avaliar_acoes(df_acoes, cotacoes, agora=None):
+    """
+    Avalia as ações ativas pela cotação em reais.
+
+    Args:
+        df_acoes (DataFrame): Posições com 'nome', 'quantidade' e 'preco_inicial'.
+        cotacoes (dict): Símbolo do Yahoo Finance -> preço em R$.
+
+    Returns:
+        DataFrame: Ações ativas com as colunas de `etl.acoes.get_current_prices_acoes`
+        ('preco_atual_br', 'preco_compra_br', 'variacao_percentual_br',
+        'valor_investido_br') e 'valor_investido', 'valor_atual' e 'rentabilidade'.
+        Ações sem cotação ficam com o preço e a variação em NaN e valem o preço de
+        compra.
+    """
+    df = df_acoes[posicoes_ativas(df_acoes, agora)].copy()
+    simbolos = df["nome"].map(simbolo_acao)
+
+    quantidade = numeros(df["quantidade"])
+    preco_compra = numeros(df["preco_inicial"])
+    preco_atual = numeros(simbolos.map(cotacoes))
+
+    df["preco_atual_br"] = preco_atual
+    df["preco_compra_br"] = preco_compra
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["variacao_percentual_br"] = np.round((preco_atual - preco_compra) / preco_compra * 100, 2)
+    df["valor_investido_br"] = quantidade * preco_compra
+    df["valor_investido"] = quantidade * preco_compra
+    # Sem cotação, a ação vale o preço de compra (como em carteira.nav)
+    cotada = ~np.isnan(preco_atual)
+    df["valor_atual"] = quantidade * np.where(cotada, preco_atual, preco_compra)
+    df["rentabilidade"] = np.where(cotada, dividir(preco_atual, preco_compra, 1.0) - 1, 0.0)
+    return df
+
+
+def simbolos_sem_cotacao(criptos, acoes):
+    """Retorna os símbolos (ou nomes, se não houver símbolo) das posições avaliadas sem cotação."""
+    nomes = pd.concat(
+        [
+            criptos["nome"].map(simbolo_cripto)[criptos["preco_atual_us"].isna()],
+            acoes["nome"].map(simbolo_acao).fillna(acoes["nome"])[acoes["preco_atual_br"].isna()],
+        ]
+    )
+    return sorted(set(nomes.dropna()))
+
+
+def simbolos_da_carteira(df_criptos, df_acoes):
+    """Retorna os símbolos do Yahoo Finance que precisam de cotação para avaliar a carteira."""
+    simbolos = set(df_criptos["nome"].map(simbolo_cripto)) | set(df_acoes["nome"].map(simbolo_acao))
+    return sorted(s for s in simbolos if isinstance(s, str) and s)
+
+
+def _investimentos(df, tipo, coluna_id):
+    saida = pd.DataFrame(
+        {
+            "id": df[coluna_id].to_numpy(),
+            "nome": df["nome"].to_numpy(),
+            "tipo": tipo,
+            "valor_investido": df["valor_investido"].to_numpy(),
+            "valor_atual": df["valor_atual"].to_numpy(),
+            "perfil_risco": df["perfil_risco"].to_numpy(),
+            "rentabilidade": df["rentabilidade"].to_numpy(),
+            "data_aplicacao": df["data_aplicacao"].to_numpy(),
+        }
+    )
+    # Ordem das posições: conta, investimento, tipo e ordem original
+    for coluna in ("id_conta", "id_investimento"):
+        saida[f"_{coluna}"] = df[coluna].to_numpy() if coluna in df.columns else 0
+    saida["_tipo"] = _ORDEM_TIPOS[tipo]
+    saida["_linha"] = np.arange(len(df))
+    return saida
+
+
+def avaliar_posicoes(df_fundos, df_criptos, df_acoes, cotacoes, taxa_usdbrl, agora=None):
+    """
+    Avalia todas as posições ativas de uma carteira.
+
+    Args:
+        df_fundos (DataFrame): Fundos (colunas de fundoinvestimento).
+        df_criptos (DataFrame): Criptomoedas (colunas de investimentos_cripto).
+        df_acoes (DataFrame): Ações (colunas de acoes).
+        cotacoes (dict): Símbolo -> preço (criptos em US$, ações em R$).
+        taxa_usdbrl (float): Cotação do dólar em reais.
+        agora (datetime, optional): Data de referência. Padrão: agora.
+
+    Returns:
+        CarteiraAvaliada: Fundos, criptos e ações ativos avaliados (como em
+        `avaliar_fundos`, `avaliar_criptos` e `avaliar_acoes`), o DataFrame
+        consolidado de investimentos (ver `avaliar_carteira`) e a lista dos
+        símbolos sem cotação (avaliados pelo preço de compra).
+    """
+    agora = agora or datetime.now()
+    fundos = avaliar_fundos(df_fundos, agora)
+    criptos = avaliar_criptos(df_criptos, cotacoes, taxa_usdbrl, agora)
+    acoes = avaliar_acoes(df_acoes, cotacoes, agora)
+
+    partes = [
+        _investimentos(fundos, "Fundo", "id_fundo"),
+        _investimentos(criptos, "Cripto", "id_cripto"),
+        _investimentos(acoes, "Ações", "id_acoes"),
+    ]
+    partes = [parte for parte in partes if not parte.empty]
+    if partes:
+        investimentos = pd.concat(partes, ignore_index=True)
+        investimentos = investimentos.sort_values(
+            ["_id_conta", "_id_investimento", "_tipo", "_linha"], kind="stable"
+        )
+        investimentos = investimentos[COLUNAS_INVESTIMENTOS].reset_index(drop=True)
+    else:
+        investimentos = pd.DataFrame(columns=COLUNAS_INVESTIMENTOS)
+
+    sem_cotacao = simbolos_sem_cotacao(criptos, acoes)
+    if sem_cotacao:
+        print(f"Sem cotação para {sem_cotacao}; avaliados pelo preço de compra")
+
+    return CarteiraAvaliada(fundos, criptos, acoes, investimentos, sem_cotacao)
+
+
+def avaliar_carteira(df_fundos, df_criptos, df_acoes, cotacoes, taxa_usdbrl, agora=None):
+    """
+    Avalia todas as posições ativas de uma carteira.
+
+    Args:
+        Os mesmos de `avaliar_posicoes`.
+
+    Returns:
+        DataFrame: Uma linha por posição ativa com as colunas `COLUNAS_INVESTIMENTOS`,
+        ordenada por conta, investimento e tipo (fundos, criptos e ações).
+    """
+    return avaliar_posicoes(df_fundos, df_criptos, df_acoes, cotacoes, taxa_usdbrl, agora).investimentos
+
+
+def calcular_alocacao(df_investimentos, coluna="valor_investido"):
+    """
+    Calcula a alocação por perfil de risco.
+
+    Args:
+        df_investimentos (DataFrame): Resultado de `avaliar_carteira`.
+        coluna (str): 'valor_investido' ou 'valor_atual'.
+
+    Returns:
+        DataFrame: Colunas 'perfil_risco', 'valor_investido' (soma de `coluna`) e
+        'percentual'.
+    """
+    alocacao = (
+        df_investimentos.groupby("perfil_risco")[coluna]
+        .sum()
+        .reset_index()
+        .rename(columns={coluna: "valor_investido"})
+    )
+    total = alocacao["valor_investido"].sum()
+    alocacao["percentual"] = (alocacao["valor_investido"] / total) * 100
+    return alocacao
+
+
+def calcular_alocacao_ideal(perfil, total_investido):
+    """
+    Calcula a alocação ideal por perfil de risco para o perfil do investidor.
+
+    Perfis desconhecidos usam a alocação do perfil ARROJADO.
+
+    Returns:
+        DataFrame: Colunas 'perfil_risco', 'percentual' e 'valor_investido'.
+    """
+    percentuais = ALOCACAO_IDEAL.get(perfil, ALOCACAO_IDEAL["ARROJADO"])
+    return pd.DataFrame(
+        {
+            "perfil_risco": PERFIS_RISCO,
+            "percentual": percentuais,
+            "valor_investido": [total_investido * (percentual / 100) for percentual in percentuais],
+        }
+    )
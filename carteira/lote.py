@@ -0,0 +1,300 @@
+"""
+Avaliação em lote das carteiras de todos os clientes
+
+Percorre as contas com investimentos em páginas de `CARTEIRA_LOTE_CONTAS` contas
+(padrão 500), carrega as posições de cada página com `get_carteira` e avalia as
+páginas em paralelo em `CARTEIRA_LOTE_PROCESSOS` processos (padrão: número de
+CPUs). As cotações e a taxa de câmbio são obtidas uma única vez, para todos os
+ativos mantidos nas carteiras, e compartilhadas por todos os processos, de modo
+que todas as contas são avaliadas com os mesmos preços.
+
+O snapshot é conferido com os ativos em carteira: se nenhum ativo foi cotado (a
+fonte está fora do ar), a execução é interrompida sem gravar nada; se faltarem
+apenas alguns, as contas com posições nesses ativos não são gravadas, para que
+uma falha da fonte não vire avaliações com o valor atual errado. Os símbolos sem
+cotação e as contas ignoradas aparecem no resumo da execução.
+
+Para cada conta são gravados em avaliacao_carteira o total investido e o atual,
+a alocação por perfil de risco (percentual do valor atual), a alocação ideal do
+perfil do investidor (`calcular_alocacao_ideal`) e o desvio entre as duas.
+
+O acesso ao banco fica no processo principal; os processos de avaliação recebem
+as posições já carregadas e devolvem os resultados.
+
+Uso:
+    python -m carteira.lote                  avalia e grava todas as contas
+    python -m carteira.lote --sem-gravar     apenas exibe o resumo
+    python -m carteira.lote --processos 0    avalia no próprio processo
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from carteira.avaliacao import PERFIS_RISCO, avaliar_posicoes, calcular_alocacao_ideal
+
+TAMANHO_LOTE = int(os.getenv("CARTEIRA_LOTE_CONTAS", "500"))
+PROCESSOS = int(os.getenv("CARTEIRA_LOTE_PROCESSOS", str(os.cpu_count() or 1)))
+
+# Perfil usado para contas sem perfil de investimento (o mesmo da página)
+PERFIL_PADRAO = "CONSERVADOR"
+
+COLUNAS_RESULTADO = (
+    ["data_referencia", "id_conta", "perfil_invest", "posicoes", "total_investido", "total_atual", "rentabilidade"]
+    + [f"percentual_{perfil.lower()}" for perfil in PERFIS_RISCO]
+    + [f"ideal_{perfil.lower()}" for perfil in PERFIS_RISCO]
+    + [f"desvio_{perfil.lower()}" for perfil in PERFIS_RISCO]
+    + ["desvio_maximo"]
+)
+
+# Snapshot de cotações do processo de avaliação (definido por _inicializar_processo)
+_snapshot = None
+
+
+def obter_snapshot_cotacoes():
+    """
+    Obtém as cotações de todos os ativos mantidos nas carteiras e a taxa USD/BRL
+
+    Returns:
+        tuple: (cotacoes, taxa_usdbrl, sem_cotacao), com cotacoes no formato
+        símbolo -> preço e sem_cotacao a lista ordenada dos ativos em carteira que
+        ficaram sem cotação (o símbolo, ou o nome se o ativo não tem símbolo).
+    """
+    from db.db import get_nomes_em_carteira
+    from etl.cambio import get_usdbrl_rate
+    from etl.cotacoes import obter_cotacoes, simbolo_acao, simbolo_cripto
+
+    nomes = get_nomes_em_carteira()
+    simbolos = pd.concat(
+        [
+            nomes.loc[nomes["classe"] == "cripto", "nome"].map(simbolo_cripto),
+            nomes.loc[nomes["classe"] == "acoes", "nome"].map(simbolo_acao),
+        ]
+    )
+    # Ativos sem símbolo mapeado também ficam sem cotação (identificados pelo nome)
+    simbolos = simbolos.fillna(nomes["nome"])
+
+    cotacoes = obter_cotacoes(set(simbolos))
+    sem_cotacao = sorted(set(simbolos) - set(cotacoes))
+    return cotacoes, get_usdbrl_rate(), sem_cotacao
+
+
+def _inicializar_processo(cotacoes, taxa_usdbrl, agora):
+    global _snapshot
+    _snapshot = (cotacoes, taxa_usdbrl, agora)
+
+
+def _alocacao_ideal_por_perfil(perfis):
+    """Percentuais ideais (linhas: perfil do investidor; colunas: perfil de risco)."""
+    return pd.DataFrame(
+        {
+            perfil: calcular_alocacao_ideal(perfil, 1.0).set_index("perfil_risco")["percentual"]
+            for perfil in perfis
+        }
+    ).T.reindex(columns=PERFIS_RISCO).astype("float64")
+
+
+def avaliar_contas(ids_conta, carteira, cotacoes, taxa_usdbrl, agora):
+    """
+    Avalia um lote de contas com operações sobre o lote inteiro
+
+    Args:
+        ids_conta (list): Contas do lote (contas sem posições ativas também
+            aparecem no resultado, com totais zerados; contas com posições ativas
+            sem cotação ficam de fora).
+        carteira (dict): Resultado de `get_carteira` para as contas.
+        cotacoes (dict): Símbolo -> preço.
+        taxa_usdbrl (float): Cotação do dólar em reais.
+        agora (datetime): Data de referência da avaliação.
+
+    Returns:
+        DataFrame: Uma linha por conta avaliada com as colunas `COLUNAS_RESULTADO`.
+    """
+    avaliada = avaliar_posicoes(
+        carteira["fundos"], carteira["criptos"], carteira["acoes"], cotacoes, taxa_usdbrl, agora
+    )
+    # Contas com alguma posição sem cotação (avaliada pelo preço de compra)
+    sem_cotacao = set(avaliada.criptos.loc[avaliada.criptos["preco_atual_us"].isna(), "id_conta"])
+    sem_cotacao |= set(avaliada.acoes.loc[avaliada.acoes["preco_atual_br"].isna(), "id_conta"])
+
+    posicoes = pd.concat(
+        [
+            df[["id_conta", "perfil_risco", "valor_investido", "valor_atual"]]
+            for df in (avaliada.fundos, avaliada.criptos, avaliada.acoes)
+        ],
+        ignore_index=True,
+    )
+    ids_conta = pd.Index(ids_conta, name="id_conta")
+
+    totais = posicoes.groupby("id_conta").agg(
+        posicoes=("valor_atual", "size"),
+        total_investido=("valor_investido", "sum"),
+        total_atual=("valor_atual", "sum"),
+    )
+    totais = totais.reindex(ids_conta, fill_value=0)
+
+    # Valor atual por perfil de risco -> percentual do valor atual da conta
+    por_perfil = posicoes.pivot_table(
+        index="id_conta", columns="perfil_risco", values="valor_atual", aggfunc="sum", fill_value=0.0
+    ).reindex(index=ids_conta, columns=PERFIS_RISCO, fill_value=0.0)
+    total_atual = totais["total_atual"].to_numpy(dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percentual = por_perfil.to_numpy() / total_atual[:, None] * 100
+    percentual[total_atual <= 0] = np.nan
+
+    # Perfil do investidor: o do primeiro investimento da conta
+    perfis = (
+        carteira["investimentos"]
+        .drop_duplicates("id_conta")
+        .set_index("id_conta")["perfil_invest"]
+        .reindex(ids_conta)
+        .fillna(PERFIL_PADRAO)
+    )
+    ideal = _alocacao_ideal_por_perfil(perfis.unique()).loc[perfis].to_numpy()
+    desvio = percentual - ideal
+
+    resultado = pd.DataFrame(
+        {
+            "data_referencia": pd.Timestamp(agora).date(),
+            "id_conta": ids_conta.to_numpy(),
+            "perfil_invest": perfis.to_numpy(),
+            "posicoes": totais["posicoes"].to_numpy(dtype="int64"),
+            "total_investido": totais["total_investido"].to_numpy(dtype="float64").round(2),
+            "total_atual": total_atual.round(2),
+        }
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        resultado["rentabilidade"] = np.where(
+            resultado["total_investido"] > 0,
+            resultado["total_atual"] / resultado["total_investido"] - 1,
+            np.nan,
+        )
+    for indice, perfil in enumerate(PERFIS_RISCO):
+        resultado[f"percentual_{perfil.lower()}"] = percentual[:, indice]
+        resultado[f"ideal_{perfil.lower()}"] = ideal[:, indice]
+        resultado[f"desvio_{perfil.lower()}"] = desvio[:, indice]
+    resultado["desvio_maximo"] = np.abs(desvio).max(axis=1)
+    resultado = resultado[~resultado["id_conta"].isin(sem_cotacao)]
+    return resultado[COLUNAS_RESULTADO].reset_index(drop=True)
+
+
+def _avaliar_lote(ids_conta, carteira):
+    cotacoes, taxa_usdbrl, agora = _snapshot
+    return ids_conta, avaliar_contas(ids_conta, carteira, cotacoes, taxa_usdbrl, agora)
+
+
+def lotes_de_contas(tamanho_lote=TAMANHO_LOTE):
+    """Percorre as contas com investimentos, retornando listas de até `tamanho_lote` IDs."""
+    from db.db import get_ids_contas_com_investimentos
+
+    ultimo = 0
+    while True:
+        ids_conta = get_ids_contas_com_investimentos(ultimo, tamanho_lote)["id_conta"].tolist()
+        if not ids_conta:
+            return
+        yield ids_conta
+        ultimo = ids_conta[-1]
+
+
+def avaliar_todas_as_contas(tamanho_lote=TAMANHO_LOTE, processos=PROCESSOS, gravar=True):
+    """
+    Avalia as carteiras de todas as contas e grava os resultados
+
+    Enquanto os processos avaliam os lotes, o processo principal já carrega os
+    próximos (no máximo dois lotes por processo ficam pendentes). Se nenhum ativo
+    em carteira foi cotado, nada é avaliado nem gravado; contas com posições em
+    ativos sem cotação não são gravadas.
+
+    Args:
+        tamanho_lote (int): Contas por lote.
+        processos (int): Processos de avaliação (0 avalia no próprio processo).
+        gravar (bool): Se True, grava os resultados em avaliacao_carteira.
+
+    Returns:
+        DataFrame: Resultados das contas avaliadas, ordenados por id_conta.
+    """
+    from db.db import get_carteira, salvar_avaliacoes_carteira
+
+    inicio = time.perf_counter()
+    agora = datetime.now()
+    cotacoes, taxa_usdbrl, sem_cotacao = obter_snapshot_cotacoes()
+    print(f"{len(cotacoes)} cotações obtidas; USD/BRL {taxa_usdbrl:.4f}.")
+    if sem_cotacao:
+        print(f"Sem cotação para {len(sem_cotacao)} ativos: {sem_cotacao}")
+        if not cotacoes:
+            print("Nenhum ativo em carteira foi cotado; avaliação interrompida sem gravar resultados.")
+            return pd.DataFrame(columns=COLUNAS_RESULTADO)
+
+    resultados = []
+    ignoradas = []
+
+    def concluir(lote):
+        ids_conta, resultado = lote
+        if gravar:
+            salvar_avaliacoes_carteira(resultado)
+        resultados.append(resultado)
+        ignoradas.append(len(ids_conta) - len(resultado))
+
+    if processos <= 0:
+        _inicializar_processo(cotacoes, taxa_usdbrl, agora)
+        for ids_conta in lotes_de_contas(tamanho_lote):
+            concluir(_avaliar_lote(ids_conta, get_carteira(ids_conta=ids_conta)))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=processos,
+            initializer=_inicializar_processo,
+            initargs=(cotacoes, taxa_usdbrl, agora),
+        ) as executor:
+            pendentes = set()
+            for ids_conta in lotes_de_contas(tamanho_lote):
+                if len(pendentes) >= 2 * processos:
+                    concluidos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                    for futuro in concluidos:
+                        concluir(futuro.result())
+                pendentes.add(
+                    executor.submit(_avaliar_lote, ids_conta, get_carteira(ids_conta=ids_conta))
+                )
+            for futuro in wait(pendentes).done:
+                concluir(futuro.result())
+
+    if resultados:
+        df_resultados = pd.concat(resultados, ignore_index=True).sort_values("id_conta", ignore_index=True)
+    else:
+        df_resultados = pd.DataFrame(columns=COLUNAS_RESULTADO)
+
+    print(
+        f"{len(df_resultados)} contas avaliadas em {time.perf_counter() - inicio:.1f}s"
+        f"{' e gravadas em avaliacao_carteira' if gravar else ''}."
+    )
+    if sum(ignoradas):
+        print(f"{sum(ignoradas)} contas ignoradas por terem posições sem cotação: {sem_cotacao}")
+    return df_resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Avaliação em lote das carteiras de todos os clientes")
+    parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE, help="Contas por lote")
+    parser.add_argument(
+        "--processos", type=int, default=PROCESSOS, help="Processos de avaliação (0: no próprio processo)"
+    )
+    parser.add_argument("--sem-gravar", action="store_true", help="Não grava os resultados no banco")
+    parser.add_argument(
+        "--maiores-desvios", type=int, default=10, help="Quantidade de contas exibidas no resumo"
+    )
+    args = parser.parse_args()
+
+    df_resultados = avaliar_todas_as_contas(args.tamanho_lote, args.processos, not args.sem_gravar)
+    if not df_resultados.empty:
+        print(f"Total investido: R$ {df_resultados['total_investido'].sum():,.2f}")
+        print(f"Total atual: R$ {df_resultados['total_atual'].sum():,.2f}")
+        print("Contas com maior desvio da alocação ideal (pontos percentuais):")
+        print(
+            df_resultados.nlargest(args.maiores_desvios, "desvio_maximo")[
+                ["id_conta", "perfil_invest", "total_atual", "desvio_baixo", "desvio_moderado", "desvio_alto"]
+            ].to_string(index=False)
+        )
@@ -0,0 +1,229 @@
+"""
+Evolução diária do patrimônio das carteiras.
+
+Monta, para as posições de fundos, criptomoedas e ações de uma carteira (como
+retornadas por `db.db.get_carteira`), o valor de cada dia desde a primeira
+aplicação, usando o histórico de preços gravado pelo ETL (`etl.armazenamento`):
+
+- fundos: juros compostos pela rentabilidade mensal, pelos meses de calendário
+  decorridos (o mesmo cálculo de `carteira.avaliacao`);
+- criptomoedas: preço de fechamento em US$ convertido pela cotação USD/BRL do dia;
+- ações: quantidade x preço de fechamento.
+
+Os preços de cada dia são obtidos por junção "as-of" (o último fechamento até a
+data, com `searchsorted` sobre as datas ordenadas de cada ativo), formando uma
+matriz ativo x dia. O valor das posições é calculado sobre a matriz posição x dia
+de uma vez, sem laços por dia. Cada posição conta do dia da aplicação até o dia
+anterior ao encerramento. Ativos sem histórico até a data usam o preço de compra.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from carteira.avaliacao import dividir, numeros
+from etl.armazenamento import ler_historico
+from etl.cambio import TAXA_USDBRL_PADRAO
+from etl.cotacoes import SIMBOLOS_CRIPTO, simbolo_acao, simbolo_cripto
+
+COLUNAS_PATRIMONIO = ["fundos", "criptos", "acoes", "patrimonio", "investido"]
+
+
+def simbolo_historico_cripto(nome):
+    """Retorna o símbolo de uma criptomoeda do banco no histórico (ex.: 'BTC')."""
+    if nome in {simbolo.replace("-USD", "") for simbolo in SIMBOLOS_CRIPTO.values()}:
+        return nome
+    return simbolo_cripto(nome).replace("-USD", "")
+
+
+def simbolo_historico_acao(nome):
+    """Retorna o símbolo de uma ação do banco no histórico (o ticker sem '.SA')."""
+    simbolo = simbolo_acao(nome)
+    return simbolo[: -len(".SA")] if simbolo else nome
+
+
+def precos_na_data(historico, simbolos, datas):
+    """
+    Alinha o histórico de preços às datas com junção as-of.
+
+    Args:
+        historico (DataFrame): Colunas 'Data', 'Simbolo' e 'Preco'.
+        simbolos (list): Símbolos das linhas da matriz.
+        datas (DatetimeIndex): Datas das colunas da matriz, em ordem.
+
+    Returns:
+        ndarray: Matriz (símbolos x datas) com o último preço até cada data, ou
+        NaN se o símbolo ainda não tinha preço.
+    """
+    precos = np.full((len(simbolos), len(datas)), np.nan)
+    if historico.empty:
+        return precos
+
+    historico = historico.dropna(subset=["Preco"]).sort_values(["Simbolo", "Data"], kind="stable")
+    dias = datas.to_numpy(dtype="datetime64[ns]")
+    grupos = historico.groupby("Simbolo", sort=False).indices
+    datas_historico = historico["Data"].to_numpy(dtype="datetime64[ns]")
+    precos_historico = historico["Preco"].to_numpy(dtype="float64")
+
+    for linha, simbolo in enumerate(simbolos):
+        posicoes = grupos.get(simbolo)
+        if posicoes is None:
+            continue
+        indice = np.searchsorted(datas_historico[posicoes], dias, side="right") - 1
+        encontrado = indice >= 0
+        precos[linha, encontrado] = precos_historico[posicoes][indice[encontrado]]
+    return precos
+
+
+def _janela_ativa(df, datas):
+    """Matriz (posições x datas) indicando os dias em que cada posição estava aplicada."""
+    dias = datas.to_numpy(dtype="datetime64[ns]")
+    aplicacao = pd.to_datetime(df["data_aplicacao"], errors="coerce").dt.normalize()
+    ativa = dias[None, :] >= aplicacao.to_numpy(dtype="datetime64[ns]")[:, None]
+    if "data_encerramento" in df.columns:
+        encerramento = pd.to_datetime(df["data_encerramento"], errors="coerce").dt.normalize()
+        encerramento = encerramento.to_numpy(dtype="datetime64[ns]")[:, None]
+        ativa &= np.isnat(encerramento) | (dias[None, :] < encerramento)
+    return ativa
+
+
+def _valor_fundos(df, datas):
+    if df.empty:
+        return np.zeros((0, len(datas)))
+    aplicacao = pd.to_datetime(df["data_aplicacao"], errors="coerce")
+    meses = (
+        (datas.year.to_numpy()[None, :] - aplicacao.dt.year.to_numpy()[:, None]) * 12
+        + datas.month.to_numpy()[None, :]
+        - aplicacao.dt.month.to_numpy()[:, None]
+    )
+    valor_investido = numeros(df["valor_investido"])[:, None]
+    rentabilidade = numeros(df["rentabilidade"])[:, None]
+    return valor_investido * (1 + rentabilidade) ** meses
+
+
+def _valor_criptos(df, datas, historico, cambio):
+    if df.empty:
+        return np.zeros((0, len(datas)))
+    simbolos = df["nome"].map(simbolo_historico_cripto)
+    distintos = sorted(set(simbolos))
+    precos_us = precos_na_data(historico, distintos, datas)[
+        pd.Index(distintos).get_indexer(simbolos)
+    ]
+
+    valor_investido = numeros(df["valor_investido"])[:, None]
+    preco_compra = numeros(df["preco_compra"])[:, None]
+    preco_br = precos_us * cambio[None, :]
+    # Sem preço no dia (ou sem preço de compra), a posição vale o valor investido
+    valor = dividir(valor_investido * preco_br, np.broadcast_to(preco_compra, preco_br.shape), valor_investido)
+    return np.where(np.isnan(valor), valor_investido, valor)
+
+
+def _valor_acoes(df, datas, historico):
+    if df.empty:
+        return np.zeros((0, len(datas)))
+    simbolos = df["nome"].map(simbolo_historico_acao)
+    distintos = sorted(set(simbolos))
+    precos = precos_na_data(historico, distintos, datas)[pd.Index(distintos).get_indexer(simbolos)]
+
+    quantidade = numeros(df["quantidade"])[:, None]
+    preco_compra = numeros(df["preco_inicial"])[:, None]
+    return quantidade * np.where(np.isnan(precos), preco_compra, precos)
+
+
+def _investido(df, coluna):
+    if coluna == "acoes":
+        return numeros(df["quantidade"]) * numeros(df["preco_inicial"])
+    return numeros(df["valor_investido"])
+
+
+def _cambio_na_data(historico_cambio, datas):
+    cambio = precos_na_data(historico_cambio, ["USDBRL=X"], datas)[0]
+    # Antes da primeira cotação, usa a mais antiga disponível
+    validos = ~np.isnan(cambio)
+    if validos.any():
+        cambio[~validos] = cambio[validos][0]
+    else:
+        cambio[:] = TAXA_USDBRL_PADRAO
+    return cambio
+
+
+def carregar_historicos(df_criptos, df_acoes, data_inicio):
+    """
+    Lê do histórico do ETL os preços dos ativos da carteira a partir de `data_inicio`.
+
+    Returns:
+        dict: DataFrames 'criptomoedas', 'acoes' e 'cambio' com 'Data', 'Simbolo' e 'Preco'.
+    """
+    colunas = ["Data", "Simbolo", "Preco"]
+    historicos = {"criptomoedas": [], "acoes": [], "cambio": []}
+    if not df_criptos.empty:
+        historicos["criptomoedas"] = sorted(set(df_criptos["nome"].map(simbolo_historico_cripto)))
+        historicos["cambio"] = ["USDBRL=X"]
+    if not df_acoes.empty:
+        historicos["acoes"] = sorted(set(df_acoes["nome"].map(simbolo_historico_acao)))
+
+    resultado = {}
+    for classe, simbolos in historicos.items():
+        df = pd.DataFrame(columns=colunas)
+        if simbolos:
+            try:
+                df = ler_historico(classe, simbolos=simbolos, data_inicio=data_inicio, colunas=colunas)
+            except Exception as e:
+                print(f"Erro ao ler o histórico de {classe}: {str(e)}")
+        resultado[classe] = df
+    return resultado
+
+
+def serie_patrimonio(df_fundos, df_criptos, df_acoes, data_fim=None, historicos=None):
+    """
+    Calcula o patrimônio diário de uma carteira desde a primeira aplicação.
+
+    Args:
+        df_fundos (DataFrame): Fundos (colunas de fundoinvestimento).
+        df_criptos (DataFrame): Criptomoedas (colunas de investimentos_cripto).
+        df_acoes (DataFrame): Ações (colunas de acoes).
+        data_fim (date-like, optional): Último dia da série. Padrão: hoje.
+        historicos (dict, optional): Históricos já carregados (como em
+            `carregar_historicos`). Se None, são lidos do ETL.
+
+    Returns:
+        DataFrame: Indexado por 'Data' (um dia por linha), com o valor em R$ dos
+        fundos, criptos e ações, o 'patrimonio' (soma dos três) e o 'investido'
+        (valor aplicado nas posições abertas no dia).
+    """
+    aplicacoes = pd.concat(
+        [pd.to_datetime(df["data_aplicacao"], errors="coerce") for df in (df_fundos, df_criptos, df_acoes)]
+    ).dropna()
+    if aplicacoes.empty:
+        return pd.DataFrame(columns=COLUNAS_PATRIMONIO, index=pd.DatetimeIndex([], name="Data"))
+
+    data_fim = pd.Timestamp(data_fim or datetime.now()).normalize()
+    datas = pd.date_range(aplicacoes.min().normalize(), data_fim, freq="D", name="Data")
+    if historicos is None:
+        historicos = carregar_historicos(df_criptos, df_acoes, datas[0])
+
+    valores = {
+        "fundos": (df_fundos, _valor_fundos(df_fundos, datas)),
+        "criptos": (
+            df_criptos,
+            _valor_criptos(
+                df_criptos, datas, historicos["criptomoedas"], _cambio_na_data(historicos["cambio"], datas)
+            ),
+        ),
+        "acoes": (df_acoes, _valor_acoes(df_acoes, datas, historicos["acoes"])),
+    }
+
+    serie = pd.DataFrame(index=datas)
+    investido = np.zeros(len(datas))
+    for coluna, (df, valor) in valores.items():
+        if df.empty:
+            serie[coluna] = 0.0
+            continue
+        ativa = _janela_ativa(df, datas)
+        serie[coluna] = np.where(ativa, valor, 0.0).sum(axis=0)
+        investido += np.where(ativa, _investido(df, coluna)[:, None], 0.0).sum(axis=0)
+
+    serie["patrimonio"] = serie[["fundos", "criptos", "acoes"]].sum(axis=1)
+    serie["investido"] = investido
+    return serie[COLUNAS_PATRIMONIO]
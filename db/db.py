@@ -1,26 +1,221 @@
 """
 Módulo para conexão com o banco de dados PostgreSQL
+
+A engine é criada apenas no primeiro acesso (get_engine) e reaproveitada por todo
+o processo. Os dados de conexão vêm do secrets do Streamlit ou, na falta dele,
+das variáveis de ambiente DB_HOST, DB_NAME, DB_USER e DB_PASSWORD. O pool de
+conexões pode ser ajustado por variáveis de ambiente:
+    DB_POOL_SIZE        conexões mantidas abertas no pool
+    DB_MAX_OVERFLOW     conexões extras permitidas em picos
+    DB_POOL_TIMEOUT     espera máxima (segundos) por uma conexão livre
+    DB_POOL_RECYCLE     idade máxima (segundos) de uma conexão antes de ser reaberta
+    DB_POOL_PRE_PING    testa a conexão antes de usá-la (1 ou 0)
 """
 
+import contextvars
+import os
+import threading
+from contextlib import contextmanager
+
 import pandas as pd
 import sqlalchemy as sa
 import streamlit as st
 
-# Dados de conexão (lidos do secrets do Streamlit)
-DB_HOST = st.secrets["secrets"]["DB_HOST"]
-DB_NAME = st.secrets["secrets"]["DB_NAME"]
-DB_USER = st.secrets["secrets"]["DB_USER"]
-DB_PASSWORD = st.secrets["secrets"]["DB_PASSWORD"]
+from db.metricas import medir_consulta
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+_engine = None
+_lock_engine = threading.Lock()
+
+# Contadores do pool, atualizados pelos eventos da engine
+_lock_metricas = threading.Lock()
+_metricas_pool = {
+    "conexoes_criadas": 0,
+    "checkouts": 0,
+    "pico_em_uso": 0,
+}
+
+
+def _configuracao_conexao():
+    """
+    Lê os dados de conexão do secrets do Streamlit ou das variáveis de ambiente
+    """
+    try:
+        segredos = st.secrets["secrets"]
+        configuracao = {chave: segredos.get(chave) for chave in ("DB_HOST", "DB_NAME", "DB_USER", "DB_PASSWORD")}
+    except Exception:
+        configuracao = {}
+
+    for chave in ("DB_HOST", "DB_NAME", "DB_USER", "DB_PASSWORD"):
+        if not configuracao.get(chave):
+            configuracao[chave] = os.getenv(chave)
+
+    # Verifica se todas as variáveis foram carregadas com sucesso
+    if not all(configuracao.values()):
+        raise ValueError(
+            "Variáveis de ambiente não configuradas corretamente no arquivo "
+            ".streamlit/secrets.toml ou no ambiente"
+        )
+    return configuracao
+
+
+def _registrar_eventos_pool(engine):
+    @sa.event.listens_for(engine, "connect")
+    def ao_conectar(conexao_dbapi, registro):
+        with _lock_metricas:
+            _metricas_pool["conexoes_criadas"] += 1
+
+    @sa.event.listens_for(engine, "checkout")
+    def ao_retirar(conexao_dbapi, registro, proxy):
+        with _lock_metricas:
+            _metricas_pool["checkouts"] += 1
+            _metricas_pool["pico_em_uso"] = max(
+                _metricas_pool["pico_em_uso"], engine.pool.checkedout()
+            )
 
-# Verifica se todas as variáveis foram carregadas com sucesso
-if not all([DB_HOST, DB_NAME, DB_USER, DB_PASSWORD]):
-    raise ValueError("Variáveis de ambiente não configuradas corretamente no arquivo .streamlit/secrets.toml")
 
-# Criação da URL de conexão
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
+def _criar_engine():
+    configuracao = _configuracao_conexao()
+
+    # Criação da URL de conexão
+    url = sa.engine.URL.create(
+        "postgresql+psycopg2",
+        username=configuracao["DB_USER"],
+        password=configuracao["DB_PASSWORD"],
+        host=configuracao["DB_HOST"],
+        database=configuracao["DB_NAME"],
+    )
+
+    engine = sa.create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    _registrar_eventos_pool(engine)
+    return engine
+
+
+def _em_execucao_streamlit():
+    try:
+        from streamlit.runtime import exists
+
+        return exists()
+    except Exception:
+        return False
+
+
+@st.cache_resource(show_spinner=False)
+def _engine_streamlit():
+    return _criar_engine()
+
+
+def get_engine():
+    """
+    Retorna a engine do banco, criada no primeiro acesso e compartilhada pelo processo
+
+    No app a engine fica no cache de recursos do Streamlit; fora dele (ETL,
+    scripts) fica em uma variável do módulo.
+    """
+    global _engine
 
-# Criação da engine
-engine = sa.create_engine(DATABASE_URL)
+    if _em_execucao_streamlit():
+        return _engine_streamlit()
+
+    if _engine is None:
+        with _lock_engine:
+            if _engine is None:
+                _engine = _criar_engine()
+    return _engine
+
+
+def estatisticas_pool():
+    """
+    Retorna a utilização do pool de conexões da engine
+
+    Returns:
+        dict: Conexões no pool, em uso, livres e extras (overflow), a utilização
+        em relação à capacidade (pool_size + max_overflow), o pico de conexões em
+        uso, as conexões criadas e as retiradas do pool.
+    """
+    pool = get_engine().pool
+    capacidade = DB_POOL_SIZE + DB_MAX_OVERFLOW
+    em_uso = pool.checkedout()
+    with _lock_metricas:
+        metricas = dict(_metricas_pool)
+    return {
+        "tamanho": pool.size(),
+        "em_uso": em_uso,
+        "livres": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+        "utilizacao": em_uso / capacidade if capacidade else 0.0,
+        "pico_em_uso": metricas["pico_em_uso"],
+        "conexoes_criadas": metricas["conexoes_criadas"],
+        "checkouts": metricas["checkouts"],
+    }
+
+
+# Função que recebe as consultas de ler_sql no lugar da execução (ver interceptar_consultas).
+# ContextVar: vale só para a thread (ou tarefa) que abriu o bloco
+_interceptador_consultas = contextvars.ContextVar("interceptador_consultas", default=None)
+
+
+@contextmanager
+def interceptar_consultas(funcao):
+    """
+    Durante o bloco, as consultas feitas por ler_sql são repassadas a `funcao`
+
+    Usado por ferramentas que precisam das consultas das funções deste módulo sem
+    executá-las (ex.: a verificação de índices com EXPLAIN em db/migracoes.py).
+    Afeta apenas o contexto atual; as demais threads continuam consultando o banco.
+
+    Args:
+        funcao (callable): Recebe (nome, query, params) e retorna o DataFrame
+            devolvido no lugar do resultado da consulta.
+    """
+    token = _interceptador_consultas.set(funcao)
+    try:
+        yield
+    finally:
+        _interceptador_consultas.reset(token)
+
+
+def executar_sql(conexao, sql, params=None):
+    """
+    Executa um comando SQL bruto (parâmetros no formato do driver) em uma conexão aberta
+
+    Returns:
+        CursorResult: Resultado do comando.
+    """
+    return conexao.exec_driver_sql(sql, params or {})
+
+
+def ler_sql(nome, query, params=None, conexao=None):
+    """
+    Executa uma consulta com pd.read_sql e registra o tempo em db.metricas
+
+    Args:
+        nome (str): Nome da consulta nas métricas.
+        query (str): Consulta SQL.
+        params (dict, optional): Parâmetros da consulta.
+        conexao (optional): Conexão já aberta; se None, usa a engine.
+    """
+    interceptador = _interceptador_consultas.get()
+    if interceptador is not None:
+        return interceptador(nome, query, params)
+
+    return medir_consulta(
+        nome,
+        lambda: pd.read_sql(query, conexao if conexao is not None else get_engine(), params=params),
+        params,
+    )
 
 
 # Funções para consultar as tabelas
@@ -29,7 +224,7 @@ def get_all_from_table(table_name):
     Retorna todos os registros de uma tabela específica como DataFrame
     """
     query = f"SELECT * FROM {table_name}"
-    return pd.read_sql(query, engine)
+    return ler_sql(f"get_all_from_table.{table_name}", query)
 
 
 def get_usuario_by_cpf_senha(cpf, senha=None):
@@ -50,11 +245,11 @@ def get_usuario_by_cpf_senha(cpf, senha=None):
         if token:
             # Buscar o usuário no banco de dados pelo CPF
             query = "SELECT * FROM usuario WHERE cpf = %(cpf)s"
-            return pd.read_sql(query, engine, params={"cpf": cpf})
+            return ler_sql("get_usuario_by_cpf_senha", query, {"cpf": cpf})
     else:
         # Se não foi fornecida senha, apenas busca o usuário pelo CPF
         query = "SELECT * FROM usuario WHERE cpf = %(cpf)s"
-        return pd.read_sql(query, engine, params={"cpf": cpf})
+        return ler_sql("get_usuario_by_cpf_senha", query, {"cpf": cpf})
 
     # Se a autenticação falhar ou o usuário não for encontrado, retorna um DataFrame vazio
     return pd.DataFrame()
@@ -71,7 +266,7 @@ def get_pessoa_by_id_usuario(id_usuario):
     SELECT * FROM pessoa 
     WHERE id_usuario = %(id_usuario)s
     """
-    return pd.read_sql(query, engine, params={"id_usuario": id_usuario_int})
+    return ler_sql("get_pessoa_by_id_usuario", query, {"id_usuario": id_usuario_int})
 
 
 def get_contas_by_id_pessoa(id_pessoa):
@@ -85,7 +280,7 @@ def get_contas_by_id_pessoa(id_pessoa):
     SELECT * FROM conta 
     WHERE id_pessoa = %(id_pessoa)s
     """
-    return pd.read_sql(query, engine, params={"id_pessoa": id_pessoa_int})
+    return ler_sql("get_contas_by_id_pessoa", query, {"id_pessoa": id_pessoa_int})
 
 
 def get_investimentos_by_id_conta(id_conta):
@@ -99,7 +294,7 @@ def get_investimentos_by_id_conta(id_conta):
     SELECT * FROM containvestimento 
     WHERE id_conta = %(id_conta)s
     """
-    return pd.read_sql(query, engine, params={"id_conta": id_conta_int})
+    return ler_sql("get_investimentos_by_id_conta", query, {"id_conta": id_conta_int})
 
 
 def get_fundos_by_id_investimento(id_investimento):
@@ -113,7 +308,7 @@ def get_fundos_by_id_investimento(id_investimento):
     SELECT * FROM fundoinvestimento 
     WHERE id_investimento = %(id_investimento)s
     """
-    return pd.read_sql(query, engine, params={"id_investimento": id_investimento_int})
+    return ler_sql("get_fundos_by_id_investimento", query, {"id_investimento": id_investimento_int})
 
 
 def get_criptos_by_id_investimento(id_investimento):
@@ -127,7 +322,7 @@ def get_criptos_by_id_investimento(id_investimento):
     SELECT * FROM investimentos_cripto 
     WHERE id_investimento = %(id_investimento)s
     """
-    return pd.read_sql(query, engine, params={"id_investimento": id_investimento_int})
+    return ler_sql("get_criptos_by_id_investimento", query, {"id_investimento": id_investimento_int})
 
 
 def get_acoes_by_id_investimento(id_investimento):
@@ -141,13 +336,50 @@ def get_acoes_by_id_investimento(id_investimento):
     SELECT * FROM acoes 
     WHERE id_investimento = %(id_investimento)s
     """
-    return pd.read_sql(query, engine, params={"id_investimento": id_investimento_int})
+    return ler_sql("get_acoes_by_id_investimento", query, {"id_investimento": id_investimento_int})
 
 
-def get_all_dataframes():
+def get_criptos_by_ids(ids_cripto):
+    """
+    Retorna os investimentos em criptomoedas com os IDs informados
+    """
+    query = """
+    SELECT * FROM investimentos_cripto
+    WHERE id_cripto = ANY(%(ids)s::bigint[])
+    ORDER BY id_cripto
+    """
+    return ler_sql("get_criptos_by_ids", query, {"ids": [int(id_cripto) for id_cripto in ids_cripto]})
+
+
+def get_acoes_by_ids(ids_acoes):
+    """
+    Retorna as ações com os IDs informados
+    """
+    query = """
+    SELECT * FROM acoes
+    WHERE id_acoes = ANY(%(ids)s::bigint[])
+    ORDER BY id_acoes
+    """
+    return ler_sql("get_acoes_by_ids", query, {"ids": [int(id_acoes) for id_acoes in ids_acoes]})
+
+
+def get_all_dataframes(uso_administrativo=False):
     """
     Retorna todos os dados das tabelas como DataFrames Pandas
+
+    Carrega as tabelas inteiras, por isso é restrita a rotinas administrativas e
+    em lote. As páginas devem usar as consultas filtradas por ID (get_carteira,
+    get_criptos_by_ids, get_acoes_by_ids).
+
+    Raises:
+        RuntimeError: Se chamada sem uso_administrativo=True.
     """
+    if not uso_administrativo:
+        raise RuntimeError(
+            "get_all_dataframes carrega todas as tabelas; use as consultas filtradas "
+            "por ID ou chame com uso_administrativo=True em rotinas administrativas"
+        )
+
     df_usuario = get_all_from_table("usuario")
     df_pessoa = get_all_from_table("pessoa")
     df_conta = get_all_from_table("conta")
@@ -165,3 +397,161 @@ def get_all_dataframes():
         df_investimentos_cripto,
         df_acoes,
     )
+
+
+def get_nomes_em_carteira():
+    """
+    Retorna os nomes distintos dos ativos mantidos em ações e criptomoedas
+
+    O DataFrame tem as colunas 'classe' ('acoes' ou 'cripto') e 'nome'.
+    """
+    query = """
+    SELECT DISTINCT 'acoes' AS classe, nome FROM acoes
+    UNION
+    SELECT DISTINCT 'cripto' AS classe, nome FROM investimentos_cripto
+    """
+    return ler_sql("get_nomes_em_carteira", query)
+
+
+def _tipar_carteira(df):
+    """
+    Converte as colunas de valores e datas da carteira para tipos numéricos e datetime
+    """
+    for coluna in ("valor_investido", "preco_compra", "preco_inicial", "quantidade", "rentabilidade"):
+        if coluna in df.columns:
+            df[coluna] = pd.to_numeric(df[coluna], errors="coerce").astype("float64")
+    for coluna in ("data_aplicacao", "data_encerramento", "data_abertura"):
+        if coluna in df.columns:
+            df[coluna] = pd.to_datetime(df[coluna], errors="coerce")
+    return df
+
+
+def get_carteira(ids_conta=None, cpf=None):
+    """
+    Retorna as posições de investimento de contas ou de um CPF em uma única conexão
+
+    Em vez de uma consulta por investimento, são feitas quatro consultas por
+    conjunto (containvestimento e, com junção nela, fundos, criptos e ações),
+    filtradas pelas contas com ANY ou pelo CPF.
+
+    Args:
+        ids_conta (list, optional): IDs das contas.
+        cpf (str, optional): CPF do usuário dono das contas.
+
+    Returns:
+        dict: DataFrames 'investimentos', 'fundos', 'criptos' e 'acoes', com
+        'id_conta' e 'perfil_invest' em todos, valores em float e datas em
+        datetime, ordenados por conta e investimento.
+    """
+    condicoes = []
+    params = {}
+    if ids_conta is not None:
+        condicoes.append("ci.id_conta = ANY(%(ids_conta)s::bigint[])")
+        params["ids_conta"] = [int(id_conta) for id_conta in ids_conta]
+    if cpf is not None:
+        condicoes.append(
+            """ci.id_conta IN (
+                SELECT c.id_conta FROM conta c
+                JOIN pessoa p ON p.id_pessoa = c.id_pessoa
+                JOIN usuario u ON u.id_usuario = p.id_usuario
+                WHERE u.cpf = %(cpf)s
+            )"""
+        )
+        params["cpf"] = cpf
+    if not condicoes:
+        raise ValueError("Informe ids_conta ou cpf")
+    filtro = " AND ".join(condicoes)
+
+    consultas = {
+        "investimentos": f"""
+            SELECT ci.* FROM containvestimento ci
+            WHERE {filtro}
+            ORDER BY ci.id_conta, ci.id_investimento
+        """,
+        "fundos": f"""
+            SELECT f.*, ci.id_conta, ci.perfil_invest FROM fundoinvestimento f
+            JOIN containvestimento ci ON ci.id_investimento = f.id_investimento
+            WHERE {filtro}
+            ORDER BY ci.id_conta, f.id_investimento, f.id_fundo
+        """,
+        "criptos": f"""
+            SELECT ic.*, ci.id_conta, ci.perfil_invest FROM investimentos_cripto ic
+            JOIN containvestimento ci ON ci.id_investimento = ic.id_investimento
+            WHERE {filtro}
+            ORDER BY ci.id_conta, ic.id_investimento, ic.id_cripto
+        """,
+        "acoes": f"""
+            SELECT a.*, ci.id_conta, ci.perfil_invest FROM acoes a
+            JOIN containvestimento ci ON ci.id_investimento = a.id_investimento
+            WHERE {filtro}
+            ORDER BY ci.id_conta, a.id_investimento, a.id_acoes
+        """,
+    }
+
+    with get_engine().connect() as conexao:
+        return {
+            nome: _tipar_carteira(ler_sql(f"get_carteira.{nome}", query, params, conexao))
+            for nome, query in consultas.items()
+        }
+
+
+def get_ids_contas_com_investimentos(apos_id_conta=0, limite=1000):
+    """
+    Retorna uma página dos IDs das contas que possuem investimentos
+
+    A paginação é feita pela chave (id_conta > apos_id_conta), e não por OFFSET,
+    para que ler todas as contas custe o mesmo em cada página.
+
+    Args:
+        apos_id_conta (int): Último ID da página anterior (0 na primeira).
+        limite (int): Quantidade máxima de contas na página.
+
+    Returns:
+        DataFrame: Coluna 'id_conta', em ordem crescente.
+    """
+    query = """
+    SELECT DISTINCT id_conta FROM containvestimento
+    WHERE id_conta > %(apos_id_conta)s
+    ORDER BY id_conta
+    LIMIT %(limite)s
+    """
+    return ler_sql(
+        "get_ids_contas_com_investimentos",
+        query,
+        {"apos_id_conta": int(apos_id_conta), "limite": int(limite)},
+    )
+
+
+def salvar_avaliacoes_carteira(df_avaliacoes):
+    """
+    Grava as avaliações das carteiras na tabela avaliacao_carteira
+
+    Linhas de uma conta já avaliada na mesma data de referência são substituídas.
+
+    Args:
+        df_avaliacoes (DataFrame): Uma linha por conta, com as colunas da tabela
+            (ver db/migrations/002_avaliacao_carteira.sql).
+
+    Returns:
+        int: Quantidade de linhas gravadas.
+    """
+    if df_avaliacoes.empty:
+        return 0
+
+    colunas = list(df_avaliacoes.columns)
+    query = f"""
+    INSERT INTO avaliacao_carteira ({", ".join(colunas)}, avaliada_em)
+    VALUES ({", ".join(f"%({coluna})s" for coluna in colunas)}, now())
+    ON CONFLICT (data_referencia, id_conta) DO UPDATE SET
+    {", ".join(f"{coluna} = EXCLUDED.{coluna}" for coluna in colunas + ["avaliada_em"])}
+    """
+    # Tipos do Python (e None no lugar de NaN) para o driver
+    registros = df_avaliacoes.astype(object).where(df_avaliacoes.notna(), None).to_dict("records")
+
+    with get_engine().begin() as conexao:
+        medir_consulta(
+            "salvar_avaliacoes_carteira",
+            lambda: conexao.exec_driver_sql(query, registros),
+            {"registros": registros},
+        )
+    return len(registros)
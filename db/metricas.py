@@ -0,0 +1,162 @@
+"""
+Tempo das consultas ao banco de dados
+
+Cada consulta feita pelas funções de db/db.py é registrada com o nome, o formato
+dos parâmetros (nomes e tamanho das listas, sem os valores), a latência, as
+linhas e os bytes retornados. Consultas acima de `DB_CONSULTA_LENTA_MS`
+milissegundos (padrão 500) são registradas no log `db.consultas_lentas`, e
+`registro_consultas.estatisticas()` resume as latências por consulta em percentis.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from etl.instrumentacao import quantidade_de_linhas, tamanho_em_bytes
+
+LIMITE_CONSULTA_LENTA = float(os.getenv("DB_CONSULTA_LENTA_MS", "500")) / 1000
+
+# Latências guardadas por consulta para o cálculo dos percentis
+AMOSTRAS_POR_CONSULTA = int(os.getenv("DB_AMOSTRAS_POR_CONSULTA", "1000"))
+
+logger = logging.getLogger("db.consultas_lentas")
+
+
+def formato_parametros(params):
+    """
+    Descreve os parâmetros de uma consulta sem expor os valores
+
+    Listas são descritas pelo tamanho e os demais valores pelo tipo, por exemplo
+    {'ids': 'list[12]', 'cpf': 'str'}.
+    """
+    if not params:
+        return {}
+    return {
+        nome: f"list[{len(valor)}]" if isinstance(valor, (list, tuple)) else type(valor).__name__
+        for nome, valor in params.items()
+    }
+
+
+class RegistroConsultas:
+    """Acumula as métricas das consultas ao banco de forma segura entre threads."""
+
+    def __init__(self, limite_lenta=LIMITE_CONSULTA_LENTA, amostras=AMOSTRAS_POR_CONSULTA):
+        self.limite_lenta = limite_lenta
+        self.amostras = amostras
+        self._lock = threading.Lock()
+        self._consultas = {}
+
+    def registrar(self, nome, params, duracao, resultado=None, erro=None):
+        """Registra uma execução de consulta e loga as que passarem do limite."""
+        linhas = quantidade_de_linhas(resultado) if erro is None else 0
+        bytes_resultado = tamanho_em_bytes(resultado) if erro is None else 0
+
+        with self._lock:
+            consulta = self._consultas.setdefault(
+                nome,
+                {
+                    "latencias": deque(maxlen=self.amostras),
+                    "chamadas": 0,
+                    "erros": 0,
+                    "lentas": 0,
+                    "linhas": 0,
+                    "bytes": 0,
+                },
+            )
+            consulta["latencias"].append(duracao)
+            consulta["chamadas"] += 1
+            consulta["linhas"] += linhas
+            consulta["bytes"] += bytes_resultado
+            if erro is not None:
+                consulta["erros"] += 1
+            if duracao >= self.limite_lenta:
+                consulta["lentas"] += 1
+
+        if duracao >= self.limite_lenta:
+            logger.warning(
+                "Consulta lenta %s: %.0f ms, %d linhas, %d bytes, parâmetros %s%s",
+                nome,
+                duracao * 1000,
+                linhas,
+                bytes_resultado,
+                formato_parametros(params),
+                f", erro: {erro}" if erro is not None else "",
+            )
+
+    def estatisticas(self):
+        """
+        Retorna as latências por consulta
+
+        Returns:
+            DataFrame: Uma linha por consulta com chamadas, erros, consultas lentas,
+            percentis p50/p95/p99 e máximo da latência (ms), média de linhas e
+            total de bytes, ordenado pelo p95.
+        """
+        with self._lock:
+            consultas = {
+                nome: {**dados, "latencias": np.array(dados["latencias"]) * 1000}
+                for nome, dados in self._consultas.items()
+            }
+
+        linhas = []
+        for nome, dados in consultas.items():
+            latencias = dados["latencias"]
+            p50, p95, p99 = np.percentile(latencias, [50, 95, 99])
+            linhas.append(
+                {
+                    "consulta": nome,
+                    "chamadas": dados["chamadas"],
+                    "erros": dados["erros"],
+                    "lentas": dados["lentas"],
+                    "p50_ms": p50,
+                    "p95_ms": p95,
+                    "p99_ms": p99,
+                    "max_ms": latencias.max(),
+                    "linhas_media": dados["linhas"] / dados["chamadas"],
+                    "bytes_total": dados["bytes"],
+                }
+            )
+
+        colunas = [
+            "consulta", "chamadas", "erros", "lentas", "p50_ms", "p95_ms",
+            "p99_ms", "max_ms", "linhas_media", "bytes_total",
+        ]
+        if not linhas:
+            return pd.DataFrame(columns=colunas)
+        return pd.DataFrame(linhas, columns=colunas).sort_values("p95_ms", ascending=False, ignore_index=True)
+
+    def limpar(self):
+        """Descarta as métricas acumuladas."""
+        with self._lock:
+            self._consultas.clear()
+
+
+# Registro compartilhado por todas as consultas do processo
+registro_consultas = RegistroConsultas()
+
+
+def medir_consulta(nome, executar, params=None):
+    """
+    Executa uma consulta e registra a latência, as linhas e os bytes retornados
+
+    Args:
+        nome (str): Nome da consulta (normalmente a função de db/db.py).
+        executar (callable): Função sem argumentos que executa a consulta.
+        params (dict, optional): Parâmetros da consulta (apenas o formato é registrado).
+
+    Returns:
+        O retorno de `executar`.
+    """
+    inicio = time.perf_counter()
+    try:
+        resultado = executar()
+    except Exception as e:
+        registro_consultas.registrar(nome, params, time.perf_counter() - inicio, erro=e)
+        raise
+    registro_consultas.registrar(nome, params, time.perf_counter() - inicio, resultado)
+    return resultado
@@ -0,0 +1,162 @@
+"""
+Migrações do esquema e verificação dos índices usados pelo dashboard
+
+As migrações ficam em db/migrations, uma por arquivo, com nome iniciado pela
+versão (ex.: 001_indices_acesso.sql). Cada uma é aplicada uma única vez, dentro
+de uma transação, e registrada na tabela schema_migracoes.
+
+A verificação executa as consultas das funções de db/db.py com EXPLAIN (com a
+varredura sequencial desabilitada, já que em bases pequenas o planejador a
+prefere mesmo com índice) e falha se alguma tabela for lida sem índice. As
+consultas são obtidas com `db.db.interceptar_consultas`, sem executá-las.
+
+Uso:
+    python -m db.migracoes              aplica as migrações pendentes
+    python -m db.migracoes --verificar  aplica e verifica os planos das consultas
+"""
+
+import glob
+import json
+import os
+import sys
+
+import pandas as pd
+import sqlalchemy as sa
+
+import db.db as banco
+
+DIRETORIO_MIGRACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+# Funções de db/db.py verificadas, com argumentos de exemplo
+CONSULTAS_VERIFICADAS = [
+    ("get_usuario_by_cpf_senha", ("00000000000",)),
+    ("get_pessoa_by_id_usuario", (1,)),
+    ("get_contas_by_id_pessoa", (1,)),
+    ("get_investimentos_by_id_conta", (1,)),
+    ("get_fundos_by_id_investimento", (1,)),
+    ("get_criptos_by_id_investimento", (1,)),
+    ("get_acoes_by_id_investimento", (1,)),
+    ("get_criptos_by_ids", ([1, 2],)),
+    ("get_acoes_by_ids", ([1, 2],)),
+    ("get_nomes_em_carteira", ()),
+    ("get_carteira", ([1, 2],)),
+    ("get_carteira", (None, "00000000000")),
+    ("get_ids_contas_com_investimentos", (0, 1000)),
+]
+
+VARREDURAS_COM_INDICE = {"Index Scan", "Index Only Scan", "Bitmap Index Scan", "Bitmap Heap Scan"}
+
+
+def listar_migracoes():
+    """Retorna as migrações disponíveis como tuplas (versao, caminho), em ordem."""
+    caminhos = sorted(glob.glob(os.path.join(DIRETORIO_MIGRACOES, "*.sql")))
+    return [(os.path.basename(caminho).split("_", 1)[0], caminho) for caminho in caminhos]
+
+
+def aplicar_migracoes(engine=None):
+    """
+    Aplica as migrações ainda não registradas em schema_migracoes
+
+    Returns:
+        list: Versões aplicadas nesta execução.
+    """
+    engine = engine or banco.get_engine()
+    aplicadas_agora = []
+
+    with engine.begin() as conexao:
+        banco.executar_sql(
+            conexao,
+            """
+            CREATE TABLE IF NOT EXISTS schema_migracoes (
+                versao TEXT PRIMARY KEY,
+                arquivo TEXT NOT NULL,
+                aplicada_em TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+            """
+        )
+        ja_aplicadas = {
+            linha[0] for linha in banco.executar_sql(conexao, "SELECT versao FROM schema_migracoes")
+        }
+
+    for versao, caminho in listar_migracoes():
+        if versao in ja_aplicadas:
+            continue
+        with open(caminho, encoding="utf-8") as arquivo:
+            script = arquivo.read()
+
+        # Cada migração roda em uma transação: ou é aplicada inteira, ou não é registrada
+        with engine.begin() as conexao:
+            banco.executar_sql(conexao, script)
+            conexao.execute(
+                sa.text("INSERT INTO schema_migracoes (versao, arquivo) VALUES (:versao, :arquivo)"),
+                {"versao": versao, "arquivo": os.path.basename(caminho)},
+            )
+        print(f"Migração {os.path.basename(caminho)} aplicada.")
+        aplicadas_agora.append(versao)
+
+    return aplicadas_agora
+
+
+def _nos_do_plano(no):
+    yield no
+    for filho in no.get("Plans", []):
+        yield from _nos_do_plano(filho)
+
+
+def verificar_indices(engine=None):
+    """
+    Verifica se as consultas de db/db.py leem as tabelas por índice
+
+    As funções são chamadas normalmente, mas, com `interceptar_consultas`, cada
+    consulta é executada como EXPLAIN (FORMAT JSON) em uma conexão com
+    enable_seqscan desligado.
+
+    Returns:
+        DataFrame: Uma linha por consulta com as varreduras de cada tabela e se
+        a consulta passou na verificação.
+    """
+    engine = engine or banco.get_engine()
+    resultados = []
+
+    with engine.connect() as conexao:
+        banco.executar_sql(conexao, "SET enable_seqscan = off")
+
+        def explicar(nome, query, params=None):
+            plano = banco.executar_sql(conexao, "EXPLAIN (FORMAT JSON) " + query, params).scalar()
+            if isinstance(plano, str):
+                plano = json.loads(plano)
+            varreduras = [
+                (no["Node Type"], no.get("Relation Name"), no.get("Index Name"))
+                for no in _nos_do_plano(plano[0]["Plan"])
+                if no["Node Type"].endswith("Scan")
+            ]
+            sequenciais = [tabela for tipo, tabela, _ in varreduras if tipo == "Seq Scan"]
+            resultados.append(
+                {
+                    "consulta": nome,
+                    "varreduras": ", ".join(
+                        f"{tipo} em {tabela or indice}" for tipo, tabela, indice in varreduras
+                    ),
+                    "ok": not sequenciais
+                    and any(tipo in VARREDURAS_COM_INDICE for tipo, _, _ in varreduras),
+                }
+            )
+            return pd.DataFrame()
+
+        with banco.interceptar_consultas(explicar):
+            for funcao, argumentos in CONSULTAS_VERIFICADAS:
+                getattr(banco, funcao)(*argumentos)
+
+    return pd.DataFrame(resultados, columns=["consulta", "varreduras", "ok"])
+
+
+if __name__ == "__main__":
+    aplicar_migracoes()
+
+    if "--verificar" in sys.argv:
+        df_verificacao = verificar_indices()
+        print(df_verificacao.to_string(index=False))
+        if not df_verificacao["ok"].all():
+            print("Há consultas sem uso de índice.")
+            sys.exit(1)
+        print("Todas as consultas usam índices.")
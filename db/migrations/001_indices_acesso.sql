@@ -0,0 +1,29 @@
+-- Índices dos caminhos de acesso do dashboard (db/db.py)
+
+-- Login e dados do cliente: usuario -> pessoa -> conta
+CREATE INDEX IF NOT EXISTS idx_usuario_cpf ON usuario (cpf);
+CREATE INDEX IF NOT EXISTS idx_pessoa_id_usuario ON pessoa (id_usuario);
+CREATE INDEX IF NOT EXISTS idx_conta_id_pessoa ON conta (id_pessoa);
+
+-- Investimentos das contas (get_investimentos_by_id_conta e get_carteira)
+CREATE INDEX IF NOT EXISTS idx_containvestimento_id_conta
+    ON containvestimento (id_conta, id_investimento)
+    INCLUDE (perfil_invest, data_abertura);
+
+-- Posições de cada investimento. Os índices cobrem a ordenação de get_carteira
+-- e incluem as colunas usadas na avaliação da carteira
+CREATE INDEX IF NOT EXISTS idx_fundoinvestimento_id_investimento
+    ON fundoinvestimento (id_investimento, id_fundo)
+    INCLUDE (nome, valor_investido, rentabilidade, data_aplicacao, perfil_risco);
+
+CREATE INDEX IF NOT EXISTS idx_investimentos_cripto_id_investimento
+    ON investimentos_cripto (id_investimento, id_cripto)
+    INCLUDE (nome, valor_investido, preco_compra, data_aplicacao, perfil_risco);
+
+CREATE INDEX IF NOT EXISTS idx_acoes_id_investimento
+    ON acoes (id_investimento, id_acoes)
+    INCLUDE (nome, quantidade, preco_inicial, data_aplicacao, perfil_risco);
+
+-- Ativos distintos das carteiras (get_nomes_em_carteira, atualizador de cotações)
+CREATE INDEX IF NOT EXISTS idx_acoes_nome ON acoes (nome);
+CREATE INDEX IF NOT EXISTS idx_investimentos_cripto_nome ON investimentos_cripto (nome);
@@ -0,0 +1,29 @@
+-- Resultado da avaliação em lote das carteiras (python -m carteira.lote):
+-- uma linha por conta e data de referência, com os totais, a alocação atual por
+-- perfil de risco (percentual do valor atual), a alocação ideal do perfil do
+-- investidor e o desvio entre elas em pontos percentuais
+CREATE TABLE IF NOT EXISTS avaliacao_carteira (
+    data_referencia DATE NOT NULL,
+    id_conta BIGINT NOT NULL,
+    perfil_invest TEXT NOT NULL,
+    posicoes INTEGER NOT NULL,
+    total_investido NUMERIC(18, 2) NOT NULL,
+    total_atual NUMERIC(18, 2) NOT NULL,
+    rentabilidade DOUBLE PRECISION,
+    percentual_baixo DOUBLE PRECISION,
+    percentual_moderado DOUBLE PRECISION,
+    percentual_alto DOUBLE PRECISION,
+    ideal_baixo DOUBLE PRECISION NOT NULL,
+    ideal_moderado DOUBLE PRECISION NOT NULL,
+    ideal_alto DOUBLE PRECISION NOT NULL,
+    desvio_baixo DOUBLE PRECISION,
+    desvio_moderado DOUBLE PRECISION,
+    desvio_alto DOUBLE PRECISION,
+    desvio_maximo DOUBLE PRECISION,
+    avaliada_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (data_referencia, id_conta)
+);
+
+-- Relatórios e alertas: maiores desvios de uma data
+CREATE INDEX IF NOT EXISTS idx_avaliacao_carteira_desvio
+    ON avaliacao_carteira (data_referencia, desvio_maximo DESC);
@@ -1,14 +1,26 @@
-import yfinance as yf
 import pandas as pd
-from datetime import datetime, timedelta
-import time
+from datetime import datetime
 import os
 from etl.cambio import get_usdbrl_rate
+from etl.downloader import baixar_historicos_yf
+from etl.cotacoes import cotacoes_atuais, simbolo_acao
+from etl.armazenamento import salvar_particionado
+from etl.agregados import materializar_resumo, obter_periodo
+from etl.incremental import (
+    ler_historico_existente,
+    calcular_datas_iniciais,
+    atualizar_arquivo_historico,
+)
 
-def baixar_historico_acoes():
+def baixar_historico_acoes(completo=False):
     """
-    Baixa o histórico dos últimos 10 anos de todas as ações do IBOVESPA
-    e salva em um arquivo CSV.
+    Baixa o histórico de todas as ações do IBrX-50 e salva em um arquivo CSV.
+
+    Por padrão a atualização é incremental: para cada ação já presente no
+    histórico são baixados apenas os dias desde a última data armazenada.
+
+    Args:
+        completo (bool): Se True, baixa novamente os últimos 10 anos de todas as ações.
     """
     try:
         # Determinar o caminho base do projeto
@@ -25,72 +37,75 @@ def baixar_historico_acoes():
         df_acoes = pd.read_csv(nome_arquivo, skiprows=1)
         df_acoes.columns = ['Código']
         tickers = df_acoes['Código'].tolist()
+        tickers_yf = {f"{ticker}.SA": ticker for ticker in tickers}
         
-        # Data inicial (10 anos atrás)
-        data_inicial = (datetime.now() - timedelta(days=3650)).strftime('%Y-%m-%d')
+        # Lê o histórico já armazenado e define a data inicial de cada ação
+        nome_arquivo_historico = os.path.join(base_path, 'results', 'historico_acoes.csv')
+        df_existente = pd.DataFrame() if completo else ler_historico_existente(nome_arquivo_historico)
+        datas_iniciais = calcular_datas_iniciais(df_existente, tickers_yf, completo)
         
         # Lista para armazenar todos os dados históricos
         dados_historicos = []
         
         print("Iniciando download do histórico das ações...")
         
-        # Processa cada ação
-        for ticker in tickers:
-            ticker_yf = f"{ticker}.SA"
-            try:
-                # Obtém dados históricos da ação
-                acao = yf.Ticker(ticker_yf)
-                hist = acao.history(start=data_inicial)
-                
-                if hist.empty:
-                    continue
-                
-                # Adiciona informações ao histórico
-                hist['Ticker'] = ticker
-                hist['Nome'] = ticker  # Como não temos o nome da empresa no novo arquivo, usamos o próprio ticker
-                
-                # Reseta o índice para transformar a data em coluna
-                hist = hist.reset_index()
-                hist['Date'] = hist['Date'].dt.strftime('%Y-%m-%d')
-                
-                # Adiciona aos dados históricos
-                dados_historicos.append(hist)
-                
-                print(f"Dados baixados para {ticker}")
-                
-                # Pausa para evitar sobrecarga na API
-                time.sleep(1)
-                
-            except Exception as e:
-                print(f"Erro ao baixar dados de {ticker}: {str(e)}")
+        # Baixa o histórico de todas as ações em paralelo, respeitando o limite de taxa
+        resultados, erros = baixar_historicos_yf(tickers_yf.keys(), datas_iniciais)
+
+        # Sem nenhum download bem-sucedido a etapa falhou, mesmo que exista histórico
+        # armazenado: retorna vazio para que o orquestrador registre a falha
+        baixados = len(tickers_yf) - len(erros)
+        print(f"{baixados} de {len(tickers_yf)} símbolos baixados com sucesso")
+        if baixados == 0:
+            print('\nNenhum histórico das ações foi baixado com sucesso')
+            return pd.DataFrame()
+
+        # Processa cada ação na ordem original da carteira
+        for ticker_yf, ticker in tickers_yf.items():
+            if ticker_yf in erros:
+                print(f"Erro ao baixar dados de {ticker}: {str(erros[ticker_yf])}")
                 continue
+
+            hist = resultados[ticker_yf]
+
+            if hist.empty:
+                continue
+
+            # Adiciona informações ao histórico
+            hist['Ticker'] = ticker
+            hist['Nome'] = ticker  # Como não temos o nome da empresa no novo arquivo, usamos o próprio ticker
+
+            # Reseta o índice para transformar a data em coluna
+            hist = hist.reset_index()
+            hist['Date'] = hist['Date'].dt.strftime('%Y-%m-%d')
+
+            # Adiciona aos dados históricos
+            dados_historicos.append(hist)
+
+            print(f"Dados baixados para {ticker}")
         
         # Combina todos os dados históricos
         if dados_historicos:
-            df_historico = pd.concat(dados_historicos, ignore_index=True)
+            df_novo = pd.concat(dados_historicos, ignore_index=True)
             
             # Seleciona e renomeia as colunas relevantes
-            df_historico = df_historico[['Date', 'Ticker', 'Nome', 'Close', 'Volume']]
-            df_historico.columns = ['Data', 'Simbolo', 'Nome_Empresa', 'Preco', 'Volume']
+            df_novo = df_novo[['Date', 'Ticker', 'Nome', 'Close', 'Volume']]
+            df_novo.columns = ['Data', 'Simbolo', 'Nome_Empresa', 'Preco', 'Volume']
             
-            # Calcula a variação diária
-            df_historico['Variacao'] = df_historico.groupby('Simbolo')['Preco'].pct_change() * 100
-            
-            # Determinar o caminho base do projeto
-            if os.path.exists('results'):
-                base_path = ''
-            else:
-                base_path = '..'
-            
-            # Salva o histórico em CSV
-            nome_arquivo = os.path.join(base_path, 'results', 'historico_acoes.csv')
-            df_historico.to_csv(nome_arquivo, index=False)
+            # Mescla com o histórico armazenado, calcula a variação diária e salva em CSV
+            df_historico = atualizar_arquivo_historico(
+                df_novo, df_existente, nome_arquivo_historico, completo
+            )
+
+            # Grava também a versão colunar, particionada por símbolo
+            salvar_particionado(df_historico, 'acoes')
+            materializar_resumo('acoes', df_historico)
             print("\nHistórico salvo com sucesso em 'historico_acoes.csv'")
             
             return df_historico
         else:
             print("\nNenhum dado histórico foi baixado")
-            return pd.DataFrame()
+            return df_existente
             
     except Exception as e:
         print(f"Erro ao processar dados históricos: {str(e)}")
@@ -104,58 +119,8 @@ def obter_melhores_e_piores_acoes(periodo='1d'):
         periodo (str): Período de análise ('1d' para 30 dias, '1mo' para mensal, '1y' para anual)
     """
     try:
-        # Lê o arquivo CSV com o histórico
-        # Determinar o caminho base do projeto
-        if os.path.exists('results'):
-            base_path = ''
-        else:
-            base_path = '..'
-        
-        nome_arquivo = os.path.join(base_path, 'results', 'historico_acoes.csv')
-        df_historico = pd.read_csv(nome_arquivo)
-        df_historico['Data'] = pd.to_datetime(df_historico['Data'])
-        
-        # Obtém a data mais recente
-        data_mais_recente = df_historico['Data'].max()
-        
-        # Filtra e agrega dados conforme o período
-        if periodo == '1d':
-            # Últimos 30 dias
-            data_inicio = data_mais_recente - pd.Timedelta(days=30)
-            df_periodo = df_historico[df_historico['Data'] >= data_inicio].copy()
-            # Calcular variação no período
-            df_periodo = df_periodo.groupby('Simbolo').agg({
-                'Preco': ['first', 'last'],
-                'Nome_Empresa': 'first'
-            }).reset_index()
-            df_periodo.columns = ['Simbolo', 'Preco_Inicial', 'Preco_Final', 'Nome_Empresa']
-            df_periodo['Variacao'] = ((df_periodo['Preco_Final'] / df_periodo['Preco_Inicial']) - 1) * 100
-            
-        elif periodo == '1mo':
-            # Agregar por mês
-            df_historico['Mes_Ano'] = df_historico['Data'].dt.to_period('M')
-            df_periodo = df_historico.groupby(['Simbolo', 'Mes_Ano', 'Nome_Empresa'])['Preco'].mean().reset_index()
-            df_periodo = df_periodo.sort_values(['Simbolo', 'Mes_Ano'])
-            # Calcular variação do último mês
-            df_periodo = df_periodo.groupby('Simbolo').agg({
-                'Preco': ['first', 'last'],
-                'Nome_Empresa': 'first'
-            }).reset_index()
-            df_periodo.columns = ['Simbolo', 'Preco_Inicial', 'Preco_Final', 'Nome_Empresa']
-            df_periodo['Variacao'] = ((df_periodo['Preco_Final'] / df_periodo['Preco_Inicial']) - 1) * 100
-            
-        else:  # '1y'
-            # Agregar por ano
-            df_historico['Ano'] = df_historico['Data'].dt.year
-            df_periodo = df_historico.groupby(['Simbolo', 'Ano', 'Nome_Empresa'])['Preco'].mean().reset_index()
-            df_periodo = df_periodo.sort_values(['Simbolo', 'Ano'])
-            # Calcular variação do último ano
-            df_periodo = df_periodo.groupby('Simbolo').agg({
-                'Preco': ['first', 'last'],
-                'Nome_Empresa': 'first'
-            }).reset_index()
-            df_periodo.columns = ['Simbolo', 'Preco_Inicial', 'Preco_Final', 'Nome_Empresa']
-            df_periodo['Variacao'] = ((df_periodo['Preco_Final'] / df_periodo['Preco_Inicial']) - 1) * 100
+        # Variação de cada ação no período, do resumo gravado pelo ETL
+        df_periodo = obter_periodo('acoes', periodo)
         
         if df_periodo.empty:
             return pd.DataFrame(), pd.DataFrame()
@@ -177,36 +142,34 @@ def obter_melhores_e_piores_acoes(periodo='1d'):
         return pd.DataFrame(), pd.DataFrame()
 
 
-def get_current_prices_acoes(df):
+def get_current_prices_acoes(df, cotacoes=None):
     """
     Obtém os preços atuais das ações e calcula a variação percentual em relação ao preço de compra.
     
     Args:
         df (DataFrame): DataFrame contendo as informações das ações com as colunas:
                         id_acoes, nome, preco_inicial, etc.
+        cotacoes (dict, optional): Cotações já obtidas com `etl.cotacoes.cotacoes_atuais`.
+                        Se None, as ações distintas do DataFrame são cotadas pelo cache compartilhado.
     
     Returns:
-        DataFrame: DataFrame atualizado com os preços atuais e variação percentual.
+        DataFrame: DataFrame atualizado com os preços atuais e variação percentual
+                   (NaN para ações sem cotação).
     """
     try:
         # Criar uma cópia do DataFrame para evitar SettingWithCopyWarning
         df_acoes = df.copy(deep=True)
         
-        # Mapear os símbolos das ações
-        symbol_map = {
-            "PETR4": "PETR4.SA",
-            "VALE3": "VALE3.SA",
-            "ITUB4": "ITUB4.SA", 
-            "MGLU3": "MGLU3.SA",
-            "WEGE3": "WEGE3.SA",
-            # Adicione mais mapeamentos conforme necessário
-        }
-        
-        # Calcular o preço atual em BRL e a variação percentual
-        df_acoes.loc[:, "preco_atual_br"] = df_acoes["nome"].apply(
-            lambda x: yf.Ticker(symbol_map.get(x, f"{x}.SA")).history(period="1d")["Close"].iloc[-1]
-            if x in symbol_map or x.endswith(".SA") else 0.0
-        )
+        # Mapear os símbolos das ações (None para ações sem cotação)
+        simbolos = df_acoes["nome"].map(simbolo_acao)
+        if cotacoes is None:
+            cotacoes = cotacoes_atuais(simbolos)
+        
+        # Preço atual em BRL de cada linha (NaN para ações sem cotação, em vez de um preço zero)
+        df_acoes.loc[:, "preco_atual_br"] = pd.to_numeric(simbolos.map(cotacoes), errors="coerce").astype(float)
+        sem_cotacao = sorted(set(df_acoes.loc[df_acoes["preco_atual_br"].isna(), "nome"]))
+        if sem_cotacao:
+            print(f"Sem cotação para {sem_cotacao}")
         
         # Renomear preco_inicial para manter consistência com outras tabelas
         df_acoes.loc[:, "preco_compra_br"] = df_acoes["preco_inicial"]
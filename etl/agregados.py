@@ -0,0 +1,196 @@
+"""
+Resumo por símbolo e período dos históricos, materializado durante o ETL.
+
+Logo após o download de cada classe de ativos, o ETL grava em
+`results/resumo_<classe>.csv` o preço inicial, o preço final e a variação de cada
+símbolo em todos os períodos suportados. Os rankings das páginas passam a ler
+esse arquivo (algumas linhas por símbolo) em vez de agregar o histórico completo
+a cada renderização; se o resumo não existir ou estiver desatualizado em relação
+ao histórico, o cálculo é feito a partir do histórico, como antes.
+"""
+
+import os
+
+import pandas as pd
+
+from etl.armazenamento import CLASSES, DIRETORIO_RESULTS, ler_historico
+
+# Períodos suportados. '1d', '1mo' e '1y' são os usados nas páginas:
+#   '1d'   últimos 30 dias (primeiro e último preço da janela)
+#   '1mo'  médias mensais (primeiro e último mês do histórico)
+#   '1y'   médias anuais (primeiro e último ano do histórico)
+# Os demais são janelas móveis até a data mais recente do histórico.
+JANELAS_DIAS = {"1d": 30, "7d": 7, "90d": 90, "365d": 365}
+PERIODOS = ["1d", "7d", "90d", "365d", "ytd", "1mo", "1y"]
+
+
+def _caminho_resumo(classe):
+    return os.path.join(DIRETORIO_RESULTS, f"resumo_{classe}.csv")
+
+
+def _primeiro_e_ultimo(df, coluna_nome):
+    df_periodo = (
+        df.groupby("Simbolo", sort=True)
+        .agg({"Preco": ["first", "last"], coluna_nome: "first"})
+        .reset_index()
+    )
+    df_periodo.columns = ["Simbolo", "Preco_Inicial", "Preco_Final", coluna_nome]
+    return df_periodo
+
+
+def calcular_periodo(df_historico, periodo, coluna_nome):
+    """
+    Calcula o preço inicial, o preço final e a variação de cada símbolo no período.
+
+    Args:
+        df_historico (DataFrame): Histórico com 'Data' (datetime), 'Simbolo', 'Preco'
+            e a coluna de nome, ordenado por 'Simbolo' e 'Data'.
+        periodo (str): Um dos `PERIODOS` (valores desconhecidos são tratados como '1y').
+        coluna_nome (str): Coluna com o nome do ativo (ex.: 'Nome_Empresa').
+
+    Returns:
+        DataFrame: Colunas 'Simbolo', 'Preco_Inicial', 'Preco_Final', a coluna de
+        nome e 'Variacao' (em %), uma linha por símbolo.
+    """
+    data_mais_recente = df_historico["Data"].max()
+
+    if periodo in JANELAS_DIAS or periodo == "ytd":
+        if periodo == "ytd":
+            data_inicio = pd.Timestamp(year=data_mais_recente.year, month=1, day=1)
+        else:
+            data_inicio = data_mais_recente - pd.Timedelta(days=JANELAS_DIAS[periodo])
+        df_periodo = _primeiro_e_ultimo(
+            df_historico[df_historico["Data"] >= data_inicio], coluna_nome
+        )
+    else:
+        # Médias mensais ('1mo') ou anuais ('1y') de cada símbolo
+        if periodo == "1mo":
+            agrupador = df_historico["Data"].dt.to_period("M")
+        else:
+            agrupador = df_historico["Data"].dt.year
+        df_medias = (
+            df_historico.groupby(["Simbolo", agrupador, coluna_nome])["Preco"]
+            .mean()
+            .reset_index()
+        )
+        df_periodo = _primeiro_e_ultimo(df_medias, coluna_nome)
+
+    df_periodo["Variacao"] = (
+        (df_periodo["Preco_Final"] / df_periodo["Preco_Inicial"]) - 1
+    ) * 100
+    return df_periodo
+
+
+def calcular_resumo(df_historico, classe):
+    """
+    Calcula o resumo de todos os períodos suportados para uma classe de ativos.
+
+    Args:
+        df_historico (DataFrame): Histórico completo da classe.
+        classe (str): Classe de ativo ('acoes', 'criptomoedas' ou 'cambio').
+
+    Returns:
+        DataFrame: Uma linha por período e símbolo, com a data de referência.
+    """
+    coluna_nome = CLASSES[classe]["nome"]
+    df = df_historico[["Data", "Simbolo", coluna_nome, "Preco"]].copy()
+    df["Data"] = pd.to_datetime(df["Data"])
+    df = df.sort_values(["Simbolo", "Data"], kind="stable").reset_index(drop=True)
+
+    resumos = []
+    for periodo in PERIODOS:
+        df_periodo = calcular_periodo(df, periodo, coluna_nome)
+        df_periodo.insert(0, "Periodo", periodo)
+        resumos.append(df_periodo)
+
+    df_resumo = pd.concat(resumos, ignore_index=True)
+    df_resumo["Data_Referencia"] = df["Data"].max().strftime("%Y-%m-%d")
+    return df_resumo
+
+
+def materializar_resumo(classe, df_historico=None):
+    """
+    Grava `results/resumo_<classe>.csv` com o resumo de todos os períodos.
+
+    Args:
+        classe (str): Classe de ativo ('acoes', 'criptomoedas' ou 'cambio').
+        df_historico (DataFrame, optional): Histórico completo já carregado.
+            Se None, é lido do armazenamento.
+
+    Returns:
+        bool: True se o resumo foi gravado.
+    """
+    try:
+        if df_historico is None:
+            df_historico = ler_historico(classe)
+        if df_historico.empty:
+            return False
+
+        df_resumo = calcular_resumo(df_historico, classe)
+
+        # Grava em arquivo temporário para que as páginas nunca leiam um resumo pela metade
+        caminho = _caminho_resumo(classe)
+        temporario = f"{caminho}.tmp"
+        df_resumo.to_csv(temporario, index=False)
+        os.replace(temporario, caminho)
+        return True
+
+    except Exception as e:
+        print(f"Erro ao gerar o resumo de {classe}: {str(e)}")
+        return False
+
+
+def ler_resumo(classe, periodo):
+    """
+    Lê o resumo materializado de um período.
+
+    Args:
+        classe (str): Classe de ativo ('acoes', 'criptomoedas' ou 'cambio').
+        periodo (str): Período desejado.
+
+    Returns:
+        DataFrame | None: Mesmo formato de `calcular_periodo`, ou None se o resumo
+        não existir, não tiver o período ou for mais antigo que o histórico.
+    """
+    caminho = _caminho_resumo(classe)
+    if not os.path.exists(caminho):
+        return None
+
+    historico = os.path.join(DIRETORIO_RESULTS, CLASSES[classe]["csv"])
+    if os.path.exists(historico) and os.path.getmtime(historico) > os.path.getmtime(caminho):
+        return None
+
+    df_resumo = pd.read_csv(caminho)
+    df_periodo = df_resumo[df_resumo["Periodo"] == periodo]
+    if df_periodo.empty:
+        return None
+
+    coluna_nome = CLASSES[classe]["nome"]
+    colunas = ["Simbolo", "Preco_Inicial", "Preco_Final", coluna_nome, "Variacao"]
+    return df_periodo[colunas].reset_index(drop=True)
+
+
+def obter_periodo(classe, periodo):
+    """
+    Retorna a variação de cada símbolo no período, do resumo ou do histórico.
+
+    Args:
+        classe (str): Classe de ativo ('acoes', 'criptomoedas' ou 'cambio').
+        periodo (str): Período desejado.
+
+    Returns:
+        DataFrame: Mesmo formato de `calcular_periodo`.
+    """
+    df_periodo = ler_resumo(classe, periodo)
+    if df_periodo is not None:
+        return df_periodo
+
+    coluna_nome = CLASSES[classe]["nome"]
+    df_historico = ler_historico(classe, colunas=["Data", "Simbolo", coluna_nome, "Preco"])
+    return calcular_periodo(df_historico, periodo, coluna_nome)
+
+
+if __name__ == "__main__":
+    for classe in CLASSES:
+        if materializar_resumo(classe):
+            print(f"Resumo de {classe} gerado.")
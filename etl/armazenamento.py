@@ -0,0 +1,264 @@
+"""
+Armazenamento colunar (Parquet) dos históricos gerados pelo ETL.
+
+Além dos arquivos `results/historico_*.csv`, cada histórico é gravado em
+`results/parquet/<classe>/Simbolo=<símbolo>/`, com colunas tipadas e compressão
+zstd. A leitura permite carregar apenas um símbolo, um intervalo de datas e as
+colunas necessárias, evitando o custo de interpretar o CSV inteiro.
+
+Quando o pyarrow não está instalado ou os arquivos Parquet ainda não existem,
+as funções de leitura recorrem ao CSV correspondente.
+
+Também lê o arquivo de índices econômicos (`ler_dados_economicos`), para que as
+páginas não dependam das bibliotecas usadas no download (bcb, yfinance).
+"""
+
+import os
+import shutil
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow é opcional
+    pa = ds = pq = None
+
+# Diretório de resultados do projeto (independente do diretório de execução)
+DIRETORIO_RESULTS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "results"
+)
+DIRETORIO_PARQUET = os.path.join(DIRETORIO_RESULTS, "parquet")
+
+# Classes de ativos: arquivo CSV de origem e coluna com o nome do ativo
+CLASSES = {
+    "acoes": {"csv": "historico_acoes.csv", "nome": "Nome_Empresa"},
+    "criptomoedas": {"csv": "historico_criptomoedas.csv", "nome": "Nome_Cripto"},
+    "cambio": {"csv": "historico_cambio.csv", "nome": "Nome_Moeda"},
+}
+
+# Tipos das colunas numéricas armazenadas
+TIPOS_NUMERICOS = {"Preco": "float64", "Variacao": "float64", "Volume": "float64"}
+
+# Colunas do arquivo de índices econômicos (formato longo)
+COLUNAS_INDICADORES = ["Date", "Indicador", "Valor"]
+
+
+def _caminho_classe(classe):
+    return os.path.join(DIRETORIO_PARQUET, classe)
+
+
+def parquet_disponivel(classe):
+    """Indica se existe histórico em Parquet para a classe e se o pyarrow está instalado."""
+    return pq is not None and os.path.isdir(_caminho_classe(classe))
+
+
+def salvar_particionado(df_historico, classe):
+    """
+    Grava o histórico em Parquet, particionado por símbolo.
+
+    A coluna 'Data' é gravada como data (date32) e as colunas numéricas como float64.
+    As partições dos símbolos presentes em `df_historico` são substituídas; as demais
+    são mantidas.
+
+    Args:
+        df_historico (DataFrame): Histórico com as colunas 'Data' e 'Simbolo'.
+        classe (str): Classe de ativo ('acoes', 'criptomoedas' ou 'cambio').
+
+    Returns:
+        bool: True se os arquivos foram gravados.
+    """
+    if pq is None:
+        print("pyarrow não instalado; histórico em Parquet não foi gerado.")
+        return False
+
+    if df_historico.empty:
+        return False
+
+    try:
+        df = df_historico.copy()
+        df["Data"] = pd.to_datetime(df["Data"])
+        for coluna, tipo in TIPOS_NUMERICOS.items():
+            if coluna in df.columns:
+                df[coluna] = pd.to_numeric(df[coluna], errors="coerce").astype(tipo)
+        df = df.sort_values(["Simbolo", "Data"], kind="stable")
+
+        tabela = pa.Table.from_pandas(df, preserve_index=False)
+        indice_data = tabela.schema.get_field_index("Data")
+        tabela = tabela.set_column(
+            indice_data, "Data", tabela.column("Data").cast(pa.date32())
+        )
+
+        pq.write_to_dataset(
+            tabela,
+            _caminho_classe(classe),
+            partition_cols=["Simbolo"],
+            compression="zstd",
+            existing_data_behavior="delete_matching",
+            basename_template="dados-{i}.parquet",
+        )
+        return True
+
+    except Exception as e:
+        print(f"Erro ao salvar histórico de {classe} em Parquet: {str(e)}")
+        return False
+
+
+def _ler_csv(classe, simbolos, data_inicio, data_fim, colunas):
+    nome_arquivo = os.path.join(DIRETORIO_RESULTS, CLASSES[classe]["csv"])
+    usecols = None
+    if colunas is not None:
+        usecols = list(dict.fromkeys(list(colunas) + ["Simbolo", "Data"]))
+
+    df = pd.read_csv(nome_arquivo, usecols=usecols)
+    df["Data"] = pd.to_datetime(df["Data"])
+
+    if simbolos is not None:
+        df = df[df["Simbolo"].isin(simbolos)]
+    if data_inicio is not None:
+        df = df[df["Data"] >= pd.Timestamp(data_inicio)]
+    if data_fim is not None:
+        df = df[df["Data"] <= pd.Timestamp(data_fim)]
+
+    if colunas is not None:
+        df = df[list(colunas)]
+
+    return df.reset_index(drop=True)
+
+
+def ler_historico(classe, simbolos=None, data_inicio=None, data_fim=None, colunas=None):
+    """
+    Lê o histórico de uma classe de ativos com filtros e projeção de colunas.
+
+    Args:
+        classe (str): Classe de ativo ('acoes', 'criptomoedas' ou 'cambio').
+        simbolos (list, optional): Símbolos a carregar. Se None, carrega todos.
+        data_inicio (date-like, optional): Data inicial (inclusive).
+        data_fim (date-like, optional): Data final (inclusive).
+        colunas (list, optional): Colunas a retornar. Se None, retorna todas.
+
+    Returns:
+        DataFrame: Histórico ordenado por 'Simbolo' e 'Data', com 'Data' em datetime64.
+    """
+    if not parquet_disponivel(classe):
+        return _ler_csv(classe, simbolos, data_inicio, data_fim, colunas)
+
+    particionamento = ds.partitioning(pa.schema([("Simbolo", pa.string())]), flavor="hive")
+    dataset = ds.dataset(_caminho_classe(classe), format="parquet", partitioning=particionamento)
+
+    filtro = None
+    condicoes = []
+    if simbolos is not None:
+        condicoes.append(ds.field("Simbolo").isin(list(simbolos)))
+    if data_inicio is not None:
+        condicoes.append(
+            ds.field("Data") >= pa.scalar(pd.Timestamp(data_inicio).date(), pa.date32())
+        )
+    if data_fim is not None:
+        condicoes.append(
+            ds.field("Data") <= pa.scalar(pd.Timestamp(data_fim).date(), pa.date32())
+        )
+    for condicao in condicoes:
+        filtro = condicao if filtro is None else filtro & condicao
+
+    tabela = dataset.to_table(
+        columns=list(colunas) if colunas is not None else None, filter=filtro
+    )
+    df = tabela.to_pandas(date_as_object=False)
+
+    if "Data" in df.columns:
+        df["Data"] = df["Data"].astype("datetime64[ns]")
+        ordem = [c for c in ["Simbolo", "Data"] if c in df.columns]
+        df = df.sort_values(ordem, kind="stable")
+
+    return df.reset_index(drop=True)
+
+
+def versao_historico(classe):
+    """
+    Identifica a versão do histórico de uma classe pela data de modificação do CSV.
+
+    O CSV é regravado em toda atualização do ETL (junto com o Parquet), então serve
+    de chave para caches derivados do histórico.
+
+    Returns:
+        float: Instante da última modificação, ou None se o arquivo não existir.
+    """
+    nome_arquivo = os.path.join(DIRETORIO_RESULTS, CLASSES[classe]["csv"])
+    try:
+        return os.path.getmtime(nome_arquivo)
+    except OSError:
+        return None
+
+
+def listar_simbolos(classe):
+    """
+    Lista os símbolos disponíveis de uma classe de ativos e seus nomes.
+
+    Args:
+        classe (str): Classe de ativo ('acoes', 'criptomoedas' ou 'cambio').
+
+    Returns:
+        DataFrame: Colunas 'Simbolo' e a coluna de nome da classe, um registro por símbolo,
+        em ordem alfabética de símbolo (a mesma no Parquet, cujas partições não
+        guardam a ordem do histórico, e no CSV).
+    """
+    coluna_nome = CLASSES[classe]["nome"]
+
+    if parquet_disponivel(classe):
+        df = ler_historico(classe, colunas=["Simbolo", coluna_nome])
+    else:
+        nome_arquivo = os.path.join(DIRETORIO_RESULTS, CLASSES[classe]["csv"])
+        df = pd.read_csv(nome_arquivo, usecols=["Simbolo", coluna_nome])
+
+    return df.drop_duplicates("Simbolo").sort_values("Simbolo", kind="stable").reset_index(drop=True)
+
+
+def converter_csv_para_parquet(classes=None, recriar=False):
+    """
+    Gera os arquivos Parquet a partir dos CSVs de histórico já existentes.
+
+    Args:
+        classes (list, optional): Classes a converter. Se None, converte todas.
+        recriar (bool): Se True, apaga os arquivos Parquet existentes antes de converter.
+    """
+    for classe in classes or CLASSES:
+        nome_arquivo = os.path.join(DIRETORIO_RESULTS, CLASSES[classe]["csv"])
+        if not os.path.exists(nome_arquivo):
+            print(f"Arquivo {nome_arquivo} não encontrado; conversão de {classe} ignorada.")
+            continue
+
+        if recriar and os.path.isdir(_caminho_classe(classe)):
+            shutil.rmtree(_caminho_classe(classe))
+
+        if salvar_particionado(pd.read_csv(nome_arquivo), classe):
+            print(f"Histórico de {classe} convertido para Parquet.")
+
+
+def ler_dados_economicos(nome_arquivo):
+    """
+    Lê o arquivo de índices econômicos no formato longo (Date, Indicador, Valor).
+
+    Arquivos no formato largo antigo (uma coluna por indicador) são convertidos.
+
+    Args:
+        nome_arquivo (str): Caminho do arquivo CSV.
+
+    Returns:
+        DataFrame: Colunas "Date" (datetime), "Indicador" e "Valor", ou vazio se o
+        arquivo não existir.
+    """
+    if not os.path.exists(nome_arquivo):
+        return pd.DataFrame(columns=COLUNAS_INDICADORES)
+
+    df = pd.read_csv(nome_arquivo, parse_dates=["Date"])
+    if "Indicador" not in df.columns:
+        df = df.melt(id_vars="Date", var_name="Indicador", value_name="Valor").dropna()
+
+    df["Valor"] = pd.to_numeric(df["Valor"], errors="coerce")
+    return df[COLUNAS_INDICADORES].reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    converter_csv_para_parquet(recriar=True)
@@ -0,0 +1,210 @@
+"""
+Atualização das cotações em segundo plano.
+
+Uma thread por processo consulta periodicamente as cotações de todos os ativos
+mantidos nas carteiras (tabelas `acoes` e `investimentos_cripto`) e dos pares de
+câmbio, e publica o resultado como um snapshot imutável e versionado. As páginas
+leem o snapshot mais recente sem esperar pela fonte; as mesmas cotações também
+abastecem os caches de `etl.cotacoes` e `etl.cambio`, de modo que as funções de
+preço já existentes passam a encontrar os valores prontos.
+"""
+
+import os
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from etl.cambio import _buscar_taxas_cambio, cache_cambio
+from etl.cotacoes import cache_cotacoes, obter_cotacoes, simbolo_acao, simbolo_cripto
+
+# Intervalo (segundos) entre duas atualizações; menor que o TTL dos caches para
+# que as páginas encontrem cotações atuais
+INTERVALO_ATUALIZACAO = float(os.getenv("COTACOES_INTERVALO_ATUALIZACAO", "30"))
+
+# Pares de câmbio sempre consultados
+PARES_CAMBIO = ["USDBRL=X"]
+
+# Snapshot publicado pelo atualizador. `cotacoes` e `cambio` são mapeamentos
+# somente leitura (símbolo -> preço); `instante` é o time.time() da publicação e
+# `instantes` o time.time() em que a fonte retornou cada símbolo ou par
+SnapshotCotacoes = namedtuple(
+    "SnapshotCotacoes", ["versao", "instante", "cotacoes", "cambio", "instantes"]
+)
+
+SNAPSHOT_VAZIO = SnapshotCotacoes(
+    0, None, MappingProxyType({}), MappingProxyType({}), MappingProxyType({})
+)
+
+
+def simbolos_em_carteira():
+    """
+    Retorna os símbolos do Yahoo Finance de todos os ativos mantidos nas carteiras.
+
+    Returns:
+        list: Símbolos distintos das ações (com cotação mapeada) e criptomoedas.
+    """
+    # Importado aqui porque db.db lê a configuração do banco ao ser importado
+    from db.db import get_nomes_em_carteira
+
+    df = get_nomes_em_carteira()
+    simbolos = set()
+    for classe, nome in df[["classe", "nome"]].itertuples(index=False):
+        simbolo = simbolo_acao(nome) if classe == "acoes" else simbolo_cripto(nome)
+        if simbolo:
+            simbolos.add(simbolo)
+    return sorted(simbolos)
+
+
+def _mesclar(anteriores, instantes, novos, agora, max_obsoleta):
+    """Junta os preços novos aos anteriores ainda dentro da idade máxima."""
+    precos = {
+        simbolo: preco
+        for simbolo, preco in anteriores.items()
+        if agora - instantes.get(simbolo, float("-inf")) < max_obsoleta
+    }
+    instantes_mesclados = {simbolo: instantes[simbolo] for simbolo in precos}
+    precos.update(novos)
+    instantes_mesclados.update({simbolo: agora for simbolo in novos})
+    return precos, instantes_mesclados
+
+
+class AtualizadorCotacoes:
+    """
+    Thread que atualiza as cotações periodicamente e publica snapshots imutáveis.
+
+    Cada snapshot substitui o anterior por inteiro (a referência é trocada de uma
+    vez), então quem lê `snapshot()` sempre recebe um conjunto consistente, sem
+    locks. Se uma atualização falhar, o snapshot anterior continua publicado e as
+    cotações que a fonte não retornou são mantidas do snapshot anterior, mas só
+    até a idade máxima dos caches (`COTACOES_MAX_OBSOLETA`); depois disso saem do
+    snapshot.
+
+    Args:
+        listar_simbolos (callable): Retorna os símbolos a consultar.
+        intervalo (float): Segundos entre duas atualizações.
+        pares_cambio (list): Pares de câmbio consultados em toda atualização.
+    """
+
+    def __init__(self, listar_simbolos=simbolos_em_carteira, intervalo=INTERVALO_ATUALIZACAO,
+                 pares_cambio=PARES_CAMBIO):
+        self._listar_simbolos = listar_simbolos
+        self.intervalo = intervalo
+        self.pares_cambio = list(pares_cambio)
+        self._snapshot = SNAPSHOT_VAZIO
+        self._parar = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        """Retorna o snapshot mais recente (versão 0 antes da primeira atualização)."""
+        return self._snapshot
+
+    def atualizar(self):
+        """
+        Executa uma atualização e publica um novo snapshot.
+
+        Returns:
+            SnapshotCotacoes: Snapshot publicado.
+        """
+        anterior = self._snapshot
+
+        try:
+            simbolos = self._listar_simbolos()
+        except Exception as e:
+            print(f"Erro ao listar os ativos das carteiras: {str(e)}")
+            simbolos = list(anterior.cotacoes)
+
+        cotacoes = obter_cotacoes(simbolos)
+        try:
+            cambio = _buscar_taxas_cambio(self.pares_cambio)
+        except Exception as e:
+            print(f"Erro ao atualizar o câmbio: {str(e)}")
+            cambio = {}
+
+        cache_cotacoes.publicar(cotacoes)
+        cache_cambio.publicar(cambio)
+
+        agora = time.time()
+        cotacoes, instantes_cotacoes = _mesclar(
+            anterior.cotacoes, anterior.instantes, cotacoes, agora, cache_cotacoes.max_obsoleta
+        )
+        cambio, instantes_cambio = _mesclar(
+            anterior.cambio, anterior.instantes, cambio, agora, cache_cambio.max_obsoleta
+        )
+
+        novo = SnapshotCotacoes(
+            versao=anterior.versao + 1,
+            instante=agora,
+            cotacoes=MappingProxyType(cotacoes),
+            cambio=MappingProxyType(cambio),
+            instantes=MappingProxyType({**instantes_cotacoes, **instantes_cambio}),
+        )
+        self._snapshot = novo
+        return novo
+
+    def _executar(self):
+        while not self._parar.is_set():
+            try:
+                self.atualizar()
+            except Exception as e:
+                print(f"Erro na atualização das cotações: {str(e)}")
+            self._parar.wait(self.intervalo)
+
+    def iniciar(self):
+        """Inicia a thread de atualização (chamadas repetidas não criam outra thread)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._parar.clear()
+            self._thread = threading.Thread(
+                target=self._executar, name="atualizador-cotacoes", daemon=True
+            )
+            self._thread.start()
+
+    def parar(self):
+        """Interrompe a thread de atualização."""
+        self._parar.set()
+
+
+# Atualizador compartilhado pelas páginas e sessões do processo
+atualizador_cotacoes = AtualizadorCotacoes()
+
+
+def iniciar_atualizador():
+    """Inicia o atualizador do processo e retorna o snapshot mais recente."""
+    atualizador_cotacoes.iniciar()
+    return atualizador_cotacoes.snapshot()
+
+
+def idade_snapshot(snapshot):
+    """Retorna a idade do snapshot em segundos (None se nada foi publicado)."""
+    if snapshot.instante is None:
+        return None
+    return max(0.0, time.time() - snapshot.instante)
+
+
+def precos_validos(snapshot, agora=None):
+    """
+    Retorna as cotações e taxas de câmbio do snapshot que ainda não passaram da
+    idade máxima dos caches.
+
+    O snapshot pode envelhecer depois de publicado (por exemplo, se a fonte ficar
+    indisponível); quem lê deve buscar nos caches o que ficar de fora.
+
+    Returns:
+        tuple: (cotacoes, cambio), dicionários símbolo -> preço.
+    """
+    agora = time.time() if agora is None else agora
+
+    def recentes(precos, max_obsoleta):
+        return {
+            simbolo: preco
+            for simbolo, preco in precos.items()
+            if agora - snapshot.instantes.get(simbolo, float("-inf")) < max_obsoleta
+        }
+
+    return (
+        recentes(snapshot.cotacoes, cache_cotacoes.max_obsoleta),
+        recentes(snapshot.cambio, cache_cambio.max_obsoleta),
+    )
@@ -1,14 +1,26 @@
 import yfinance as yf
 import pandas as pd
-from datetime import datetime, timedelta
-import time
 import os
+from etl.downloader import baixar_historicos_yf
+from etl.cotacoes import CacheCotacoes
+from etl.armazenamento import ler_historico, salvar_particionado
+from etl.agregados import materializar_resumo, obter_periodo
+from etl.incremental import (
+    ler_historico_existente,
+    calcular_datas_iniciais,
+    atualizar_arquivo_historico,
+)
+
+
+def baixar_historico_cambio(completo=False):
+    """
+    Baixa o histórico das principais moedas em relação ao Real e salva em um arquivo CSV.
 
+    Por padrão a atualização é incremental: para cada moeda já presente no
+    histórico são baixados apenas os dias desde a última data armazenada.
 
-def baixar_historico_cambio():
-    """
-    Baixa o histórico dos últimos 10 anos das principais moedas em relação ao Real
-    e salva em um arquivo CSV.
+    Args:
+        completo (bool): Se True, baixa novamente os últimos 10 anos de todas as moedas.
     """
     try:
         # Lista das principais moedas (em relação ao Real)
@@ -23,72 +35,81 @@ def baixar_historico_cambio():
             "CADBRL=X": "Dólar Canadense",
         }
 
-        # Data inicial (10 anos atrás)
-        data_inicial = (datetime.now() - timedelta(days=3650)).strftime("%Y-%m-%d")
+        # Determinar o caminho base do projeto
+        if os.path.exists("results"):
+            base_path = ""
+        else:
+            base_path = ".."
+
+        # Lê o histórico já armazenado e define a data inicial de cada moeda
+        nome_arquivo = os.path.join(base_path, "results", "historico_cambio.csv")
+        df_existente = pd.DataFrame() if completo else ler_historico_existente(nome_arquivo)
+        datas_iniciais = calcular_datas_iniciais(
+            df_existente, {simbolo: simbolo for simbolo in moedas}, completo
+        )
 
         # Lista para armazenar todos os dados históricos
         dados_historicos = []
 
         print("Iniciando download do histórico das moedas...")
 
-        # Processa cada moeda
-        for simbolo, nome in moedas.items():
-            try:
-                # Obtém dados históricos da moeda
-                moeda = yf.Ticker(simbolo)
-                hist = moeda.history(start=data_inicial)
+        # Baixa o histórico de todas as moedas em paralelo, respeitando o limite de taxa
+        resultados, erros = baixar_historicos_yf(moedas.keys(), datas_iniciais)
 
-                if hist.empty:
-                    continue
+        # Sem nenhum download bem-sucedido a etapa falhou, mesmo que exista histórico
+        # armazenado: retorna vazio para que o orquestrador registre a falha
+        baixados = len(moedas) - len(erros)
+        print(f"{baixados} de {len(moedas)} símbolos baixados com sucesso")
+        if baixados == 0:
+            print("\nNenhum histórico das moedas foi baixado com sucesso")
+            return pd.DataFrame()
 
-                # Adiciona informações ao histórico
-                hist["Simbolo"] = simbolo
-                hist["Nome"] = nome
+        # Processa cada moeda na ordem original
+        for simbolo, nome in moedas.items():
+            if simbolo in erros:
+                print(f"Erro ao baixar dados de {simbolo}: {str(erros[simbolo])}")
+                continue
 
-                # Reseta o índice para transformar a data em coluna
-                hist = hist.reset_index()
-                hist["Date"] = hist["Date"].dt.strftime("%Y-%m-%d")
+            hist = resultados[simbolo]
 
-                # Adiciona aos dados históricos
-                dados_historicos.append(hist)
+            if hist.empty:
+                continue
 
-                print(f"Dados baixados para {nome} ({simbolo})")
+            # Adiciona informações ao histórico
+            hist["Simbolo"] = simbolo
+            hist["Nome"] = nome
 
-                # Pausa para evitar sobrecarga na API
-                time.sleep(1)
+            # Reseta o índice para transformar a data em coluna
+            hist = hist.reset_index()
+            hist["Date"] = hist["Date"].dt.strftime("%Y-%m-%d")
 
-            except Exception as e:
-                print(f"Erro ao baixar dados de {simbolo}: {str(e)}")
-                continue
+            # Adiciona aos dados históricos
+            dados_historicos.append(hist)
+
+            print(f"Dados baixados para {nome} ({simbolo})")
 
         # Combina todos os dados históricos
         if dados_historicos:
-            df_historico = pd.concat(dados_historicos, ignore_index=True)
+            df_novo = pd.concat(dados_historicos, ignore_index=True)
 
             # Seleciona e renomeia as colunas relevantes
-            df_historico = df_historico[["Date", "Simbolo", "Nome", "Close"]]
-            df_historico.columns = ["Data", "Simbolo", "Nome_Moeda", "Preco"]
+            df_novo = df_novo[["Date", "Simbolo", "Nome", "Close"]]
+            df_novo.columns = ["Data", "Simbolo", "Nome_Moeda", "Preco"]
 
-            # Calcula a variação diária
-            df_historico["Variacao"] = (
-                df_historico.groupby("Simbolo")["Preco"].pct_change() * 100
+            # Mescla com o histórico armazenado, calcula a variação diária e salva em CSV
+            df_historico = atualizar_arquivo_historico(
+                df_novo, df_existente, nome_arquivo, completo
             )
 
-            # Determinar o caminho base do projeto
-            if os.path.exists("results"):
-                base_path = ""
-            else:
-                base_path = ".."
-
-            # Salva o histórico em CSV
-            nome_arquivo = os.path.join(base_path, "results", "historico_cambio.csv")
-            df_historico.to_csv(nome_arquivo, index=False)
+            # Grava também a versão colunar, particionada por símbolo
+            salvar_particionado(df_historico, "cambio")
+            materializar_resumo("cambio", df_historico)
             print("\nHistórico salvo com sucesso em 'historico_cambio.csv'")
 
             return df_historico
         else:
             print("\nNenhum dado histórico foi baixado")
-            return pd.DataFrame()
+            return df_existente
 
     except Exception as e:
         print(f"Erro ao processar dados históricos: {str(e)}")
@@ -103,83 +124,8 @@ def obter_variacao_cambio(periodo="1d"):
         periodo (str): Período de análise ('1d' para 30 dias, '1mo' para mensal, '1y' para anual)
     """
     try:
-        # Lê o arquivo CSV com o histórico
-        # Determinar o caminho base do projeto
-        if os.path.exists("results"):
-            base_path = ""
-        else:
-            base_path = ".."
-
-        nome_arquivo = os.path.join(base_path, "results", "historico_cambio.csv")
-        df_historico = pd.read_csv(nome_arquivo)
-        df_historico["Data"] = pd.to_datetime(df_historico["Data"])
-
-        # Obtém a data mais recente
-        data_mais_recente = df_historico["Data"].max()
-
-        # Filtra e agrega dados conforme o período
-        if periodo == "1d":
-            # Últimos 30 dias
-            data_inicio = data_mais_recente - pd.Timedelta(days=30)
-            df_periodo = df_historico[df_historico["Data"] >= data_inicio].copy()
-            df_periodo = (
-                df_periodo.groupby("Simbolo")
-                .agg({"Preco": ["first", "last"], "Nome_Moeda": "first"})
-                .reset_index()
-            )
-            df_periodo.columns = [
-                "Simbolo",
-                "Preco_Inicial",
-                "Preco_Final",
-                "Nome_Moeda",
-            ]
-
-        elif periodo == "1mo":
-            # Agregar por mês
-            df_historico["Mes_Ano"] = df_historico["Data"].dt.to_period("M")
-            df_periodo = (
-                df_historico.groupby(["Simbolo", "Mes_Ano", "Nome_Moeda"])["Preco"]
-                .mean()
-                .reset_index()
-            )
-            df_periodo = df_periodo.sort_values(["Simbolo", "Mes_Ano"])
-            df_periodo = (
-                df_periodo.groupby("Simbolo")
-                .agg({"Preco": ["first", "last"], "Nome_Moeda": "first"})
-                .reset_index()
-            )
-            df_periodo.columns = [
-                "Simbolo",
-                "Preco_Inicial",
-                "Preco_Final",
-                "Nome_Moeda",
-            ]
-
-        else:  # '1y'
-            # Agregar por ano
-            df_historico["Ano"] = df_historico["Data"].dt.year
-            df_periodo = (
-                df_historico.groupby(["Simbolo", "Ano", "Nome_Moeda"])["Preco"]
-                .mean()
-                .reset_index()
-            )
-            df_periodo = df_periodo.sort_values(["Simbolo", "Ano"])
-            df_periodo = (
-                df_periodo.groupby("Simbolo")
-                .agg({"Preco": ["first", "last"], "Nome_Moeda": "first"})
-                .reset_index()
-            )
-            df_periodo.columns = [
-                "Simbolo",
-                "Preco_Inicial",
-                "Preco_Final",
-                "Nome_Moeda",
-            ]
-
-        # Calcula a variação percentual
-        df_periodo["Variacao"] = (
-            (df_periodo["Preco_Final"] / df_periodo["Preco_Inicial"]) - 1
-        ) * 100
+        # Variação de cada moeda no período, do resumo gravado pelo ETL
+        df_periodo = obter_periodo("cambio", periodo)
 
         if df_periodo.empty:
             return pd.DataFrame()
@@ -202,11 +148,80 @@ def obter_variacao_cambio(periodo="1d"):
         return pd.DataFrame()
 
 
-def get_usdbrl_rate():
+# Timeout (segundos) da consulta da taxa de câmbio; acima disso usa o último valor do histórico
+TIMEOUT_CAMBIO = float(os.getenv("COTACOES_TIMEOUT_CAMBIO", "3"))
+
+# Taxa usada apenas se não houver cotação nem histórico
+TAXA_USDBRL_PADRAO = 5.0
+
+
+def _buscar_taxas_cambio(pares):
+    # Apenas a última cotação de cada par: uma barra diária e o preço de mercado
+    # informado nos metadados (em vez de um dia inteiro de barras de 1 minuto)
+    taxas = {}
+    for par in pares:
+        ticker = yf.Ticker(par)
+        hist = ticker.history(period="1d", interval="1d", timeout=TIMEOUT_CAMBIO)
+        preco = (ticker.history_metadata or {}).get("regularMarketPrice")
+        if preco is None and not hist.empty:
+            preco = hist["Close"].iloc[-1]
+        if preco is not None and pd.notna(preco):
+            taxas[par] = float(preco)
+    return taxas
+
+
+# Cache das taxas de câmbio compartilhado pelas páginas e sessões do processo
+cache_cambio = CacheCotacoes(_buscar_taxas_cambio)
+
+
+def ultima_taxa_armazenada(par):
+    """
+    Retorna o último valor de um par de moedas em results/historico_cambio.csv.
+
+    Args:
+        par (str): Símbolo do par no Yahoo Finance (ex.: 'USDBRL=X').
+
+    Returns:
+        float | None: Último preço armazenado, ou None se não houver histórico.
+    """
     try:
-        usdbrl = yf.Ticker("USDBRL=X")
-        hist = usdbrl.history(period="1d", interval="1m")
-        return hist["Close"].iloc[-1]
+        df = ler_historico("cambio", simbolos=[par], colunas=["Data", "Preco"])
+        df = df.dropna(subset=["Preco"])
+        if df.empty:
+            return None
+        return float(df["Preco"].iloc[-1])
     except Exception as e:
-        print(f"Erro ao buscar taxa USD/BRL: {e}")
-        return 5.0
+        print(f"Erro ao ler o histórico de {par}: {str(e)}")
+        return None
+
+
+def obter_taxa_cambio(par="USDBRL=X", padrao=None):
+    """
+    Retorna a cotação atual de um par de moedas.
+
+    A cotação vem do cache compartilhado (etl.cotacoes.CacheCotacoes). Se a fonte
+    estiver indisponível ou lenta (acima de COTACOES_TIMEOUT_CAMBIO segundos), usa o
+    último valor do histórico de câmbio e, na falta dele, `padrao`.
+
+    Args:
+        par (str): Símbolo do par no Yahoo Finance (ex.: 'USDBRL=X').
+        padrao (float, optional): Valor usado se não houver cotação nem histórico.
+
+    Returns:
+        float | None: Cotação do par.
+    """
+    taxa = cache_cambio.obter([par]).get(par)
+    if taxa is not None:
+        return taxa
+
+    taxa = ultima_taxa_armazenada(par)
+    if taxa is not None:
+        print(f"Cotação de {par} indisponível; usando o último valor do histórico: {taxa:.4f}")
+        return taxa
+
+    print(f"Erro ao buscar taxa {par}: cotação e histórico indisponíveis")
+    return padrao
+
+
+def get_usdbrl_rate():
+    return obter_taxa_cambio("USDBRL=X", padrao=TAXA_USDBRL_PADRAO)
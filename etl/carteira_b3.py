@@ -0,0 +1,146 @@
+"""
+Cliente HTTP da carteira teórica dos índices da B3.
+
+Consulta diretamente o serviço usado pela página "Carteira do Dia" da B3
+(`GetPortfolioDay`), que retorna em JSON os ativos do índice com nome, tipo,
+quantidade teórica e participação. Os parâmetros da consulta vão na própria URL,
+como um JSON codificado em base64.
+"""
+
+import base64
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+import requests
+
+from etl.downloader import TIMEOUT_REQUISICAO, baixar_em_paralelo
+from etl.replay import chamar_fonte
+
+URL_CARTEIRA_DIA = "https://sistemaswebb3-listados.b3.com.br/indexProxy/indexCall/GetPortfolioDay/"
+
+# Itens por página aceitos pelo serviço (o mesmo máximo oferecido na página da B3)
+ITENS_POR_PAGINA = 120
+
+# Colunas do arquivo "Carteira do Dia" baixado da página da B3
+COLUNAS_ARQUIVO = ["Código", "Ação", "Tipo", "Qtde. Teórica", "Part. (%)"]
+
+
+def _numero_ptbr(valor):
+    """Converte números no formato brasileiro ('1.234,56') para float."""
+    if valor is None or valor == "":
+        return None
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    return float(str(valor).strip().replace(".", "").replace(",", "."))
+
+
+def _formatar_ptbr(valor, casas):
+    """Formata um número no padrão brasileiro usado nos arquivos da B3."""
+    texto = f"{valor:,.{casas}f}"
+    return texto.replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def _url_consulta(indice, pagina):
+    parametros = {
+        "language": "pt-br",
+        "pageNumber": pagina,
+        "pageSize": ITENS_POR_PAGINA,
+        "index": indice,
+        "segment": "1",
+    }
+    codificado = base64.b64encode(json.dumps(parametros).encode("utf-8")).decode("ascii")
+    return URL_CARTEIRA_DIA + codificado
+
+
+def _consultar_pagina(indice, pagina, timeout=TIMEOUT_REQUISICAO):
+    resposta = requests.get(
+        _url_consulta(indice, pagina),
+        timeout=timeout,
+        headers={"Accept": "application/json"},
+    )
+    resposta.raise_for_status()
+    return resposta.json()
+
+
+def baixar_carteira_indice(indice="IBXL", timeout=TIMEOUT_REQUISICAO):
+    """
+    Baixa a carteira do dia de um índice da B3.
+
+    Args:
+        indice (str): Código do índice na B3 (ex.: 'IBXL' para o IBrX-50).
+        timeout (float): Timeout de cada requisição em segundos.
+
+    Returns:
+        DataFrame: Uma linha por ativo com as colunas 'Código', 'Ação', 'Tipo',
+        'Qtde. Teórica' e 'Part. (%)' (numéricas), na ordem retornada pela B3.
+        O atributo `attrs['data']` guarda a data da carteira informada pela B3.
+
+    Raises:
+        Exception: Se a consulta falhar após as tentativas ou não retornar ativos.
+    """
+    def consultar(pagina):
+        return chamar_fonte(
+            "b3_carteira",
+            f"{indice}_{pagina}",
+            lambda: _consultar_pagina(indice, pagina, timeout),
+        )
+
+    # A primeira página informa quantas páginas existem
+    resultados, erros = baixar_em_paralelo([1], consultar, limitador=None)
+    if erros:
+        raise erros[1]
+    respostas = [resultados[1]]
+
+    total_paginas = int((respostas[0].get("page") or {}).get("totalPages") or 1)
+    if total_paginas > 1:
+        paginas = list(range(2, total_paginas + 1))
+        resultados, erros = baixar_em_paralelo(paginas, consultar, limitador=None)
+        if erros:
+            raise next(iter(erros.values()))
+        respostas += [resultados[pagina] for pagina in paginas]
+
+    ativos = [ativo for resposta in respostas for ativo in resposta.get("results") or []]
+    if not ativos:
+        raise ValueError(f"A B3 não retornou ativos para o índice {indice}")
+
+    df = pd.DataFrame(
+        {
+            "Código": [ativo.get("cod", "").strip() for ativo in ativos],
+            "Ação": [(ativo.get("asset") or "").strip() for ativo in ativos],
+            "Tipo": [(ativo.get("type") or "").strip() for ativo in ativos],
+            "Qtde. Teórica": [_numero_ptbr(ativo.get("theoricalQty")) for ativo in ativos],
+            "Part. (%)": [_numero_ptbr(ativo.get("part")) for ativo in ativos],
+        }
+    )
+    df.attrs["data"] = (respostas[0].get("header") or {}).get("date")
+    return df
+
+
+def salvar_arquivo_carteira(df, nome_arquivo, indice="IBXL"):
+    """
+    Grava a carteira no mesmo formato do arquivo baixado da página da B3.
+
+    O formato (título, cabeçalho e linhas separadas por ';') é o esperado por
+    `etl.tratar_ibrx50.processar_ibrx50`.
+
+    Args:
+        df (DataFrame): Carteira retornada por `baixar_carteira_indice`.
+        nome_arquivo (str): Caminho do arquivo CSV.
+        indice (str): Código do índice, usado no título do arquivo.
+    """
+    data = df.attrs.get("data") or datetime.now().strftime("%d/%m/%y")
+    os.makedirs(os.path.dirname(nome_arquivo) or ".", exist_ok=True)
+
+    with open(nome_arquivo, "w", encoding="UTF-8") as arquivo:
+        arquivo.write(f"{indice} - Carteira do Dia {data}\n")
+        arquivo.write(";".join(COLUNAS_ARQUIVO) + ";\n")
+        for linha in df.itertuples(index=False):
+            quantidade = "" if pd.isna(linha[3]) else _formatar_ptbr(linha[3], 0)
+            participacao = "" if pd.isna(linha[4]) else _formatar_ptbr(linha[4], 3)
+            arquivo.write(f"{linha[0]};{linha[1]};{linha[2]};{quantidade};{participacao};\n")
+        arquivo.write(
+            f"Quantidade Teórica Total;;;{_formatar_ptbr(df['Qtde. Teórica'].sum(), 0)};"
+            f"{_formatar_ptbr(df['Part. (%)'].sum(), 3)};\n"
+        )
@@ -0,0 +1,353 @@
+"""
+Cliente assíncrono (asyncio + aiohttp) para cotações, históricos e séries do SGS.
+
+Todas as requisições de um lote compartilham uma única sessão HTTP (conexões
+reaproveitadas) e rodam em uma única thread: as esperas pela rede se sobrepõem,
+limitadas por um semáforo de `ETL_CONCORRENCIA_ASYNC` requisições simultâneas.
+Cada lote tem um prazo total (`ETL_PRAZO_ASYNC` segundos); o que não terminar
+dentro dele é cancelado e aparece nos erros como TimeoutError.
+
+Consulta diretamente os mesmos serviços usados pelo yfinance (API de gráficos do
+Yahoo Finance) e pelo python-bcb (API JSON do SGS). O uso nas etapas do ETL e nas
+cotações é opcional e ativado com `ETL_CLIENTE_ASYNC=1`; no modo de gravação ou
+reprodução (etl/replay.py) os caminhos síncronos continuam sendo usados.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime
+
+import aiohttp
+import pandas as pd
+
+from etl.downloader import TENTATIVAS, TIMEOUT_REQUISICAO, calcular_backoff
+from etl.instrumentacao import coletor
+from etl.replay import filtrar_periodo, modo_atual
+
+USAR_CLIENTE_ASYNC = os.getenv("ETL_CLIENTE_ASYNC", "0") == "1"
+CONCORRENCIA_ASYNC = int(os.getenv("ETL_CONCORRENCIA_ASYNC", "16"))
+PRAZO_ASYNC = float(os.getenv("ETL_PRAZO_ASYNC", "120"))
+
+URL_GRAFICO_YAHOO = "https://query2.finance.yahoo.com/v8/finance/chart/{simbolo}"
+URL_SGS = "https://api.bcb.gov.br/dados/serie/bcdata.sgs.{codigo}/dados"
+
+# O serviço do Yahoo Finance recusa requisições sem um User-Agent de navegador
+CABECALHOS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept": "application/json",
+}
+
+
+def cliente_async_ativo():
+    """Indica se os caminhos do ETL e das cotações devem usar este cliente."""
+    return USAR_CLIENTE_ASYNC and modo_atual() is None
+
+
+class ClienteAsync:
+    """
+    Sessão assíncrona com limite de concorrência e novas tentativas com backoff.
+
+    Uso:
+        async with ClienteAsync() as cliente:
+            preco = await cliente.cotacao("PETR4.SA")
+
+    Args:
+        concorrencia (int): Máximo de requisições simultâneas.
+        timeout (float): Timeout de cada requisição em segundos.
+        tentativas (int): Número máximo de tentativas por requisição.
+    """
+
+    def __init__(self, concorrencia=CONCORRENCIA_ASYNC, timeout=TIMEOUT_REQUISICAO,
+                 tentativas=TENTATIVAS):
+        self.concorrencia = concorrencia
+        self.timeout = timeout
+        self.tentativas = tentativas
+        self._sessao = None
+        self._semaforo = None
+
+    async def __aenter__(self):
+        self._semaforo = asyncio.Semaphore(self.concorrencia)
+        self._sessao = aiohttp.ClientSession(
+            headers=CABECALHOS,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            connector=aiohttp.TCPConnector(limit=self.concorrencia),
+        )
+        return self
+
+    async def __aexit__(self, *excecao):
+        await self._sessao.close()
+
+    async def _get_json(self, url, params=None):
+        """Faz um GET e retorna o JSON, com as tentativas e o backoff do ETL."""
+        for tentativa in range(self.tentativas):
+            try:
+                async with self._semaforo:
+                    async with self._sessao.get(url, params=params) as resposta:
+                        resposta.raise_for_status()
+                        return await resposta.json(content_type=None)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                if tentativa == self.tentativas - 1:
+                    raise
+                await asyncio.sleep(calcular_backoff(tentativa))
+
+    async def _grafico(self, simbolo, params):
+        dados = await self._get_json(URL_GRAFICO_YAHOO.format(simbolo=simbolo), params)
+        grafico = dados.get("chart") or {}
+        if grafico.get("error"):
+            raise ValueError(f"{simbolo}: {grafico['error'].get('description')}")
+        resultados = grafico.get("result") or []
+        if not resultados:
+            raise ValueError(f"{simbolo}: resposta sem dados")
+        return resultados[0]
+
+    async def cotacao(self, simbolo):
+        """
+        Retorna o último preço de um símbolo do Yahoo Finance.
+
+        Returns:
+            float | None: Preço de mercado, ou o último fechamento disponível.
+        """
+        resultado = await self._grafico(simbolo, {"range": "5d", "interval": "1d"})
+        preco = (resultado.get("meta") or {}).get("regularMarketPrice")
+        if preco is None:
+            fechamentos = ((resultado.get("indicators") or {}).get("quote") or [{}])[0].get("close") or []
+            precos = [valor for valor in fechamentos if valor is not None]
+            preco = precos[-1] if precos else None
+        return float(preco) if preco is not None else None
+
+    async def historico(self, simbolo, data_inicial):
+        """
+        Baixa o histórico diário de um símbolo do Yahoo Finance.
+
+        Args:
+            simbolo (str): Símbolo no formato do Yahoo Finance.
+            data_inicial (str): Data inicial no formato 'YYYY-MM-DD'.
+
+        Returns:
+            DataFrame: Mesmo formato de `yf.Ticker(...).history()` (índice 'Date' no
+            fuso da bolsa e colunas Open, High, Low, Close, Volume, Dividends e
+            Stock Splits).
+        """
+        params = {
+            "period1": int(pd.Timestamp(data_inicial, tz="UTC").timestamp()),
+            "period2": int(time.time()),
+            "interval": "1d",
+            "events": "div,splits",
+        }
+        resultado = await self._grafico(simbolo, params)
+        return _historico_para_dataframe(resultado, data_inicial)
+
+    async def serie_sgs(self, codigo, inicio, fim):
+        """
+        Consulta uma série do SGS no período.
+
+        Returns:
+            DataFrame: Mesmo formato de `bcb.sgs.get` (índice 'Date' e uma coluna
+            com o código da série).
+        """
+        params = {
+            "formato": "json",
+            "dataInicial": inicio.strftime("%d/%m/%Y"),
+            "dataFinal": fim.strftime("%d/%m/%Y"),
+        }
+        dados = await self._get_json(URL_SGS.format(codigo=codigo), params)
+        df = pd.DataFrame(dados, columns=["data", "valor"])
+        serie = pd.DataFrame(
+            {str(codigo): pd.to_numeric(df["valor"], errors="coerce").to_numpy()},
+            index=pd.DatetimeIndex(pd.to_datetime(df["data"], format="%d/%m/%Y"), name="Date"),
+        )
+        return serie
+
+
+def _historico_para_dataframe(resultado, data_inicial):
+    meta = resultado.get("meta") or {}
+    fuso = meta.get("exchangeTimezoneName") or "UTC"
+    instantes = resultado.get("timestamp") or []
+    cotacoes = ((resultado.get("indicators") or {}).get("quote") or [{}])[0]
+
+    indice = pd.DatetimeIndex(
+        pd.to_datetime(instantes, unit="s", utc=True).tz_convert(fuso).normalize(),
+        name="Date",
+    )
+    df = pd.DataFrame(
+        {
+            coluna: pd.to_numeric(pd.Series(cotacoes.get(chave) or [None] * len(indice)), errors="coerce").to_numpy()
+            for coluna, chave in [
+                ("Open", "open"),
+                ("High", "high"),
+                ("Low", "low"),
+                ("Close", "close"),
+                ("Volume", "volume"),
+            ]
+        },
+        index=indice,
+    )
+
+    eventos = resultado.get("events") or {}
+    df["Dividends"] = 0.0
+    df["Stock Splits"] = 0.0
+    for evento in (eventos.get("dividends") or {}).values():
+        data = pd.Timestamp(evento["date"], unit="s", tz="UTC").tz_convert(fuso).normalize()
+        if data in df.index:
+            df.loc[data, "Dividends"] = float(evento.get("amount") or 0)
+    for evento in (eventos.get("splits") or {}).values():
+        data = pd.Timestamp(evento["date"], unit="s", tz="UTC").tz_convert(fuso).normalize()
+        if data in df.index and evento.get("denominator"):
+            df.loc[data, "Stock Splits"] = float(evento["numerator"]) / float(evento["denominator"])
+
+    # Barras sem preço (ex.: o dia corrente antes da abertura) ficam de fora, como no yfinance
+    df = df.dropna(subset=["Close"])
+    df = df[~df.index.duplicated(keep="last")]
+    return filtrar_periodo(df, inicio=data_inicial)
+
+
+async def executar_lote(chamadas, prazo=PRAZO_ASYNC, registrar=True, **kwargs):
+    """
+    Executa várias chamadas do cliente ao mesmo tempo em uma única sessão.
+
+    Args:
+        chamadas (dict): Chave -> função assíncrona que recebe o `ClienteAsync`.
+        prazo (float): Prazo total do lote em segundos; o que não terminar é cancelado.
+        registrar (bool): Se True, registra cada chamada em `etl.instrumentacao.coletor`.
+        **kwargs: Parâmetros repassados para `ClienteAsync`.
+
+    Returns:
+        tuple: (resultados, erros), dicionários indexados pela chave, como em
+        `etl.downloader.baixar_em_paralelo`.
+    """
+    resultados, erros = {}, {}
+    if not chamadas:
+        return resultados, erros
+
+    async with ClienteAsync(**kwargs) as cliente:
+
+        async def executar(chave, chamada):
+            inicio = time.perf_counter()
+            try:
+                resultado = await chamada(cliente)
+            except Exception as e:
+                if registrar:
+                    coletor.registrar_requisicao(chave, time.perf_counter() - inicio, 1, erro=e)
+                raise
+            if registrar:
+                coletor.registrar_requisicao(chave, time.perf_counter() - inicio, 1, resultado)
+            return resultado
+
+        tarefas = {
+            asyncio.ensure_future(executar(chave, chamada)): chave
+            for chave, chamada in chamadas.items()
+        }
+        _, pendentes = await asyncio.wait(tarefas, timeout=prazo)
+
+        for tarefa in pendentes:
+            tarefa.cancel()
+        if pendentes:
+            await asyncio.gather(*pendentes, return_exceptions=True)
+
+        for tarefa, chave in tarefas.items():
+            if tarefa in pendentes:
+                erros[chave] = TimeoutError(f"Prazo de {prazo:g}s esgotado")
+            elif tarefa.exception() is not None:
+                erros[chave] = tarefa.exception()
+            else:
+                resultados[chave] = tarefa.result()
+
+    return resultados, erros
+
+
+def executar(corrotina):
+    """
+    Executa uma corrotina a partir de código síncrono e retorna o resultado.
+
+    Se a thread atual já tiver um event loop em execução, a corrotina roda em um
+    event loop próprio em outra thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(corrotina)
+
+    saida = {}
+
+    def rodar():
+        try:
+            saida["resultado"] = asyncio.run(corrotina)
+        except BaseException as e:
+            saida["erro"] = e
+
+    thread = threading.Thread(target=rodar)
+    thread.start()
+    thread.join()
+    if "erro" in saida:
+        raise saida["erro"]
+    return saida["resultado"]
+
+
+def obter_cotacoes_async(simbolos, prazo=TIMEOUT_REQUISICAO):
+    """
+    Obtém o último preço de vários símbolos com requisições simultâneas.
+
+    Returns:
+        dict: Símbolo -> preço, no mesmo formato de `etl.cotacoes.obter_cotacoes`.
+    """
+    simbolos = sorted({s for s in simbolos if isinstance(s, str) and s})
+    chamadas = {simbolo: (lambda cliente, s=simbolo: cliente.cotacao(s)) for simbolo in simbolos}
+    resultados, erros = executar(executar_lote(chamadas, prazo=prazo, registrar=False))
+    for simbolo, erro in erros.items():
+        print(f"Erro ao buscar cotação de {simbolo}: {str(erro)}")
+    return {simbolo: preco for simbolo, preco in resultados.items() if preco is not None}
+
+
+def baixar_historicos_async(datas_iniciais, prazo=PRAZO_ASYNC):
+    """
+    Baixa o histórico de vários símbolos com requisições simultâneas.
+
+    Args:
+        datas_iniciais (dict): Símbolo -> data inicial ('YYYY-MM-DD').
+
+    Returns:
+        tuple: (resultados, erros) como em `etl.downloader.baixar_historicos_yf`.
+    """
+    chamadas = {
+        simbolo: (lambda cliente, s=simbolo, d=data: cliente.historico(s, d))
+        for simbolo, data in datas_iniciais.items()
+    }
+    return executar(executar_lote(chamadas, prazo=prazo))
+
+
+def baixar_series_sgs_async(consultas, prazo=PRAZO_ASYNC):
+    """
+    Consulta várias séries/janelas do SGS com requisições simultâneas.
+
+    Args:
+        consultas (dict): Chave -> (codigo, inicio, fim), com datas datetime.
+
+    Returns:
+        tuple: (resultados, erros) indexados pela chave.
+    """
+    chamadas = {
+        chave: (lambda cliente, c=codigo, i=inicio, f=fim: cliente.serie_sgs(c, i, f))
+        for chave, (codigo, inicio, fim) in consultas.items()
+    }
+    return executar(executar_lote(chamadas, prazo=prazo))
+
+
+if __name__ == "__main__":
+    # Compara o tempo do cliente assíncrono com o download em threads
+    from etl.downloader import baixar_historicos_yf
+
+    simbolos = ["PETR4.SA", "VALE3.SA", "ITUB4.SA", "BTC-USD", "ETH-USD", "USDBRL=X"]
+    data_inicial = (datetime.now() - pd.Timedelta(days=30)).strftime("%Y-%m-%d")
+
+    inicio = time.perf_counter()
+    resultados, erros = baixar_historicos_async({s: data_inicial for s in simbolos})
+    print(f"asyncio: {len(resultados)} ok, {len(erros)} erros em {time.perf_counter() - inicio:.2f}s")
+
+    inicio = time.perf_counter()
+    resultados, erros = baixar_historicos_yf(simbolos, data_inicial)
+    print(f"threads: {len(resultados)} ok, {len(erros)} erros em {time.perf_counter() - inicio:.2f}s")
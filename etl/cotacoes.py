@@ -0,0 +1,292 @@
+"""
+Cotações atuais dos ativos da carteira, obtidas em lote no Yahoo Finance.
+
+Em vez de uma requisição por linha da carteira, os símbolos distintos são
+consultados em uma única chamada e o preço de cada um é repassado para todas
+as posições que o utilizam.
+
+As cotações ficam em um cache compartilhado por todo o processo (todas as
+sessões e reexecuções do Streamlit). Uma cotação é servida do cache enquanto
+tiver menos de `COTACOES_TTL` segundos. Depois disso, e até `COTACOES_MAX_OBSOLETA`
+segundos, o valor antigo continua sendo servido enquanto uma thread em segundo
+plano busca o novo (stale-while-revalidate). Assim a taxa de requisições à
+fonte fica limitada por símbolos/TTL, e não por usuários x reexecuções.
+"""
+
+import os
+import threading
+import time
+
+import pandas as pd
+import yfinance as yf
+
+from etl.cliente_async import cliente_async_ativo, obter_cotacoes_async
+from etl.downloader import TIMEOUT_REQUISICAO
+
+# Segundos em que uma cotação é considerada atual
+TTL_COTACOES = float(os.getenv("COTACOES_TTL", "60"))
+
+# Idade máxima (segundos) de uma cotação servida enquanto é revalidada
+MAX_OBSOLETA_COTACOES = float(os.getenv("COTACOES_MAX_OBSOLETA", "900"))
+
+# Nomes de criptomoedas gravados no banco -> símbolo no Yahoo Finance
+SIMBOLOS_CRIPTO = {
+    "Bitcoin": "BTC-USD",
+    "Ethereum": "ETH-USD",
+    "Tether": "USDT-USD",
+    "Binance Coin": "BNB-USD",
+    "Cardano": "ADA-USD",
+    "Solana": "SOL-USD",
+    "Avalanche": "AVAX-USD",
+    "Dogecoin": "DOGE-USD",
+    "Polkadot": "DOT-USD",
+}
+
+# Símbolo usado para criptomoedas sem mapeamento
+SIMBOLO_CRIPTO_PADRAO = "BTC-USD"
+
+# Ações com cotação disponível -> símbolo no Yahoo Finance
+SIMBOLOS_ACOES = {
+    "PETR4": "PETR4.SA",
+    "VALE3": "VALE3.SA",
+    "ITUB4": "ITUB4.SA",
+    "MGLU3": "MGLU3.SA",
+    "WEGE3": "WEGE3.SA",
+    # Adicione mais mapeamentos conforme necessário
+}
+
+
+def simbolo_cripto(nome):
+    """Retorna o símbolo do Yahoo Finance de uma criptomoeda do banco."""
+    return SIMBOLOS_CRIPTO.get(nome, SIMBOLO_CRIPTO_PADRAO)
+
+
+def simbolo_acao(nome):
+    """
+    Retorna o símbolo do Yahoo Finance de uma ação do banco.
+
+    Returns:
+        str | None: Símbolo, ou None se a ação não tem cotação mapeada.
+    """
+    if nome in SIMBOLOS_ACOES:
+        return SIMBOLOS_ACOES[nome]
+    if isinstance(nome, str) and nome.endswith(".SA"):
+        return nome
+    return None
+
+
+def obter_cotacoes(simbolos, timeout=TIMEOUT_REQUISICAO):
+    """
+    Obtém o último preço de fechamento de vários símbolos em uma única requisição.
+
+    Args:
+        simbolos (iterable): Símbolos no formato do Yahoo Finance (repetições e
+            valores nulos são ignorados).
+        timeout (float): Timeout da requisição em segundos.
+
+    Returns:
+        dict: Símbolo -> último preço. Símbolos sem cotação ficam fora do dicionário.
+    """
+    simbolos = sorted({s for s in simbolos if isinstance(s, str) and s})
+    if not simbolos:
+        return {}
+
+    if cliente_async_ativo():
+        return obter_cotacoes_async(simbolos, prazo=timeout)
+
+    try:
+        # Alguns dias de janela garantem um fechamento mesmo em fins de semana e feriados
+        dados = yf.download(
+            simbolos,
+            period="5d",
+            group_by="column",
+            timeout=timeout,
+            progress=False,
+            multi_level_index=True,
+        )
+    except Exception as e:
+        print(f"Erro ao buscar cotações de {simbolos}: {str(e)}")
+        return {}
+
+    if dados is None or dados.empty:
+        print(f"Nenhuma cotação retornada para {simbolos}")
+        return {}
+
+    fechamentos = dados["Close"].ffill().iloc[-1]
+    return {simbolo: float(preco) for simbolo, preco in fechamentos.items() if pd.notna(preco)}
+
+
+class CacheCotacoes:
+    """
+    Cache de cotações por símbolo, seguro entre threads, com TTL e stale-while-revalidate.
+
+    - Cotação com idade < `ttl`: servida do cache (acerto).
+    - Idade entre `ttl` e `max_obsoleta`: servida do cache e revalidada em segundo plano.
+    - Ausente ou mais antiga que `max_obsoleta`: buscada na hora (falta). Se outra
+      thread já está buscando o mesmo símbolo, a chamada aguarda essa busca em vez
+      de repetir a requisição.
+
+    Símbolos que a fonte não cotou também ficam no cache (sem preço) pelo mesmo
+    TTL, para que não sejam consultados a cada chamada. Se uma busca falhar, o
+    valor anterior é mantido e a próxima tentativa só ocorre após o TTL, tanto na
+    revalidação quanto na falta. Cotações mais antigas que `max_obsoleta` nunca são
+    retornadas, mesmo que a busca na hora tenha falhado.
+
+    Args:
+        buscar (callable): Função que recebe uma lista de símbolos e retorna um
+            dicionário símbolo -> preço (como `obter_cotacoes`).
+        ttl (float): Segundos em que uma cotação é considerada atual.
+        max_obsoleta (float): Idade máxima de uma cotação servida durante a revalidação.
+        espera_maxima (float): Tempo máximo de espera por uma busca de outra thread.
+    """
+
+    def __init__(self, buscar, ttl=TTL_COTACOES, max_obsoleta=MAX_OBSOLETA_COTACOES,
+                 espera_maxima=TIMEOUT_REQUISICAO):
+        self._buscar = buscar
+        self.ttl = ttl
+        self.max_obsoleta = max(ttl, max_obsoleta)
+        self.espera_maxima = espera_maxima
+        self._valores = {}
+        self._em_busca = {}
+        self._em_revalidacao = set()
+        self._ultima_falha = {}
+        self._lock = threading.Lock()
+        self._contadores = {
+            "acertos": 0,
+            "obsoletos": 0,
+            "faltas": 0,
+            "requisicoes": 0,
+            "simbolos_buscados": 0,
+            "erros": 0,
+        }
+
+    def _buscar_e_guardar(self, simbolos):
+        with self._lock:
+            self._contadores["requisicoes"] += 1
+            self._contadores["simbolos_buscados"] += len(simbolos)
+        try:
+            precos = self._buscar(list(simbolos)) or {}
+        except Exception as e:
+            print(f"Erro ao atualizar cotações de {simbolos}: {str(e)}")
+            precos = {}
+            with self._lock:
+                self._contadores["erros"] += 1
+
+        agora = time.monotonic()
+        with self._lock:
+            for simbolo in simbolos:
+                if simbolo in precos:
+                    self._valores[simbolo] = (precos[simbolo], agora)
+                    self._ultima_falha.pop(simbolo, None)
+                elif simbolo not in self._valores or self._valores[simbolo][0] is None:
+                    # Sem cotação: guarda a ausência para não consultar de novo antes do TTL
+                    self._valores[simbolo] = (None, agora)
+                else:
+                    # Mantém o último valor conhecido e só tenta de novo depois do TTL
+                    self._ultima_falha[simbolo] = agora
+
+    def _revalidar(self, simbolos):
+        try:
+            self._buscar_e_guardar(simbolos)
+        finally:
+            with self._lock:
+                self._em_revalidacao.difference_update(simbolos)
+
+    def obter(self, simbolos):
+        """
+        Retorna as cotações dos símbolos, buscando na fonte apenas o necessário.
+
+        Args:
+            simbolos (iterable): Símbolos (repetições e valores nulos são ignorados).
+
+        Returns:
+            dict: Símbolo -> preço. Símbolos sem cotação ficam fora do dicionário.
+        """
+        simbolos = sorted({s for s in simbolos if isinstance(s, str) and s})
+        agora = time.monotonic()
+        buscar_agora, aguardar, revalidar = [], [], []
+
+        with self._lock:
+            for simbolo in simbolos:
+                valor = self._valores.get(simbolo)
+                idade = agora - valor[1] if valor is not None else None
+
+                if idade is not None and idade < self.ttl:
+                    self._contadores["acertos"] += 1
+                elif idade is not None and idade < self.max_obsoleta:
+                    self._contadores["obsoletos"] += 1
+                    falhou_ha = agora - self._ultima_falha.get(simbolo, float("-inf"))
+                    if (
+                        simbolo not in self._em_revalidacao
+                        and simbolo not in self._em_busca
+                        and falhou_ha >= self.ttl
+                    ):
+                        self._em_revalidacao.add(simbolo)
+                        revalidar.append(simbolo)
+                else:
+                    self._contadores["faltas"] += 1
+                    falhou_ha = agora - self._ultima_falha.get(simbolo, float("-inf"))
+                    if simbolo in self._em_busca:
+                        aguardar.append(self._em_busca[simbolo])
+                    elif falhou_ha < self.ttl:
+                        # A última busca falhou há pouco: não espera outra vez pela fonte
+                        continue
+                    else:
+                        self._em_busca[simbolo] = threading.Event()
+                        buscar_agora.append(simbolo)
+
+        if revalidar:
+            threading.Thread(target=self._revalidar, args=(revalidar,), daemon=True).start()
+
+        if buscar_agora:
+            try:
+                self._buscar_e_guardar(buscar_agora)
+            finally:
+                with self._lock:
+                    for simbolo in buscar_agora:
+                        self._em_busca.pop(simbolo).set()
+
+        for evento in aguardar:
+            evento.wait(self.espera_maxima)
+
+        # Valores que a busca não renovou e passaram de `max_obsoleta` ficam de fora
+        agora = time.monotonic()
+        with self._lock:
+            return {
+                simbolo: valor[0]
+                for simbolo, valor in ((s, self._valores.get(s)) for s in simbolos)
+                if valor is not None and valor[0] is not None and agora - valor[1] < self.max_obsoleta
+            }
+
+    def publicar(self, precos):
+        """
+        Grava no cache cotações obtidas por fora (ex.: pelo atualizador em segundo plano).
+
+        Args:
+            precos (dict): Símbolo -> preço.
+        """
+        agora = time.monotonic()
+        with self._lock:
+            for simbolo, preco in precos.items():
+                self._valores[simbolo] = (preco, agora)
+                self._ultima_falha.pop(simbolo, None)
+
+    def estatisticas(self):
+        """Retorna os contadores do cache e a quantidade de símbolos armazenados."""
+        with self._lock:
+            return {**self._contadores, "simbolos_em_cache": len(self._valores)}
+
+    def limpar(self):
+        """Descarta todas as cotações armazenadas."""
+        with self._lock:
+            self._valores.clear()
+            self._ultima_falha.clear()
+
+
+# Cache compartilhado pelas páginas e sessões do processo
+cache_cotacoes = CacheCotacoes(obter_cotacoes)
+
+
+def cotacoes_atuais(simbolos):
+    """Retorna as cotações dos símbolos usando o cache compartilhado do processo."""
+    return cache_cotacoes.obter(simbolos)
@@ -1,15 +1,26 @@
-import yfinance as yf
 import pandas as pd
-from datetime import datetime, timedelta
 from etl.cambio import get_usdbrl_rate
-import time
+from etl.downloader import baixar_historicos_yf
+from etl.cotacoes import cotacoes_atuais, simbolo_cripto
+from etl.armazenamento import salvar_particionado
+from etl.agregados import materializar_resumo, obter_periodo
+from etl.incremental import (
+    ler_historico_existente,
+    calcular_datas_iniciais,
+    atualizar_arquivo_historico,
+)
 import os
 
 
-def baixar_historico_cripto():
+def baixar_historico_cripto(completo=False):
     """
-    Baixa o histórico dos últimos 10 anos das principais criptomoedas
-    e salva em um arquivo CSV.
+    Baixa o histórico das principais criptomoedas e salva em um arquivo CSV.
+
+    Por padrão a atualização é incremental: para cada criptomoeda já presente no
+    histórico são baixados apenas os dias desde a última data armazenada.
+
+    Args:
+        completo (bool): Se True, baixa novamente os últimos 10 anos de todas as criptomoedas.
     """
     try:
         # Lista das principais criptomoedas (símbolo-USD)
@@ -26,74 +37,83 @@ def baixar_historico_cripto():
             "DOT-USD": "Polkadot",
         }
 
-        # Data inicial (10 anos atrás)
-        data_inicial = (datetime.now() - timedelta(days=3650)).strftime("%Y-%m-%d")
+        # Determinar o caminho base do projeto
+        if os.path.exists("results"):
+            base_path = ""
+        else:
+            base_path = ".."
+
+        # Lê o histórico já armazenado e define a data inicial de cada criptomoeda
+        nome_arquivo = os.path.join(base_path, "results", "historico_criptomoedas.csv")
+        df_existente = pd.DataFrame() if completo else ler_historico_existente(nome_arquivo)
+        datas_iniciais = calcular_datas_iniciais(
+            df_existente,
+            {simbolo: simbolo.replace("-USD", "") for simbolo in criptos},
+            completo,
+        )
 
         # Lista para armazenar todos os dados históricos
         dados_historicos = []
 
         print("Iniciando download do histórico das criptomoedas...")
 
-        # Processa cada criptomoeda
-        for simbolo, nome in criptos.items():
-            try:
-                # Obtém dados históricos da criptomoeda
-                cripto = yf.Ticker(simbolo)
-                hist = cripto.history(start=data_inicial)
+        # Baixa o histórico de todas as criptomoedas em paralelo, respeitando o limite de taxa
+        resultados, erros = baixar_historicos_yf(criptos.keys(), datas_iniciais)
 
-                if hist.empty:
-                    continue
+        # Sem nenhum download bem-sucedido a etapa falhou, mesmo que exista histórico
+        # armazenado: retorna vazio para que o orquestrador registre a falha
+        baixados = len(criptos) - len(erros)
+        print(f"{baixados} de {len(criptos)} símbolos baixados com sucesso")
+        if baixados == 0:
+            print("\nNenhum histórico das criptomoedas foi baixado com sucesso")
+            return pd.DataFrame()
 
-                # Adiciona informações ao histórico
-                hist["Simbolo"] = simbolo.replace("-USD", "")
-                hist["Nome"] = nome
+        # Processa cada criptomoeda na ordem original
+        for simbolo, nome in criptos.items():
+            if simbolo in erros:
+                print(f"Erro ao baixar dados de {simbolo}: {str(erros[simbolo])}")
+                continue
 
-                # Reseta o índice para transformar a data em coluna
-                hist = hist.reset_index()
-                hist["Date"] = hist["Date"].dt.strftime("%Y-%m-%d")
+            hist = resultados[simbolo]
 
-                # Adiciona aos dados históricos
-                dados_historicos.append(hist)
+            if hist.empty:
+                continue
 
-                print(f"Dados baixados para {simbolo}")
+            # Adiciona informações ao histórico
+            hist["Simbolo"] = simbolo.replace("-USD", "")
+            hist["Nome"] = nome
 
-                # Pausa para evitar sobrecarga na API
-                time.sleep(1)
+            # Reseta o índice para transformar a data em coluna
+            hist = hist.reset_index()
+            hist["Date"] = hist["Date"].dt.strftime("%Y-%m-%d")
 
-            except Exception as e:
-                print(f"Erro ao baixar dados de {simbolo}: {str(e)}")
-                continue
+            # Adiciona aos dados históricos
+            dados_historicos.append(hist)
+
+            print(f"Dados baixados para {simbolo}")
 
         # Combina todos os dados históricos
         if dados_historicos:
-            df_historico = pd.concat(dados_historicos, ignore_index=True)
+            df_novo = pd.concat(dados_historicos, ignore_index=True)
 
             # Seleciona e renomeia as colunas relevantes
-            df_historico = df_historico[["Date", "Simbolo", "Nome", "Close", "Volume"]]
-            df_historico.columns = ["Data", "Simbolo", "Nome_Cripto", "Preco", "Volume"]
+            df_novo = df_novo[["Date", "Simbolo", "Nome", "Close", "Volume"]]
+            df_novo.columns = ["Data", "Simbolo", "Nome_Cripto", "Preco", "Volume"]
 
-            # Calcula a variação diária
-            df_historico["Variacao"] = (
-                df_historico.groupby("Simbolo")["Preco"].pct_change() * 100
+            # Mescla com o histórico armazenado, calcula a variação diária e salva em CSV
+            df_historico = atualizar_arquivo_historico(
+                df_novo, df_existente, nome_arquivo, completo
             )
 
-            # Determinar o caminho base do projeto
-            if os.path.exists("results"):
-                base_path = ""
-            else:
-                base_path = ".."
-
-            # Salva o histórico em CSV
-            nome_arquivo = os.path.join(
-                base_path, "results", "historico_criptomoedas.csv"
-            )
-            df_historico.to_csv(nome_arquivo, index=False)
+            # Grava também a versão colunar, particionada por símbolo
+            salvar_particionado(df_historico, "criptomoedas")
+            materializar_resumo("criptomoedas", df_historico)
             print("\nHistórico salvo com sucesso em 'historico_criptomoedas.csv'")
 
             return df_historico
         else:
             print("\nNenhum dado histórico foi baixado")
-            return pd.DataFrame()
+            return df_existente
 
     except Exception as e:
         print(f"Erro ao processar dados históricos: {str(e)}")
@@ -108,83 +128,8 @@ def obter_melhores_e_piores_cripto(periodo="1d"):
         periodo (str): Período de análise ('1d' para 30 dias, '1mo' para mensal, '1y' para anual)
     """
     try:
-        # Determinar o caminho base do projeto
-        if os.path.exists("results"):
-            base_path = ""
-        else:
-            base_path = ".."
-
-        # Lê o arquivo CSV com o histórico
-        nome_arquivo = os.path.join(base_path, "results", "historico_criptomoedas.csv")
-        df_historico = pd.read_csv(nome_arquivo)
-        df_historico["Data"] = pd.to_datetime(df_historico["Data"])
-
-        # Obtém a data mais recente
-        data_mais_recente = df_historico["Data"].max()
-
-        # Filtra e agrega dados conforme o período
-        if periodo == "1d":
-            # Últimos 30 dias
-            data_inicio = data_mais_recente - pd.Timedelta(days=30)
-            df_periodo = df_historico[df_historico["Data"] >= data_inicio].copy()
-            df_periodo = (
-                df_periodo.groupby("Simbolo")
-                .agg({"Preco": ["first", "last"], "Nome_Cripto": "first"})
-                .reset_index()
-            )
-            df_periodo.columns = [
-                "Simbolo",
-                "Preco_Inicial",
-                "Preco_Final",
-                "Nome_Cripto",
-            ]
-
-        elif periodo == "1mo":
-            # Agregar por mês
-            df_historico["Mes_Ano"] = df_historico["Data"].dt.to_period("M")
-            df_periodo = (
-                df_historico.groupby(["Simbolo", "Mes_Ano", "Nome_Cripto"])["Preco"]
-                .mean()
-                .reset_index()
-            )
-            df_periodo = df_periodo.sort_values(["Simbolo", "Mes_Ano"])
-            df_periodo = (
-                df_periodo.groupby("Simbolo")
-                .agg({"Preco": ["first", "last"], "Nome_Cripto": "first"})
-                .reset_index()
-            )
-            df_periodo.columns = [
-                "Simbolo",
-                "Preco_Inicial",
-                "Preco_Final",
-                "Nome_Cripto",
-            ]
-
-        else:  # '1y'
-            # Agregar por ano
-            df_historico["Ano"] = df_historico["Data"].dt.year
-            df_periodo = (
-                df_historico.groupby(["Simbolo", "Ano", "Nome_Cripto"])["Preco"]
-                .mean()
-                .reset_index()
-            )
-            df_periodo = df_periodo.sort_values(["Simbolo", "Ano"])
-            df_periodo = (
-                df_periodo.groupby("Simbolo")
-                .agg({"Preco": ["first", "last"], "Nome_Cripto": "first"})
-                .reset_index()
-            )
-            df_periodo.columns = [
-                "Simbolo",
-                "Preco_Inicial",
-                "Preco_Final",
-                "Nome_Cripto",
-            ]
-
-        # Calcula a variação percentual
-        df_periodo["Variacao"] = (
-            (df_periodo["Preco_Final"] / df_periodo["Preco_Inicial"]) - 1
-        ) * 100
+        # Variação de cada criptomoeda no período, do resumo gravado pelo ETL
+        df_periodo = obter_periodo("criptomoedas", periodo)
 
         if df_periodo.empty:
             return pd.DataFrame(), pd.DataFrame()
@@ -210,26 +155,35 @@ def obter_melhores_e_piores_cripto(periodo="1d"):
         return pd.DataFrame(), pd.DataFrame()
 
 
-def get_current_prices(df):
-    symbol_map = {
-        "Bitcoin": "BTC-USD",
-        "Ethereum": "ETH-USD",
-        "Tether": "USDT-USD",
-        "Binance Coin": "BNB-USD",
-        "Cardano": "ADA-USD",
-        "Solana": "SOL-USD",
-        "Avalanche": "AVAX-USD",
-        "Dogecoin": "DOGE-USD",
-        "Polkadot": "DOT-USD",
-    }
-
-    # Busca preço atual em USD
-    df["preco_atual_us"] = df["nome"].apply(
-        lambda x: yf.Ticker(symbol_map.get(x, "BTC-USD")).history(period="1d")["Close"].iloc[-1]
-    )
+def get_current_prices(df, cotacoes=None, taxa_usdbrl=None):
+    """
+    Obtém os preços atuais das criptomoedas em USD e BRL e a variação em relação à compra.
+
+    Args:
+        df (DataFrame): Criptomoedas com a coluna 'nome' (e opcionalmente 'preco_compra'
+            e 'valor_investido').
+        cotacoes (dict, optional): Cotações já obtidas com `etl.cotacoes.cotacoes_atuais`.
+            Se None, as criptomoedas distintas do DataFrame são cotadas pelo cache compartilhado.
+        taxa_usdbrl (float, optional): Cotação do dólar. Se None, é consultada.
+
+    Returns:
+        DataFrame: O próprio `df` com as colunas de preço atual e variação (NaN para
+        criptomoedas sem cotação).
+    """
+    simbolos = df["nome"].map(simbolo_cripto)
+    if cotacoes is None:
+        cotacoes = cotacoes_atuais(simbolos)
+
+    # Busca preço atual em USD (NaN para criptomoedas sem cotação, em vez de um preço zero)
+    df["preco_atual_us"] = pd.to_numeric(simbolos.map(cotacoes), errors="coerce")
+    sem_cotacao = sorted(set(simbolos[df["preco_atual_us"].isna()]))
+    if sem_cotacao:
+        print(f"Sem cotação para {sem_cotacao}")
 
     # Conversão para BRL
-    df["preco_atual_br"] = df["preco_atual_us"] * get_usdbrl_rate()
+    if taxa_usdbrl is None:
+        taxa_usdbrl = get_usdbrl_rate()
+    df["preco_atual_br"] = df["preco_atual_us"] * taxa_usdbrl
     
     # Adiciona a coluna preco_compra_br se não existir
     if "preco_compra" in df.columns and "preco_compra_br" not in df.columns:
@@ -0,0 +1,247 @@
+"""
+Motor de download concorrente e com limite de taxa usado pelas etapas do ETL.
+
+As configurações padrão podem ser ajustadas por variáveis de ambiente:
+    ETL_MAX_WORKERS         número máximo de downloads simultâneos
+    ETL_TAXA_REQUISICOES    requisições por segundo liberadas pelo token bucket
+    ETL_CAPACIDADE_RAJADA   quantidade de requisições permitidas em rajada
+    ETL_TIMEOUT_REQUISICAO  timeout (segundos) de cada requisição
+    ETL_TENTATIVAS          número de tentativas por símbolo
+    ETL_BACKOFF_BASE        espera base (segundos) do backoff exponencial
+    ETL_BACKOFF_MAXIMO      espera máxima (segundos) entre tentativas
+"""
+
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import yfinance as yf
+
+from etl.instrumentacao import coletor
+from etl.replay import chamar_fonte, filtrar_periodo
+
+MAX_WORKERS = int(os.getenv("ETL_MAX_WORKERS", "8"))
+TAXA_REQUISICOES = float(os.getenv("ETL_TAXA_REQUISICOES", "4"))
+CAPACIDADE_RAJADA = int(os.getenv("ETL_CAPACIDADE_RAJADA", "4"))
+TIMEOUT_REQUISICAO = float(os.getenv("ETL_TIMEOUT_REQUISICAO", "30"))
+TENTATIVAS = int(os.getenv("ETL_TENTATIVAS", "3"))
+BACKOFF_BASE = float(os.getenv("ETL_BACKOFF_BASE", "1"))
+BACKOFF_MAXIMO = float(os.getenv("ETL_BACKOFF_MAXIMO", "30"))
+
+
+class LimitadorTaxa:
+    """
+    Limitador de taxa no formato token bucket, seguro para uso entre threads.
+
+    O balde começa cheio com `capacidade` fichas e é reabastecido com `taxa`
+    fichas por segundo. Cada requisição consome uma ficha; quando o balde está
+    vazio a thread espera apenas o tempo necessário para a próxima ficha.
+
+    Args:
+        taxa (float): Fichas repostas por segundo. Valores <= 0 desativam o limite.
+        capacidade (int, optional): Tamanho máximo da rajada. Padrão: max(1, taxa).
+    """
+
+    def __init__(self, taxa, capacidade=None):
+        self.taxa = taxa
+        self.capacidade = capacidade or max(1, int(taxa))
+        self._fichas = float(self.capacidade)
+        self._ultima_reposicao = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        """Bloqueia até que haja uma ficha disponível e a consome."""
+        if self.taxa <= 0:
+            return
+
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                decorrido = agora - self._ultima_reposicao
+                self._fichas = min(self.capacidade, self._fichas + decorrido * self.taxa)
+                self._ultima_reposicao = agora
+
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+
+                espera = (1 - self._fichas) / self.taxa
+
+            time.sleep(espera)
+
+
+# Limitador compartilhado por todas as etapas do processo, para que downloads
+# executados ao mesmo tempo respeitem um único limite de taxa
+limitador_padrao = LimitadorTaxa(TAXA_REQUISICOES, CAPACIDADE_RAJADA)
+
+
+def calcular_backoff(tentativa, base=BACKOFF_BASE, maximo=BACKOFF_MAXIMO):
+    """
+    Calcula a espera antes de uma nova tentativa (backoff exponencial com jitter completo).
+
+    Args:
+        tentativa (int): Número da tentativa que falhou, começando em 0.
+        base (float): Espera base em segundos.
+        maximo (float): Espera máxima em segundos.
+
+    Returns:
+        float: Tempo de espera em segundos, sorteado entre 0 e min(maximo, base * 2**tentativa).
+    """
+    return random.uniform(0, min(maximo, base * 2**tentativa))
+
+
+def executar_com_retentativas(funcao, *args, tentativas=TENTATIVAS, limitador=None, **kwargs):
+    """
+    Executa `funcao(*args, **kwargs)` respeitando o limitador de taxa e repetindo em caso de erro.
+
+    Args:
+        funcao (callable): Função a ser executada.
+        tentativas (int): Número máximo de tentativas.
+        limitador (LimitadorTaxa, optional): Limitador consultado antes de cada tentativa.
+
+    Returns:
+        O retorno de `funcao`.
+
+    Raises:
+        Exception: A última exceção lançada caso todas as tentativas falhem.
+    """
+    ultima_excecao = None
+
+    for tentativa in range(tentativas):
+        if limitador is not None:
+            limitador.adquirir()
+        try:
+            return funcao(*args, **kwargs)
+        except Exception as e:
+            ultima_excecao = e
+            if tentativa < tentativas - 1:
+                time.sleep(calcular_backoff(tentativa))
+
+    raise ultima_excecao
+
+
+def baixar_em_paralelo(
+    itens,
+    funcao,
+    max_workers=MAX_WORKERS,
+    limitador=limitador_padrao,
+    tentativas=TENTATIVAS,
+):
+    """
+    Executa `funcao(item)` para cada item em um pool limitado de threads.
+
+    Cada chamada passa pelo limitador de taxa e é repetida com backoff em caso de erro,
+    de modo que o tempo total depende do limite de taxa e não da soma das latências.
+    O tempo, as requisições e o volume de cada item são registrados em
+    `etl.instrumentacao.coletor`.
+
+    Args:
+        itens (iterable): Itens a serem processados (por exemplo, símbolos).
+        funcao (callable): Função chamada com um item por vez.
+        max_workers (int): Número máximo de threads simultâneas.
+        limitador (LimitadorTaxa, optional): Limitador de taxa compartilhado.
+        tentativas (int): Número máximo de tentativas por item.
+
+    Returns:
+        tuple: (resultados, erros), dicionários indexados pelo item com o retorno
+        da função ou com a exceção da última tentativa.
+    """
+    itens = list(itens)
+    resultados = {}
+    erros = {}
+
+    if not itens:
+        return resultados, erros
+
+    def executar_item(item):
+        # Conta as requisições do item e registra suas métricas no coletor da execução
+        requisicoes = 0
+
+        def chamada(*args):
+            nonlocal requisicoes
+            requisicoes += 1
+            return funcao(*args)
+
+        inicio = time.perf_counter()
+        try:
+            resultado = executar_com_retentativas(
+                chamada, item, tentativas=tentativas, limitador=limitador
+            )
+        except Exception as e:
+            coletor.registrar_requisicao(item, time.perf_counter() - inicio, requisicoes, erro=e)
+            raise
+        coletor.registrar_requisicao(item, time.perf_counter() - inicio, requisicoes, resultado)
+        return resultado
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(itens)))) as executor:
+        # Cada item roda em uma cópia do contexto atual para manter a etapa do ETL
+        futuros = {
+            executor.submit(contextvars.copy_context().run, executar_item, item): item
+            for item in itens
+        }
+
+        for futuro in as_completed(futuros):
+            item = futuros[futuro]
+            try:
+                resultados[item] = futuro.result()
+            except Exception as e:
+                erros[item] = e
+
+    return resultados, erros
+
+
+def baixar_historico_yf(simbolo, data_inicial, timeout=TIMEOUT_REQUISICAO):
+    """
+    Baixa o histórico diário de um símbolo do Yahoo Finance.
+
+    Args:
+        simbolo (str): Símbolo no formato do Yahoo Finance (ex.: 'PETR4.SA', 'BTC-USD').
+        data_inicial (str): Data inicial no formato 'YYYY-MM-DD'.
+        timeout (float): Timeout da requisição em segundos.
+
+    Returns:
+        DataFrame: Histórico retornado pelo yfinance (pode ser vazio).
+    """
+    return chamar_fonte(
+        "yfinance_historico",
+        simbolo,
+        lambda: yf.Ticker(simbolo).history(
+            start=data_inicial, timeout=timeout, raise_errors=True
+        ),
+        recorte=lambda hist: filtrar_periodo(hist, inicio=data_inicial),
+    )
+
+
+def baixar_historicos_yf(simbolos, data_inicial, **kwargs):
+    """
+    Baixa o histórico de vários símbolos do Yahoo Finance em paralelo.
+
+    Args:
+        simbolos (iterable): Símbolos no formato do Yahoo Finance.
+        data_inicial (str | dict): Data inicial no formato 'YYYY-MM-DD', comum a todos
+            os símbolos ou indexada por símbolo (download incremental).
+        **kwargs: Parâmetros repassados para `baixar_em_paralelo`.
+
+    Returns:
+        tuple: (resultados, erros) como em `baixar_em_paralelo`.
+    """
+    if isinstance(data_inicial, dict):
+        datas_iniciais = {simbolo: data_inicial[simbolo] for simbolo in simbolos}
+    else:
+        datas_iniciais = {simbolo: data_inicial for simbolo in simbolos}
+
+    # Com ETL_CLIENTE_ASYNC=1 os históricos são baixados pelo cliente assíncrono
+    # (importado aqui porque etl.cliente_async depende deste módulo)
+    from etl.cliente_async import baixar_historicos_async, cliente_async_ativo
+
+    if cliente_async_ativo():
+        return baixar_historicos_async(datas_iniciais)
+
+    return baixar_em_paralelo(
+        datas_iniciais.keys(),
+        lambda simbolo: baixar_historico_yf(simbolo, datas_iniciais[simbolo]),
+        **kwargs,
+    )
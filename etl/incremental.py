@@ -0,0 +1,143 @@
+"""
+Funções de apoio para a atualização incremental dos arquivos de histórico.
+
+Em vez de baixar 10 anos de dados a cada execução, o ETL lê a última data
+armazenada de cada símbolo e baixa apenas a janela que falta, com alguns dias
+de sobreposição para capturar revisões feitas pela fonte.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Quantidade de dias do histórico completo (10 anos)
+DIAS_HISTORICO = 3650
+
+# Dias rebaixados antes da última data armazenada, para capturar revisões
+SOBREPOSICAO_DIAS = int(os.getenv("ETL_SOBREPOSICAO_DIAS", "5"))
+
+
+def ler_historico_existente(nome_arquivo):
+    """
+    Lê o arquivo de histórico já salvo, se existir.
+
+    Args:
+        nome_arquivo (str): Caminho do arquivo CSV de histórico.
+
+    Returns:
+        DataFrame: Histórico armazenado ou DataFrame vazio se o arquivo não existir.
+    """
+    if not os.path.exists(nome_arquivo):
+        return pd.DataFrame()
+
+    try:
+        return pd.read_csv(nome_arquivo)
+    except Exception as e:
+        print(f"Erro ao ler histórico existente em {nome_arquivo}: {str(e)}")
+        return pd.DataFrame()
+
+
+def calcular_datas_iniciais(df_existente, simbolos, completo=False, sobreposicao=SOBREPOSICAO_DIAS):
+    """
+    Calcula a data inicial de download de cada símbolo.
+
+    Args:
+        df_existente (DataFrame): Histórico armazenado (colunas 'Data' e 'Simbolo').
+        simbolos (dict): Mapeamento símbolo de download -> símbolo armazenado em 'Simbolo'.
+        completo (bool): Se True, ignora o histórico e baixa os 10 anos completos.
+        sobreposicao (int): Dias rebaixados antes da última data armazenada.
+
+    Returns:
+        dict: Símbolo de download -> data inicial no formato 'YYYY-MM-DD'.
+    """
+    data_completa = (datetime.now() - timedelta(days=DIAS_HISTORICO)).strftime("%Y-%m-%d")
+
+    ultimas_datas = {}
+    if not completo and not df_existente.empty:
+        ultimas_datas = df_existente.groupby("Simbolo")["Data"].max().to_dict()
+
+    datas_iniciais = {}
+    for simbolo_download, simbolo in simbolos.items():
+        ultima_data = ultimas_datas.get(simbolo)
+        if ultima_data is None:
+            datas_iniciais[simbolo_download] = data_completa
+        else:
+            inicio = pd.to_datetime(ultima_data) - timedelta(days=sobreposicao)
+            datas_iniciais[simbolo_download] = inicio.strftime("%Y-%m-%d")
+
+    return datas_iniciais
+
+
+def atualizar_arquivo_historico(df_novo, df_existente, nome_arquivo, completo=False):
+    """
+    Mescla os dados recém-baixados ao histórico armazenado e grava o resultado.
+
+    As linhas novas substituem as armazenadas com a mesma ('Simbolo', 'Data'). A
+    coluna 'Variacao' é recalculada apenas para as linhas novas, usando o preço
+    anterior já armazenado como referência. Se nenhuma linha armazenada foi
+    revisada, as linhas posteriores à última data são apenas acrescentadas ao
+    arquivo; caso contrário o arquivo é reescrito.
+
+    Args:
+        df_novo (DataFrame): Dados baixados com as colunas 'Data', 'Simbolo' e 'Preco'.
+        df_existente (DataFrame): Histórico armazenado (pode ser vazio).
+        nome_arquivo (str): Caminho do arquivo CSV de histórico.
+        completo (bool): Se True, descarta o histórico armazenado e reescreve o arquivo.
+
+    Returns:
+        DataFrame: Histórico completo após a atualização.
+    """
+    colunas = list(df_novo.columns) + ["Variacao"]
+
+    if completo or df_existente.empty:
+        df_historico = df_novo.copy()
+        df_historico["Variacao"] = df_historico.groupby("Simbolo")["Preco"].pct_change() * 100
+        df_historico.to_csv(nome_arquivo, index=False)
+        return df_historico
+
+    df_existente = df_existente[colunas]
+    df_novo = df_novo.copy()
+    df_novo["_novo"] = True
+
+    # Linhas armazenadas que foram rebaixadas na janela de sobreposição
+    chaves_novas = pd.MultiIndex.from_frame(df_novo[["Simbolo", "Data"]])
+    chaves_existentes = pd.MultiIndex.from_frame(df_existente[["Simbolo", "Data"]])
+    sobrepostas = chaves_existentes.isin(chaves_novas)
+
+    # Verifica se a fonte revisou algum preço já armazenado
+    revisadas = df_existente[sobrepostas].merge(
+        df_novo[["Simbolo", "Data", "Preco"]], on=["Simbolo", "Data"], suffixes=("", "_novo")
+    )
+    houve_revisao = not np.allclose(
+        revisadas["Preco"], revisadas["Preco_novo"], rtol=1e-9, equal_nan=True
+    )
+
+    df_historico = pd.concat([df_existente[~sobrepostas], df_novo], ignore_index=True)
+    df_historico["_novo"] = df_historico["_novo"].fillna(False).astype(bool)
+    df_historico = df_historico.sort_values(["Simbolo", "Data"], kind="stable").reset_index(drop=True)
+
+    # Recalcula a variação diária apenas nas linhas novas (emendas com o histórico)
+    novas = df_historico["_novo"].to_numpy()
+    preco_anterior = df_historico.groupby("Simbolo")["Preco"].shift(1)
+    df_historico.loc[novas, "Variacao"] = (
+        df_historico.loc[novas, "Preco"] / preco_anterior[novas] - 1
+    ) * 100
+
+    if houve_revisao:
+        df_historico = df_historico[colunas]
+        df_historico.to_csv(nome_arquivo, index=False)
+        print("Revisões detectadas na janela de sobreposição; arquivo reescrito.")
+        return df_historico
+
+    # Acrescenta ao arquivo apenas as linhas posteriores à última data armazenada
+    ultimas_datas = df_existente.groupby("Simbolo")["Data"].max()
+    ultima_data = df_historico["Simbolo"].map(ultimas_datas)
+    acrescentar = novas & (ultima_data.isna() | (df_historico["Data"] > ultima_data)).to_numpy()
+
+    df_historico = df_historico[colunas]
+    df_historico[acrescentar].to_csv(nome_arquivo, mode="a", header=False, index=False)
+    print(f"{int(acrescentar.sum())} novas linhas acrescentadas ao histórico.")
+
+    return df_historico
@@ -1,42 +1,163 @@
 from bcb import sgs
 from datetime import datetime, timedelta
+import os
 import pandas as pd
+from etl.armazenamento import COLUNAS_INDICADORES, ler_dados_economicos
+from etl.cliente_async import baixar_series_sgs_async, cliente_async_ativo
+from etl.downloader import baixar_em_paralelo
+from etl.incremental import DIAS_HISTORICO
+from etl.replay import chamar_fonte, filtrar_periodo
+
+# Códigos das séries temporais do BCB
+CODIGOS = {
+    'SELIC': 432,      # Taxa Selic
+    'IPCA': 433,       # IPCA - Índice nacional de preços ao consumidor-amplo
+    'IGP-M': 189,      # IGP-M - Índice geral de preços do mercado
+    'INPC': 188,       # INPC - Índice nacional de preços ao consumidor
+    'CDI': 12,         # Taxa CDI
+    'PIB_MENSAL': 4380 # PIB Mensal - Valores correntes (em R$ milhões)
+}
+
+# O SGS recusa consultas de séries diárias com mais de 10 anos; os períodos longos
+# são divididos em janelas alinhadas ao calendário com este número de anos
+JANELA_ANOS = int(os.getenv("ETL_SGS_JANELA_ANOS", "5"))
+
+# Dias consultados novamente antes da última data armazenada de cada série, para
+# capturar revisões (os índices mensais podem ser revistos nos meses seguintes)
+SOBREPOSICAO_DIAS_SGS = int(os.getenv("ETL_SGS_SOBREPOSICAO_DIAS", "90"))
+
+def dividir_em_janelas(data_inicial, data_final, anos=JANELA_ANOS):
+    """
+    Divide um período em janelas de no máximo `anos` anos, alinhadas ao calendário.
+
+    As janelas começam em 1º de janeiro de anos múltiplos de `anos`, de modo que a
+    mesma janela é consultada com os mesmos limites em execuções diferentes.
+
+    Args:
+        data_inicial (datetime): Início do período.
+        data_final (datetime): Fim do período.
+        anos (int): Tamanho máximo de cada janela em anos.
+
+    Returns:
+        list: Tuplas (ano_da_janela, inicio, fim) com os limites de cada consulta.
+    """
+    janelas = []
+    ano = data_inicial.year - data_inicial.year % anos
+    while datetime(ano, 1, 1) <= data_final:
+        inicio_janela = datetime(ano, 1, 1)
+        fim_janela = datetime(ano + anos - 1, 12, 31)
+        janelas.append((ano, max(inicio_janela, data_inicial), min(fim_janela, data_final)))
+        ano += anos
+    return janelas
+
+
+def _baixar_janela(item):
+    nome, ano, inicio, fim = item
+    codigo = CODIGOS[nome]
+    return chamar_fonte(
+        'bcb_sgs',
+        f'{codigo}_{ano}',
+        lambda: sgs.get(codigo, start=inicio, end=fim),
+        recorte=lambda serie: filtrar_periodo(serie, inicio, fim),
+    )
+
+
+def buscar_dados_economicos(completo=False):
+    """
+    Atualiza os índices econômicos do BCB em results/dados_economicos.csv.
+
+    As séries são consultadas em paralelo, em janelas aceitas pelo SGS, e
+    armazenadas no formato longo (Date, Indicador, Valor), cada uma na sua
+    frequência original. Por padrão só é consultado o período desde a última data
+    armazenada de cada série (com sobreposição para capturar revisões).
+
+    Args:
+        completo (bool): Se True, consulta novamente os últimos 10 anos de todas as séries.
+
+    Returns:
+        DataFrame: Todas as séries no formato longo, ou vazio se todas as consultas
+        ao SGS falharem.
+    """
+    # Determinar o caminho base do projeto
+    if os.path.exists('results'):
+        base_path = ''
+    else:
+        base_path = '..'
+    nome_arquivo = os.path.join(base_path, 'results', 'dados_economicos.csv')
 
-def buscar_dados_economicos():
-    # Calculando a data inicial (10 anos atrás)
     data_final = datetime.now()
-    data_inicial = data_final - timedelta(days=365*10)
-    
-    # Códigos das séries temporais do BCB
-    codigos = {
-        'SELIC': 432,      # Taxa Selic
-        'IPCA': 433,       # IPCA - Índice nacional de preços ao consumidor-amplo
-        'IGP-M': 189,      # IGP-M - Índice geral de preços do mercado
-        'INPC': 188,       # INPC - Índice nacional de preços ao consumidor
-        'CDI': 12,         # Taxa CDI
-        'PIB_MENSAL': 4380 # PIB Mensal - Valores correntes (em R$ milhões)
-    }
-    
-    # Dicionário para armazenar os DataFrames
-    dados = {}
-    
-    # Buscando dados para cada indicador
-    for nome, codigo in codigos.items():
-        try:
-            df = sgs.get(codigo, start=data_inicial, end=data_final)
-            df = pd.DataFrame(df)
-            df.columns = [nome]
-            dados[nome] = df
-        except Exception as e:
-            print(f"Erro ao buscar dados do {nome}: {str(e)}")
-    
-    # Concatenando todos os DataFrames
-    df_final = pd.concat(dados.values(), axis=1)
-    
+    data_historico = data_final - timedelta(days=DIAS_HISTORICO)
+
+    df_existente = pd.DataFrame(columns=COLUNAS_INDICADORES) if completo else ler_dados_economicos(nome_arquivo)
+    ultimas_datas = df_existente.groupby('Indicador')['Date'].max()
+
+    # Monta as consultas de cada série, a partir da última data armazenada
+    consultas = []
+    for nome in CODIGOS:
+        data_inicial = data_historico
+        if nome in ultimas_datas.index:
+            data_inicial = max(
+                data_historico,
+                ultimas_datas[nome].to_pydatetime() - timedelta(days=SOBREPOSICAO_DIAS_SGS),
+            )
+        for ano, inicio, fim in dividir_em_janelas(data_inicial, data_final):
+            consultas.append((nome, ano, inicio, fim))
+
+    print(f"Buscando índices econômicos ({len(consultas)} consultas ao SGS)...")
+    if cliente_async_ativo():
+        resultados, erros = baixar_series_sgs_async(
+            {consulta: (CODIGOS[consulta[0]],) + consulta[2:] for consulta in consultas}
+        )
+    else:
+        resultados, erros = baixar_em_paralelo(consultas, _baixar_janela)
+
+    # Todas as consultas falharam: vazio, para que a etapa do ETL seja registrada como falha
+    # (os dados armazenados só são retornados quando o SGS não tem valores novos)
+    if consultas and len(erros) == len(consultas):
+        print("Nenhuma consulta de índices econômicos ao SGS foi concluída com sucesso")
+        return pd.DataFrame()
+
+    dados = []
+    com_erro = set()
+    for consulta in consultas:
+        nome = consulta[0]
+        if consulta in erros:
+            if nome not in com_erro:
+                print(f"Erro ao buscar dados do {nome}: {str(erros[consulta])}")
+                com_erro.add(nome)
+            continue
+
+        serie = resultados[consulta]
+        if serie is None or serie.empty:
+            continue
+        dados.append(
+            pd.DataFrame({
+                'Date': pd.to_datetime(serie.index),
+                'Indicador': nome,
+                'Valor': pd.to_numeric(serie.iloc[:, 0], errors='coerce').to_numpy(),
+            })
+        )
+
+    if not dados:
+        print("Nenhum dado novo de índices econômicos.")
+        return df_existente
+
+    # Valores novos substituem os armazenados nas datas sobrepostas; séries que
+    # falharam mantêm os dados que já estavam no arquivo
+    df_novo = pd.concat(dados, ignore_index=True)
+    df_final = (
+        pd.concat([df_existente, df_novo], ignore_index=True)
+        .drop_duplicates(subset=['Indicador', 'Date'], keep='last')
+        .dropna(subset=['Valor'])
+    )
+    df_final['Indicador'] = pd.Categorical(df_final['Indicador'], categories=list(CODIGOS))
+    df_final = df_final.sort_values(['Indicador', 'Date']).reset_index(drop=True)
+    df_final['Indicador'] = df_final['Indicador'].astype(str)
+
     # Salvando os dados em CSV
-    df_final.to_csv('results/dados_economicos.csv')
-    
+    df_final.to_csv(nome_arquivo, index=False, date_format='%Y-%m-%d')
+
     return df_final
 
 if __name__ == "__main__":
-    buscar_dados_economicos()
\ No newline at end of file
+    buscar_dados_economicos()
@@ -0,0 +1,187 @@
+"""
+Instrumentação das execuções do ETL.
+
+Registra, por etapa e por símbolo, o tempo de parede, o número de requisições,
+as novas tentativas, o volume de dados (bytes em memória do resultado) e as
+linhas obtidas, além das falhas. Ao final da execução o relatório é gravado em
+JSON lines (`results/etl_metricas.jsonl`, ao lado de `results/etl_process.log`)
+e resumido em uma tabela para o log, permitindo comparar execuções e identificar
+quais fontes ou símbolos estão deixando a janela noturna mais lenta.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+# Etapa em execução na thread atual (definida pelo orquestrador)
+etapa_atual = contextvars.ContextVar("etapa_atual", default=None)
+
+
+def tamanho_em_bytes(resultado):
+    """Retorna o tamanho aproximado do resultado em bytes (0 se desconhecido)."""
+    if hasattr(resultado, "memory_usage"):
+        try:
+            return int(resultado.memory_usage(deep=True).sum())
+        except Exception:
+            return 0
+    if isinstance(resultado, (bytes, str)):
+        return len(resultado)
+    return 0
+
+
+def quantidade_de_linhas(resultado):
+    """Retorna a quantidade de linhas do resultado (0 se não se aplica)."""
+    try:
+        return len(resultado)
+    except TypeError:
+        return 0
+
+
+class ColetorMetricas:
+    """Acumula as métricas de uma execução do ETL de forma segura entre threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.iniciar_execucao()
+
+    def iniciar_execucao(self):
+        """Descarta as métricas anteriores e inicia uma nova execução."""
+        with self._lock:
+            self.id_execucao = datetime.now().strftime("%Y%m%dT%H%M%S")
+            self.inicio = time.perf_counter()
+            self.requisicoes = []
+            self.etapas = []
+
+    def registrar_requisicao(self, simbolo, duracao, tentativas, resultado=None, erro=None, etapa=None):
+        """
+        Registra o download de um símbolo (incluindo todas as suas tentativas).
+
+        Args:
+            simbolo (str): Símbolo ou identificador do item baixado.
+            duracao (float): Tempo de parede em segundos, somando as tentativas e esperas.
+            tentativas (int): Quantidade de requisições feitas.
+            resultado: Retorno da função de download, usado para contar bytes e linhas.
+            erro (Exception, optional): Exceção da última tentativa, se houve falha.
+            etapa (str, optional): Etapa do ETL. Padrão: a etapa da thread atual.
+        """
+        registro = {
+            "tipo": "simbolo",
+            "execucao": self.id_execucao,
+            "etapa": etapa or etapa_atual.get(),
+            "simbolo": str(simbolo),
+            "duracao_s": round(duracao, 4),
+            "requisicoes": tentativas,
+            "retentativas": max(0, tentativas - 1),
+            "bytes": tamanho_em_bytes(resultado),
+            "linhas": quantidade_de_linhas(resultado),
+            "erro": str(erro) if erro is not None else None,
+        }
+        with self._lock:
+            self.requisicoes.append(registro)
+
+    def registrar_etapa(self, nome, status, duracao, resultado=None, erro=None):
+        """
+        Registra o fim de uma etapa do ETL.
+
+        Args:
+            nome (str): Nome da etapa.
+            status (str): Status final ('sucesso', 'falha' ou 'ignorada').
+            duracao (float): Tempo de parede em segundos.
+            resultado: Retorno da etapa, usado para contar as linhas gravadas.
+            erro (Exception, optional): Exceção que interrompeu a etapa.
+        """
+        with self._lock:
+            requisicoes = [r for r in self.requisicoes if r["etapa"] == nome]
+            self.etapas.append(
+                {
+                    "tipo": "etapa",
+                    "execucao": self.id_execucao,
+                    "etapa": nome,
+                    "status": status,
+                    "duracao_s": round(duracao, 4),
+                    "simbolos": len(requisicoes),
+                    "requisicoes": sum(r["requisicoes"] for r in requisicoes),
+                    "retentativas": sum(r["retentativas"] for r in requisicoes),
+                    "bytes": sum(r["bytes"] for r in requisicoes),
+                    "linhas_baixadas": sum(r["linhas"] for r in requisicoes),
+                    "linhas_resultado": quantidade_de_linhas(resultado),
+                    "falhas": sum(1 for r in requisicoes if r["erro"]),
+                    "erro": str(erro) if erro is not None else None,
+                }
+            )
+
+    def registro_execucao(self):
+        """Retorna o registro consolidado da execução."""
+        with self._lock:
+            return {
+                "tipo": "execucao",
+                "execucao": self.id_execucao,
+                "data": datetime.now().isoformat(timespec="seconds"),
+                "duracao_s": round(time.perf_counter() - self.inicio, 4),
+                "etapas": len(self.etapas),
+                "etapas_sem_sucesso": [e["etapa"] for e in self.etapas if e["status"] != "sucesso"],
+                "requisicoes": sum(r["requisicoes"] for r in self.requisicoes),
+                "retentativas": sum(r["retentativas"] for r in self.requisicoes),
+                "bytes": sum(r["bytes"] for r in self.requisicoes),
+                "falhas": sum(1 for r in self.requisicoes if r["erro"]),
+            }
+
+    def salvar(self, nome_arquivo):
+        """
+        Acrescenta as métricas da execução ao arquivo JSON lines.
+
+        Args:
+            nome_arquivo (str): Caminho do arquivo (ex.: 'results/etl_metricas.jsonl').
+        """
+        registros = [*self.etapas, *self.requisicoes, self.registro_execucao()]
+        os.makedirs(os.path.dirname(nome_arquivo) or ".", exist_ok=True)
+        with open(nome_arquivo, "a", encoding="utf-8") as arquivo:
+            for registro in registros:
+                arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+    def tabela_resumo(self, mais_lentos=5):
+        """
+        Monta uma tabela de texto com as métricas por etapa e os símbolos mais lentos.
+
+        Args:
+            mais_lentos (int): Quantidade de símbolos mais lentos a listar.
+
+        Returns:
+            str: Tabela formatada para os logs.
+        """
+        with self._lock:
+            etapas = list(self.etapas)
+            requisicoes = list(self.requisicoes)
+
+        linhas = [
+            f"{'Etapa':<22} {'Status':<9} {'Duração':>9} {'Símb.':>6} {'Req.':>6} "
+            f"{'Retent.':>8} {'Falhas':>7} {'Linhas':>9} {'KB':>9}"
+        ]
+        for e in etapas:
+            linhas.append(
+                f"{e['etapa']:<22} {e['status']:<9} {e['duracao_s']:>8.1f}s {e['simbolos']:>6} "
+                f"{e['requisicoes']:>6} {e['retentativas']:>8} {e['falhas']:>7} "
+                f"{e['linhas_baixadas']:>9} {e['bytes'] / 1024:>9.0f}"
+            )
+            if e["erro"]:
+                linhas.append(f"{'':<22} erro: {e['erro']}")
+
+        lentos = sorted(requisicoes, key=lambda r: r["duracao_s"], reverse=True)[:mais_lentos]
+        if lentos:
+            linhas.append("")
+            linhas.append("Símbolos mais lentos:")
+            for r in lentos:
+                situacao = f"erro: {r['erro']}" if r["erro"] else f"{r['linhas']} linhas"
+                linhas.append(
+                    f"  {r['etapa'] or '-':<20} {r['simbolo']:<14} {r['duracao_s']:>7.2f}s "
+                    f"{r['requisicoes']} req.  {situacao}"
+                )
+
+        return "\n".join(linhas)
+
+
+# Coletor compartilhado pelo processo de ETL
+coletor = ColetorMetricas()
@@ -0,0 +1,155 @@
+"""
+Orquestrador das etapas do ETL em forma de grafo de dependências.
+
+Cada etapa declara de quais outras depende. Etapas independentes são executadas
+ao mesmo tempo, de modo que a duração total se aproxima do ramo mais lento e não
+da soma de todas as etapas. A falha de uma etapa não interrompe as demais: apenas
+as etapas que dependem dela deixam de ser executadas.
+"""
+
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from etl.instrumentacao import coletor, etapa_atual
+
+SUCESSO = "sucesso"
+FALHA = "falha"
+IGNORADA = "ignorada"
+
+
+class Etapa:
+    """
+    Etapa do ETL.
+
+    Args:
+        nome (str): Identificador único da etapa.
+        funcao (callable): Função sem argumentos executada pela etapa. A etapa é
+            considerada com falha se a função lançar uma exceção.
+        dependencias (iterable): Nomes das etapas que precisam terminar com sucesso antes.
+        descricao (str, optional): Texto usado nos logs.
+    """
+
+    def __init__(self, nome, funcao, dependencias=(), descricao=None):
+        self.nome = nome
+        self.funcao = funcao
+        self.dependencias = tuple(dependencias)
+        self.descricao = descricao or nome
+
+
+class ResultadoEtapa:
+    """Resultado da execução de uma etapa."""
+
+    def __init__(self, nome, status, duracao=0.0, erro=None, retorno=None):
+        self.nome = nome
+        self.status = status
+        self.duracao = duracao
+        self.erro = erro
+        self.retorno = retorno
+
+
+def validar_grafo(etapas):
+    """
+    Verifica se o grafo não tem nomes repetidos, dependências desconhecidas ou ciclos.
+
+    Args:
+        etapas (list): Lista de `Etapa`.
+
+    Raises:
+        ValueError: Se o grafo for inválido.
+    """
+    nomes = [etapa.nome for etapa in etapas]
+    if len(nomes) != len(set(nomes)):
+        raise ValueError("Existem etapas com nomes repetidos no grafo do ETL")
+
+    por_nome = {etapa.nome: etapa for etapa in etapas}
+    for etapa in etapas:
+        desconhecidas = [d for d in etapa.dependencias if d not in por_nome]
+        if desconhecidas:
+            raise ValueError(
+                f"Etapa '{etapa.nome}' depende de etapas inexistentes: {desconhecidas}"
+            )
+
+    # Detecção de ciclos por ordenação topológica (Kahn)
+    pendentes = {etapa.nome: set(etapa.dependencias) for etapa in etapas}
+    while pendentes:
+        prontas = [nome for nome, deps in pendentes.items() if not deps]
+        if not prontas:
+            raise ValueError(f"Ciclo de dependências entre as etapas: {sorted(pendentes)}")
+        for nome in prontas:
+            del pendentes[nome]
+        for deps in pendentes.values():
+            deps.difference_update(prontas)
+
+
+def _executar_etapa(etapa):
+    logging.info(f"Iniciando etapa '{etapa.descricao}'")
+    # Os downloads feitos pela etapa são atribuídos a ela nas métricas
+    token = etapa_atual.set(etapa.nome)
+    inicio = time.perf_counter()
+    try:
+        retorno = etapa.funcao()
+        duracao = time.perf_counter() - inicio
+        logging.info(f"Etapa '{etapa.descricao}' concluída em {duracao:.1f}s")
+        coletor.registrar_etapa(etapa.nome, SUCESSO, duracao, resultado=retorno)
+        return ResultadoEtapa(etapa.nome, SUCESSO, duracao, retorno=retorno)
+    except Exception as e:
+        duracao = time.perf_counter() - inicio
+        logging.error(f"Etapa '{etapa.descricao}' falhou após {duracao:.1f}s: {str(e)}")
+        coletor.registrar_etapa(etapa.nome, FALHA, duracao, erro=e)
+        return ResultadoEtapa(etapa.nome, FALHA, duracao, erro=e)
+    finally:
+        etapa_atual.reset(token)
+
+
+def executar_grafo(etapas, max_workers=None):
+    """
+    Executa as etapas respeitando as dependências, em paralelo sempre que possível.
+
+    Args:
+        etapas (list): Lista de `Etapa`.
+        max_workers (int, optional): Máximo de etapas simultâneas. Padrão: número de etapas.
+
+    Returns:
+        dict: Nome da etapa -> `ResultadoEtapa`, na ordem em que as etapas foram declaradas.
+    """
+    validar_grafo(etapas)
+
+    por_nome = {etapa.nome: etapa for etapa in etapas}
+    resultados = {}
+    pendentes = [etapa.nome for etapa in etapas]
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, len(etapas))) as executor:
+        em_execucao = {}
+
+        while pendentes or em_execucao:
+            # Agenda as etapas cujas dependências já terminaram
+            for nome in list(pendentes):
+                dependencias = por_nome[nome].dependencias
+                if any(d not in resultados for d in dependencias):
+                    continue
+
+                pendentes.remove(nome)
+                falhas = [d for d in dependencias if resultados[d].status != SUCESSO]
+                if falhas:
+                    logging.warning(
+                        f"Etapa '{por_nome[nome].descricao}' ignorada: "
+                        f"dependências sem sucesso {falhas}"
+                    )
+                    resultados[nome] = ResultadoEtapa(nome, IGNORADA)
+                    coletor.registrar_etapa(nome, IGNORADA, 0.0)
+                    continue
+
+                em_execucao[executor.submit(_executar_etapa, por_nome[nome])] = nome
+
+            if not em_execucao:
+                # Etapas ignoradas podem liberar outras na próxima volta do laço
+                continue
+
+            concluidas, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+            for futuro in concluidas:
+                nome = em_execucao.pop(futuro)
+                resultados[nome] = futuro.result()
+
+    return {nome: resultados[nome] for nome in por_nome}
+
@@ -0,0 +1,270 @@
+"""
+Gravação e reprodução das respostas das fontes externas do ETL (yfinance, BCB SGS e B3).
+
+No modo 'gravar' cada resposta obtida das fontes é salva em
+`fixtures/<fonte>/<chave>.pkl`. No modo 'reproduzir' as respostas são lidas desses
+arquivos, sem acesso à rede, o que permite medir o desempenho do ETL e comparar
+execuções de forma reprodutível. A reprodução pode simular latência e falhas.
+
+O modo e os parâmetros são definidos por variáveis de ambiente (ou por `configurar`):
+    ETL_REPLAY_MODO          '' (desativado), 'gravar' ou 'reproduzir'
+    ETL_REPLAY_DIRETORIO     diretório das fixtures
+    ETL_REPLAY_LATENCIA      latência simulada (segundos) de cada chamada reproduzida
+    ETL_REPLAY_TAXA_ERROS    probabilidade (0 a 1) de uma chamada reproduzida falhar
+    ETL_REPLAY_SEMENTE       semente do sorteio das falhas
+
+As fixtures são arquivos pickle e só devem ser carregadas de fontes confiáveis.
+Cada fixture guarda a resposta de um símbolo inteiro, e a reprodução recorta o
+período pedido; por isso a gravação só é aceita com o ETL em modo completo
+(`--full`), que baixa os 10 anos de histórico:
+
+    ETL_REPLAY_MODO=gravar python main_process.py --full --ibrx50
+
+Para medir o motor de download com as respostas gravadas:
+
+    python -m etl.replay --repeticoes 3 --latencia 0.2 --taxa-erros 0.05
+"""
+
+import argparse
+import copy
+import os
+import pickle
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+GRAVAR = "gravar"
+REPRODUZIR = "reproduzir"
+
+DIRETORIO_PADRAO = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures"
+)
+
+_config = {
+    "modo": os.getenv("ETL_REPLAY_MODO", "").strip().lower(),
+    "diretorio": os.getenv("ETL_REPLAY_DIRETORIO", DIRETORIO_PADRAO),
+    "latencia": float(os.getenv("ETL_REPLAY_LATENCIA", "0")),
+    "taxa_erros": float(os.getenv("ETL_REPLAY_TAXA_ERROS", "0")),
+    "semente": int(os.getenv("ETL_REPLAY_SEMENTE", "0")),
+}
+
+_lock = threading.Lock()
+_fixtures_carregadas = {}
+_chamadas = {}
+
+
+class FixtureAusente(LookupError):
+    """Não existe resposta gravada para a fonte e a chave pedidas."""
+
+
+class ErroSimulado(ConnectionError):
+    """Falha injetada durante a reprodução."""
+
+
+def configurar(modo=None, diretorio=None, latencia=None, taxa_erros=None, semente=None):
+    """
+    Altera a configuração de gravação/reprodução do processo.
+
+    Args:
+        modo (str, optional): '' (desativado), 'gravar' ou 'reproduzir'.
+        diretorio (str, optional): Diretório das fixtures.
+        latencia (float, optional): Latência simulada em segundos.
+        taxa_erros (float, optional): Probabilidade de falha simulada.
+        semente (int, optional): Semente do sorteio das falhas.
+    """
+    novos = {
+        "modo": modo,
+        "diretorio": diretorio,
+        "latencia": latencia,
+        "taxa_erros": taxa_erros,
+        "semente": semente,
+    }
+    with _lock:
+        for chave, valor in novos.items():
+            if valor is not None:
+                _config[chave] = valor
+        _fixtures_carregadas.clear()
+        _chamadas.clear()
+
+    if _config["modo"] not in ("", GRAVAR, REPRODUZIR):
+        raise ValueError(f"Modo de replay inválido: {_config['modo']}")
+
+
+def modo_atual():
+    """Retorna o modo ativo: '', 'gravar' ou 'reproduzir'."""
+    return _config["modo"]
+
+
+def _caminho_fixture(fonte, chave):
+    return os.path.join(_config["diretorio"], fonte, f"{quote(str(chave), safe='')}.pkl")
+
+
+def listar_chaves(fonte):
+    """Lista as chaves gravadas de uma fonte."""
+    diretorio = os.path.join(_config["diretorio"], fonte)
+    if not os.path.isdir(diretorio):
+        return []
+    return sorted(
+        unquote(nome[: -len(".pkl")]) for nome in os.listdir(diretorio) if nome.endswith(".pkl")
+    )
+
+
+def _gravar(fonte, chave, resultado):
+    caminho = _caminho_fixture(fonte, chave)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    # Grava em arquivo temporário para não deixar fixtures pela metade
+    temporario = f"{caminho}.{threading.get_ident()}.tmp"
+    with open(temporario, "wb") as arquivo:
+        pickle.dump(resultado, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporario, caminho)
+
+
+def _carregar(fonte, chave):
+    with _lock:
+        if (fonte, chave) in _fixtures_carregadas:
+            return _fixtures_carregadas[(fonte, chave)]
+
+    caminho = _caminho_fixture(fonte, chave)
+    if not os.path.exists(caminho):
+        raise FixtureAusente(f"Sem resposta gravada para {fonte}/{chave} em {caminho}")
+    with open(caminho, "rb") as arquivo:
+        resultado = pickle.load(arquivo)
+
+    with _lock:
+        _fixtures_carregadas[(fonte, chave)] = resultado
+    return resultado
+
+
+def _sortear_falha(fonte, chave):
+    # O sorteio depende só da semente, da chave e de quantas vezes ela foi pedida,
+    # para que a sequência de falhas não dependa da ordem das threads
+    with _lock:
+        ordem = _chamadas.get((fonte, chave), 0)
+        _chamadas[(fonte, chave)] = ordem + 1
+    sorteio = random.Random(f"{_config['semente']}:{fonte}:{chave}:{ordem}").random()
+    return sorteio < _config["taxa_erros"]
+
+
+def chamar_fonte(fonte, chave, chamada, recorte=None):
+    """
+    Executa uma chamada a uma fonte externa conforme o modo de replay.
+
+    Args:
+        fonte (str): Nome da fonte (ex.: 'yfinance_historico', 'bcb_sgs', 'b3_ibrx50').
+        chave (str): Identificador da resposta dentro da fonte (ex.: o símbolo).
+        chamada (callable): Função sem argumentos que consulta a fonte real.
+        recorte (callable, optional): Aplicada à resposta reproduzida para reproduzir
+            os filtros da chamada real (ex.: o período pedido).
+
+    Returns:
+        A resposta da fonte real ou a resposta gravada.
+
+    Raises:
+        FixtureAusente: No modo 'reproduzir', se não houver resposta gravada.
+        ErroSimulado: No modo 'reproduzir', quando uma falha é sorteada.
+    """
+    if _config["modo"] != REPRODUZIR:
+        resultado = chamada()
+        if _config["modo"] == GRAVAR and resultado is not None:
+            _gravar(fonte, chave, resultado)
+        return resultado
+
+    if _config["latencia"] > 0:
+        time.sleep(_config["latencia"])
+    if _config["taxa_erros"] > 0 and _sortear_falha(fonte, chave):
+        raise ErroSimulado(f"Falha simulada em {fonte}/{chave}")
+
+    # Cópia para que quem chama possa alterar a resposta sem afetar as próximas reproduções
+    resultado = copy.deepcopy(_carregar(fonte, chave))
+    return recorte(resultado) if recorte is not None else resultado
+
+
+def filtrar_periodo(df, inicio=None, fim=None):
+    """
+    Mantém apenas as linhas cujo índice de datas está entre `inicio` e `fim` (inclusive).
+
+    Funciona com índices com ou sem fuso horário (o yfinance retorna datas com fuso).
+    """
+    if df is None or df.empty:
+        return df
+
+    datas = pd.DatetimeIndex(df.index)
+    if datas.tz is not None:
+        datas = datas.tz_localize(None)
+
+    mascara = np.ones(len(df), dtype=bool)
+    if inicio is not None:
+        mascara &= datas >= pd.Timestamp(inicio).normalize()
+    if fim is not None:
+        mascara &= datas <= pd.Timestamp(fim)
+    return df[mascara]
+
+
+def medir_downloads(repeticoes=1, latencia=None, taxa_erros=None, semente=None):
+    """
+    Mede o motor de download com os históricos gravados do yfinance.
+
+    Args:
+        repeticoes (int): Quantidade de rodadas.
+        latencia (float, optional): Latência simulada em segundos.
+        taxa_erros (float, optional): Probabilidade de falha simulada.
+        semente (int, optional): Semente do sorteio das falhas.
+
+    Returns:
+        list: Um dicionário por rodada com a duração, os símbolos e as linhas por segundo.
+    """
+    # Importações locais para evitar dependência circular com o downloader
+    from etl.downloader import baixar_historicos_yf
+    from etl.incremental import DIAS_HISTORICO
+    from etl.instrumentacao import coletor
+
+    configurar(REPRODUZIR, latencia=latencia, taxa_erros=taxa_erros, semente=semente)
+    simbolos = listar_chaves("yfinance_historico")
+    if not simbolos:
+        raise FixtureAusente(
+            f"Nenhum histórico gravado em {_config['diretorio']}; execute o ETL com "
+            "ETL_REPLAY_MODO=gravar"
+        )
+
+    data_inicial = (datetime.now() - timedelta(days=DIAS_HISTORICO)).strftime("%Y-%m-%d")
+    rodadas = []
+    for rodada in range(1, repeticoes + 1):
+        coletor.iniciar_execucao()
+        inicio = time.perf_counter()
+        resultados, erros = baixar_historicos_yf(simbolos, data_inicial)
+        duracao = time.perf_counter() - inicio
+        linhas = sum(len(df) for df in resultados.values())
+        rodadas.append(
+            {
+                "rodada": rodada,
+                "duracao_s": round(duracao, 3),
+                "simbolos": len(simbolos),
+                "falhas": len(erros),
+                "simbolos_por_s": round(len(simbolos) / duracao, 2),
+                "linhas_por_s": round(linhas / duracao, 1),
+            }
+        )
+        print(
+            f"Rodada {rodada}: {duracao:.2f}s, {len(simbolos)} símbolos "
+            f"({len(erros)} falhas), {linhas} linhas, {len(simbolos) / duracao:.1f} símbolos/s"
+        )
+
+    print(f"\nMétricas da última rodada:\n{coletor.tabela_resumo()}")
+    return rodadas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Mede o motor de download do ETL com respostas gravadas"
+    )
+    parser.add_argument("--repeticoes", type=int, default=1)
+    parser.add_argument("--latencia", type=float, default=None, help="Latência simulada (s)")
+    parser.add_argument("--taxa-erros", type=float, default=None, help="Probabilidade de falha")
+    parser.add_argument("--semente", type=int, default=None)
+    args = parser.parse_args()
+    medir_downloads(args.repeticoes, args.latencia, args.taxa_erros, args.semente)
@@ -1,18 +1,128 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import Select
-from webdriver_manager.chrome import ChromeDriverManager
 import time
 import os
+from datetime import datetime
+from etl.carteira_b3 import baixar_carteira_indice, salvar_arquivo_carteira
+from etl.replay import REPRODUZIR, chamar_fonte, modo_atual
+from etl.tratar_ibrx50 import processar_ibrx50
+
+# Tempo máximo (segundos) de espera pelo arquivo baixado pelo navegador
+PRAZO_DOWNLOAD = float(os.getenv('ETL_PRAZO_DOWNLOAD_B3', '60'))
+
+# Sufixos dos arquivos ainda em download (Chrome, Firefox e temporários)
+SUFIXOS_PARCIAIS = ('.crdownload', '.part', '.partial', '.tmp', '.download')
+
+def _arquivo_do_dia():
+    # Usar o diretório atual do projeto
+    download_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../results'))
+    nome_arquivo = os.path.join(download_dir, f"IBXLDia_{datetime.now().strftime('%d-%m-%y')}.csv")
+    return download_dir, nome_arquivo
+
+def aguardar_download(diretorio, prefixo, desde, prazo=PRAZO_DOWNLOAD, intervalo=0.25):
+    """
+    Aguarda o navegador terminar de gravar um arquivo no diretório de downloads.
+
+    O arquivo é considerado pronto quando começa com `prefixo`, foi modificado
+    depois de `desde`, não tem sufixo de download parcial, não há downloads
+    parciais em andamento no diretório e o tamanho não muda entre duas leituras.
+
+    Args:
+        diretorio (str): Diretório de downloads.
+        prefixo (str): Início do nome do arquivo esperado (ex.: 'IBXLDia_').
+        desde (float): Instante (time.time()) em que o download foi iniciado.
+        prazo (float): Tempo máximo de espera em segundos.
+        intervalo (float): Intervalo entre as verificações em segundos.
+
+    Returns:
+        str: Caminho do arquivo baixado.
+
+    Raises:
+        TimeoutError: Se o arquivo não ficar pronto dentro do prazo.
+    """
+    limite = time.monotonic() + prazo
+    tamanhos = {}
+
+    while time.monotonic() < limite:
+        nomes = os.listdir(diretorio)
+        em_andamento = any(nome.endswith(SUFIXOS_PARCIAIS) for nome in nomes)
+
+        for nome in nomes:
+            if not nome.startswith(prefixo) or nome.endswith(SUFIXOS_PARCIAIS):
+                continue
+            caminho = os.path.join(diretorio, nome)
+            try:
+                info = os.stat(caminho)
+            except FileNotFoundError:
+                continue
+            # Tolerância de 1s para a resolução do horário de modificação
+            if info.st_mtime < desde - 1 or info.st_size == 0:
+                continue
+            if tamanhos.get(nome) == info.st_size and not em_andamento:
+                return caminho
+            tamanhos[nome] = info.st_size
+
+        time.sleep(intervalo)
+
+    raise TimeoutError(f'Download de {prefixo}* não concluído em {prazo:g}s')
+
+def atualizar_ibrx50():
+    """
+    Baixa a carteira do dia do IBrX-50 e trata o arquivo assim que ele existir.
+
+    Returns:
+        DataFrame: Carteira tratada por `processar_ibrx50` (None em caso de erro).
+    """
+    _, nome_arquivo = _arquivo_do_dia()
+    download_ibrx50_data()
+    return processar_ibrx50(nome_arquivo)
 
 def download_ibrx50_data():
+    """
+    Baixa a carteira do dia do IBrX-50 para results/IBXLDia_dd-mm-yy.csv.
+
+    A carteira é consultada diretamente no serviço da B3 (etl/carteira_b3.py).
+    Se a consulta falhar, o arquivo é baixado pela página da B3 com o Selenium.
+
+    Returns:
+        DataFrame: Carteira com código, nome, tipo, quantidade teórica e
+        participação de cada ação, ou None se ela foi baixada pelo navegador.
+    """
+    download_dir, nome_arquivo = _arquivo_do_dia()
+
+    try:
+        df_carteira = baixar_carteira_indice('IBXL')
+        salvar_arquivo_carteira(df_carteira, nome_arquivo, 'IBXL')
+        print(f'Carteira do IBrX-50 obtida da B3 ({len(df_carteira)} ações): {nome_arquivo}')
+        return df_carteira
+    except Exception as e:
+        print(f'Erro ao consultar a carteira na B3: {str(e)}. Usando o navegador...')
+
+    # No modo de reprodução (etl/replay.py) o arquivo é recriado a partir do
+    # conteúdo gravado, sem abrir o navegador
+    conteudo = chamar_fonte(
+        'b3_ibrx50',
+        'IBXL',
+        lambda: _baixar_pelo_navegador(download_dir, nome_arquivo),
+    )
+
+    if modo_atual() == REPRODUZIR:
+        with open(nome_arquivo, 'wb') as arquivo:
+            arquivo.write(conteudo)
+        print(f'Arquivo {nome_arquivo} recriado a partir da resposta gravada.')
+
+    return None
+
+def _baixar_pelo_navegador(download_dir, nome_arquivo):
+    # O Selenium só é necessário neste caminho alternativo
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import Select
+    from webdriver_manager.chrome import ChromeDriverManager
+
     # Configurar o Chrome para download automático e modo headless
     chrome_options = webdriver.ChromeOptions()
-    # Usar o diretório atual do projeto
-    download_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../results'))
     chrome_options.add_experimental_option('prefs', {
         'download.default_directory': download_dir,
         'download.prompt_for_download': False,
@@ -72,30 +182,33 @@ def download_ibrx50_data():
                     if option.get_attribute('value') == '120':
                         option.click()
                         break
-        print('Valor selecionado com sucesso!')
-        time.sleep(3)
-        
-        # Aguardar um pouco para a página atualizar
-        time.sleep(2)
+        # Aguardar a página aplicar a seleção de 120 itens, em vez de um tempo fixo
+        try:
+            WebDriverWait(driver, 10).until(
+                lambda d: Select(d.find_element(By.ID, 'selectPage')).first_selected_option.text.strip() == '120'
+            )
+            print('Valor selecionado com sucesso!')
+        except Exception:
+            print('Não foi possível confirmar a seleção de 120 itens; continuando...')
         
         # Tentar encontrar e clicar no botão de download
         print('Procurando botão de download...')
         try:
-            # Primeiro, vamos tentar encontrar por classe
+            # Primeiro, vamos tentar encontrar por classe (aguardando o botão ficar clicável)
             download_button = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.CLASS_NAME, 'btn-download'))
+                EC.element_to_be_clickable((By.CLASS_NAME, 'btn-download'))
             )
         except:
             try:
                 # Tentar por XPath procurando por texto
                 download_button = WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.XPATH, "//button[contains(text(), 'Download')]"))
+                    EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Download')]"))
                 )
             except:
                 try:
                     # Tentar por link text
                     download_button = WebDriverWait(driver, 10).until(
-                        EC.presence_of_element_located((By.LINK_TEXT, "Download"))
+                        EC.element_to_be_clickable((By.LINK_TEXT, "Download"))
                     )
                 except Exception as e:
                     print(f'Não foi possível encontrar o botão de download: {str(e)}')
@@ -104,15 +217,24 @@ def download_ibrx50_data():
                     raise e
         
         print('Botão de download encontrado, tentando clicar...')
+        inicio_download = time.time()
         driver.execute_script("arguments[0].click();", download_button)
         
-        # Aguardar o download completar
-        time.sleep(5)
+        # Aguardar o arquivo completo aparecer no diretório de downloads
+        caminho_baixado = aguardar_download(download_dir, 'IBXLDia_', inicio_download)
+        if caminho_baixado != nome_arquivo:
+            os.replace(caminho_baixado, nome_arquivo)
         
-        print('Download concluído com sucesso!')
+        print(f'Download concluído com sucesso em {time.time() - inicio_download:.1f}s!')
         
     except Exception as e:
         print(f'Erro durante o processo: {str(e)}')
         
     finally:
-        driver.quit()
\ No newline at end of file
+        driver.quit()
+
+    # Conteúdo do arquivo baixado (None se o download não aconteceu)
+    if os.path.exists(nome_arquivo):
+        with open(nome_arquivo, 'rb') as arquivo:
+            return arquivo.read()
+    return None
@@ -3,19 +3,30 @@ from datetime import datetime
 import os
 import chardet
 
+# Código de negociação da B3: 4 caracteres (letras ou dígitos, ex.: B3SA) e 1 ou 2 dígitos
+PADRAO_TICKER = r"[A-Z0-9]{4}\d{1,2}"
 
-def processar_ibrx50():
+
+def processar_ibrx50(nome_arquivo=None):
+    """
+    Trata o arquivo da carteira do dia do IBrX-50, mantendo apenas os códigos.
+
+    Args:
+        nome_arquivo (str, optional): Arquivo baixado da B3. Padrão:
+            results/IBXLDia_dd-mm-yy.csv com a data atual.
+    """
     # Obter a data atual no formato dd-mm-yy
     data_atual = datetime.now().strftime("%d-%m-%y")
 
-    # Construir o nome do arquivo
-    # Determinar o caminho base do projeto
-    if os.path.exists("results"):
-        base_path = ""
-    else:
-        base_path = ".."
+    if nome_arquivo is None:
+        # Construir o nome do arquivo
+        # Determinar o caminho base do projeto
+        if os.path.exists("results"):
+            base_path = ""
+        else:
+            base_path = ".."
 
-    nome_arquivo = os.path.join(base_path, "results", f"IBXLDia_{data_atual}.csv")
+        nome_arquivo = os.path.join(base_path, "results", f"IBXLDia_{data_atual}.csv")
 
     # Verificar se o arquivo existe
     if not os.path.exists(nome_arquivo):
@@ -49,8 +60,10 @@ def processar_ibrx50():
         print("\nColunas do DataFrame:")
         print(df.columns.tolist())
 
-        # Pegar apenas as 50 linhas que contém dados das ações (excluindo as 2 últimas linhas de totais)
-        df = df.iloc[:50]
+        # Manter apenas as linhas cujo código é um ticker da B3; as linhas finais de
+        # totais e redutor variam com a composição do índice e são descartadas
+        df["Código"] = df["Código"].str.strip()
+        df = df[df["Código"].str.fullmatch(PADRAO_TICKER, na=False)].reset_index(drop=True)
 
         # Converter a coluna de porcentagem para número
         try:
@@ -1,12 +1,16 @@
 import os
+import sys
+import argparse
 import logging
 from datetime import datetime
-from etl.scraping_ibrx50 import download_ibrx50_data as baixar_dados_ibrx50
-from etl.tratar_ibrx50 import processar_ibrx50 as tratar_dados_ibrx50
+from etl.scraping_ibrx50 import atualizar_ibrx50
 from etl.acoes import baixar_historico_acoes
 from etl.criptomoedas import baixar_historico_cripto
 from etl.cambio import baixar_historico_cambio
 from etl.indices_economicos import buscar_dados_economicos
+from etl.orquestrador import Etapa, SUCESSO, executar_grafo
+from etl.instrumentacao import coletor
+from etl.replay import GRAVAR, modo_atual
 
 # Criar diretório results se não existir
 if not os.path.exists('results'):
@@ -22,47 +26,146 @@ logging.basicConfig(
     ]
 )
 
-def main():
+def exigir_dados(funcao, *args):
+    """
+    Envolve uma função de ETL para que um retorno vazio seja tratado como falha da etapa.
+
+    As funções de download tratam seus próprios erros e retornam um DataFrame vazio
+    (ou None) quando nada foi obtido; o orquestrador só enxerga exceções.
+    """
+    def executar():
+        resultado = funcao(*args)
+        if resultado is None or getattr(resultado, "empty", False):
+            raise RuntimeError(f"{funcao.__name__} não retornou dados")
+        return resultado
+
+    return executar
+
+
+def montar_etapas(completo=False, ibrx50=False):
+    """
+    Declara o grafo de etapas do ETL e suas dependências.
+
+    Apenas o histórico das ações depende da carteira do IBrX-50. Criptomoedas,
+    câmbio e índices econômicos são independentes entre si e rodam em paralelo
+    (a conversão das criptomoedas para BRL acontece na valorização da carteira,
+    não no download do histórico).
+
+    Args:
+        completo (bool): Se True, baixa novamente os 10 anos de histórico.
+        ibrx50 (bool): Se True, baixa e trata a carteira do IBrX-50 antes das ações.
+
+    Returns:
+        list: Lista de `Etapa`.
+    """
+    etapas = []
+    dependencias_acoes = []
+
+    if ibrx50:
+        # O arquivo da carteira é tratado assim que o download termina
+        etapas.append(
+            Etapa("ibrx50", exigir_dados(atualizar_ibrx50), descricao="Carteira do IBrX-50")
+        )
+        dependencias_acoes = ["ibrx50"]
+
+    etapas += [
+        Etapa(
+            "acoes",
+            exigir_dados(baixar_historico_acoes, completo),
+            dependencias=dependencias_acoes,
+            descricao="Histórico das ações",
+        ),
+        Etapa(
+            "cambio",
+            exigir_dados(baixar_historico_cambio, completo),
+            descricao="Histórico do câmbio",
+        ),
+        Etapa(
+            "criptomoedas",
+            exigir_dados(baixar_historico_cripto, completo),
+            descricao="Histórico das criptomoedas",
+        ),
+        Etapa(
+            "indices_economicos",
+            exigir_dados(buscar_dados_economicos, completo),
+            descricao="Índices econômicos",
+        ),
+    ]
+
+    return etapas
+
+
+def main(completo=False, ibrx50=False):
     """
     Função principal que orquestra o processo de ETL dos dados financeiros.
-    A ordem de execução é importante devido às dependências entre os processos.
+
+    As etapas são executadas conforme o grafo de dependências de `montar_etapas`:
+    etapas independentes rodam ao mesmo tempo e a falha de uma etapa só impede a
+    execução das etapas que dependem dela. As métricas da execução (tempo,
+    requisições, novas tentativas, volume e linhas por etapa e por símbolo) são
+    acrescentadas a 'results/etl_metricas.jsonl' e resumidas no log.
+
+    Args:
+        completo (bool): Se True, baixa novamente os 10 anos de histórico (backfill)
+            em vez de atualizar apenas os dias que faltam.
+        ibrx50 (bool): Se True, atualiza a carteira do IBrX-50 antes das ações.
+
+    Returns:
+        bool: True se todas as etapas foram concluídas com sucesso.
     """
+    # As fixtures são gravadas por símbolo: uma execução incremental substituiria o
+    # histórico completo gravado pela janela curta dos últimos dias
+    if modo_atual() == GRAVAR and not completo:
+        logging.error("A gravação de fixtures (ETL_REPLAY_MODO=gravar) exige o modo completo (--full)")
+        return False
+
     try:
         # Verificar se o diretório results foi criado
         if os.path.exists('results'):
             logging.info("Diretório 'results' existe e está pronto para uso")
         start_time = datetime.now()
-        logging.info("Iniciando processo de ETL")
+        coletor.iniciar_execucao()
+        logging.info(
+            f"Iniciando processo de ETL (modo {'completo' if completo else 'incremental'})"
+        )
 
-        # 1. Download e tratamento dos dados do IBrX-50
-        # logging.info("1. Iniciando download dos dados do IBrX-50")
-        # baixar_dados_ibrx50()
-        # logging.info("2. Iniciando tratamento dos dados do IBrX-50")
-        # tratar_dados_ibrx50()
-
-        # 2. Download do histórico das ações
-        logging.info("3. Iniciando download do histórico das ações")
-        baixar_historico_acoes()
-
-        # 3. Download do histórico das criptomoedas
-        logging.info("4. Iniciando download do histórico das criptomoedas")
-        baixar_historico_cripto()
-
-        # 4. Download do histórico do câmbio
-        logging.info("5. Iniciando download do histórico do câmbio")
-        baixar_historico_cambio()
-
-        # 5. Download dos índices econômicos
-        logging.info("6. Iniciando download dos índices econômicos")
-        buscar_dados_economicos()
+        resultados = executar_grafo(montar_etapas(completo, ibrx50))
 
         end_time = datetime.now()
         duration = end_time - start_time
+        logging.info(f"Resumo das etapas do ETL:\n{coletor.tabela_resumo()}")
+        try:
+            coletor.salvar('results/etl_metricas.jsonl')
+        except Exception as e:
+            logging.error(f"Erro ao salvar as métricas do ETL: {str(e)}")
+
+        falhas = [r.nome for r in resultados.values() if r.status != SUCESSO]
+        if falhas:
+            logging.error(
+                f"Processo de ETL concluído com etapas sem sucesso {falhas}. Duração total: {duration}"
+            )
+            return False
+
         logging.info(f"Processo de ETL concluído com sucesso! Duração total: {duration}")
+        return True
 
     except Exception as e:
         logging.error(f"Erro durante o processo de ETL: {str(e)}")
         raise
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Processo de ETL dos dados financeiros")
+    parser.add_argument(
+        "--full",
+        dest="completo",
+        action="store_true",
+        help="Baixa novamente os 10 anos de histórico em vez de atualizar apenas os dias que faltam",
+    )
+    parser.add_argument(
+        "--ibrx50",
+        action="store_true",
+        help="Baixa e trata a carteira do IBrX-50 antes do histórico das ações",
+    )
+    args = parser.parse_args()
+    sucesso = main(completo=args.completo, ibrx50=args.ibrx50)
+    sys.exit(0 if sucesso else 1)
@@ -1,5 +1,8 @@
+import os
+import time
 import streamlit as st
 import pandas as pd
+from collections import namedtuple
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime
@@ -16,12 +19,40 @@ from db.db import (
     get_usuario_by_cpf_senha,
     get_pessoa_by_id_usuario,
     get_contas_by_id_pessoa,
-    get_investimentos_by_id_conta,
-    get_fundos_by_id_investimento,
-    get_criptos_by_id_investimento,
-    get_acoes_by_id_investimento,
-    get_all_dataframes,
+    get_carteira,
 )
+from carteira.avaliacao import calcular_alocacao_ideal
+
+# Contexto de uma execução da página: posições do cliente carregadas, cotadas e
+# avaliadas uma única vez e compartilhadas (somente leitura) por todas as abas e filtros
+ContextoCarteira = namedtuple(
+    "ContextoCarteira",
+    [
+        "investimentos",
+        "alocacao_atual",
+        "perfil_cliente",
+        "alocacao_atual_investido",
+        "fundos",
+        "criptos",
+        "acoes",
+        "posicoes",
+        "snapshot_cotacoes",
+        "sem_cotacao",
+    ],
+)
+CONTEXTO_VAZIO = ContextoCarteira(None, None, None, None, None, None, None, None, None, None)
+
+# Segundos em que a carteira carregada fica guardada na sessão; enquanto isso,
+# cliques nos filtros e abas não consultam a API, o banco nem as cotações
+TTL_CARTEIRA_SESSAO = float(os.getenv("CARTEIRA_TTL_SESSAO", "300"))
+
+# Carteira guardada na sessão: o contexto, o horário da carga (exibido) e o
+# instante monotônico usado para o TTL
+CarteiraSessao = namedtuple("CarteiraSessao", ["contexto", "carregada_em", "instante"])
+
+# Evolução do patrimônio guardada na sessão: a série e a chave com que foi calculada
+# (dia, posições e versão dos históricos do ETL)
+PatrimonioSessao = namedtuple("PatrimonioSessao", ["chave", "serie"])
 
 # Aplicar estilo customizado
 apply_custom_style()
@@ -116,23 +147,31 @@ def obter_investimentos_cliente(id_conta=None):
     Args:
         id_conta (int, optional): ID da conta para filtrar investimentos.
             Se None, tenta buscar todas as contas do usuário.
+
+    Returns:
+        ContextoCarteira: Investimentos avaliados, alocações, perfil do cliente,
+        as posições ativas de fundos, criptos e ações com os preços atuais, todas
+        as posições (inclusive as encerradas, para a evolução do patrimônio), o
+        snapshot de cotações usado e os símbolos que ficaram sem cotação.
     """
-    # Importar funções para atualização de preços
-    from etl.criptomoedas import get_current_prices
-    from etl.acoes import get_current_prices_acoes
+    # Importar funções de cotação e avaliação da carteira
+    from etl.cambio import get_usdbrl_rate
+    from etl.cotacoes import cotacoes_atuais
+    from etl.atualizador_cotacoes import atualizador_cotacoes, precos_validos
+    from carteira.avaliacao import avaliar_posicoes, calcular_alocacao, simbolos_da_carteira
 
     try:
         # Verificar se há token na sessão
         token = st.session_state.get("token")
         if not token:
             st.error("Usuário não autenticado. Faça login novamente.")
-            return None, None, None, None
+            return CONTEXTO_VAZIO
 
         # Obter o CPF do usuário logado usando a API
         cpf = get_user_cpf()
         if not cpf:
             st.error("Não foi possível obter o CPF do usuário.")
-            return None, None, None, None
+            return CONTEXTO_VAZIO
 
         if st.session_state.get("debug_mode", False):
             st.sidebar.success(f"CPF obtido da API: {cpf}")
@@ -141,7 +180,7 @@ def obter_investimentos_cliente(id_conta=None):
         df_usuario = get_usuario_by_cpf_senha(cpf, None)
         if df_usuario.empty:
             st.error("Usuário não encontrado no banco de dados.")
-            return None, None, None, None
+            return CONTEXTO_VAZIO
 
         id_usuario = df_usuario.iloc[0]["id_usuario"]
 
@@ -149,7 +188,7 @@ def obter_investimentos_cliente(id_conta=None):
         df_pessoa = get_pessoa_by_id_usuario(id_usuario)
         if df_pessoa.empty:
             st.error("Dados da pessoa não encontrados no banco de dados.")
-            return None, None, None, None
+            return CONTEXTO_VAZIO
 
         id_pessoa = df_pessoa.iloc[0]["id_pessoa"]
 
@@ -157,251 +196,165 @@ def obter_investimentos_cliente(id_conta=None):
         df_contas = get_contas_by_id_pessoa(id_pessoa)
         if df_contas.empty:
             st.warning("Usuário não possui contas cadastradas no banco de dados.")
-            return None, None, None, None
+            return CONTEXTO_VAZIO
 
         # Filtrar por id_conta se fornecido
         if id_conta:
             df_contas = df_contas[df_contas["id_conta"] == id_conta]
             if df_contas.empty:
                 st.warning(f"Conta com ID {id_conta} não encontrada no banco de dados.")
-                return None, None, None, None
+                return CONTEXTO_VAZIO
 
         # Usar as contas obtidas diretamente do banco de dados
         contas_cliente = df_contas
 
     except Exception as e:
         st.error(f"Erro ao obter investimentos: {e}")
-        return None, None, None, None
+        return CONTEXTO_VAZIO
 
-    # Lista para armazenar todos os investimentos
-    investimentos = []
+    # Carregar de uma só vez os investimentos, fundos, criptos e ações de todas as contas
+    carteira = get_carteira(ids_conta=contas_cliente["id_conta"].tolist())
 
-    # Armazenar o perfil do cliente
+    # Perfil de investimento do cliente: o do primeiro investimento da última
+    # conta (na ordem das contas) que possui investimentos
     perfil_cliente = "CONSERVADOR"
+    perfis = contas_cliente["id_conta"].map(
+        carteira["investimentos"]
+        .drop_duplicates("id_conta")
+        .set_index("id_conta")["perfil_invest"]
+    ).dropna()
+    if not perfis.empty:
+        perfil_cliente = perfis.iloc[-1]
+
+    # Cotações de todas as criptos e ações da carteira: do snapshot publicado pelo
+    # atualizador em segundo plano (apenas as que não passaram da idade máxima) e,
+    # para os símbolos ausentes ou antigos, do cache compartilhado (no máximo uma
+    # requisição)
+    simbolos = set(simbolos_da_carteira(carteira["criptos"], carteira["acoes"]))
+    snapshot = atualizador_cotacoes.snapshot()
+    cotacoes_snapshot, cambio_snapshot = precos_validos(snapshot)
+    cotacoes = {s: cotacoes_snapshot[s] for s in simbolos if s in cotacoes_snapshot}
+    cotacoes.update(cotacoes_atuais(simbolos - set(cotacoes)))
+
+    # Sem taxa recente no snapshot, usa o cache de câmbio (get_usdbrl_rate)
+    taxa_usdbrl = cambio_snapshot.get("USDBRL=X")
+    if taxa_usdbrl is None and not carteira["criptos"].empty:
+        taxa_usdbrl = get_usdbrl_rate()
+
+    # Avaliar todas as posições ativas de uma vez
+    avaliada = avaliar_posicoes(
+        carteira["fundos"],
+        carteira["criptos"],
+        carteira["acoes"],
+        cotacoes,
+        taxa_usdbrl or 0.0,
+    )
+    df_investimentos = avaliada.investimentos
 
-    # Para cada conta do cliente
-    for _, conta in contas_cliente.iterrows():
-        # Obter os investimentos da conta diretamente do banco de dados
-        investimentos_conta = get_investimentos_by_id_conta(conta["id_conta"])
-
-        if investimentos_conta.empty:
-            continue
-
-        # Perfil de investimento do cliente para esta conta
-        perfil_cliente = investimentos_conta.iloc[0]["perfil_invest"]
-
-        # Para cada investimento vinculado à conta
-        for _, inv in investimentos_conta.iterrows():
-            id_investimento = inv["id_investimento"]
-
-            # Obter todos os fundos vinculados a este ID de investimento diretamente do banco de dados
-            fundos = get_fundos_by_id_investimento(id_investimento)
-
-            # Processar cada fundo individualmente
-            for _, fundo in fundos.iterrows():
-                # Verificar se o investimento está ativo
-                data_enc = fundo.get("data_encerramento", None)
-                ativo = True
-
-                if pd.notna(data_enc):
-                    data_enc = pd.to_datetime(data_enc)
-                    ativo = data_enc > datetime.now()
-
-                if ativo:
-                    # Calcular valor atual com juros compostos
-                    valor_investido = fundo["valor_investido"]
-                    rentabilidade_mensal = fundo["rentabilidade"]
-                    data_aplicacao = pd.to_datetime(fundo["data_aplicacao"])
-
-                    # Número de meses desde a aplicação
-                    hoje = datetime.now()
-                    meses_decorridos = (
-                        (hoje.year - data_aplicacao.year) * 12
-                        + hoje.month
-                        - data_aplicacao.month
-                    )
-
-                    # Cálculo de juros compostos
-                    valor_atual = (
-                        valor_investido * (1 + rentabilidade_mensal) ** meses_decorridos
-                    )
-
-                    # Usar id_fundo em vez de id_investimento
-                    investimentos.append(
-                        {
-                            "id": fundo["id_fundo"],
-                            "nome": fundo["nome"],
-                            "tipo": "Fundo",
-                            "valor_investido": valor_investido,
-                            "valor_atual": valor_atual,
-                            "perfil_risco": fundo["perfil_risco"],
-                            "rentabilidade": rentabilidade_mensal,
-                            "data_aplicacao": fundo["data_aplicacao"],
-                        }
-                    )
-
-            # Obter todas as criptos vinculadas a este ID de investimento diretamente do banco de dados
-            criptos = get_criptos_by_id_investimento(id_investimento)
-
-            # Processar cada cripto individualmente
-            for _, cripto in criptos.iterrows():
-                # Verificar se o investimento está ativo
-                data_enc = cripto.get("data_encerramento", None)
-                ativo = True
-
-                if pd.notna(data_enc):
-                    data_enc = pd.to_datetime(data_enc)
-                    ativo = data_enc > datetime.now()
-
-                if ativo:
-                    # Criar um DataFrame temporário com esta criptomoeda para atualizar o preço
-                    cripto_temp_df = pd.DataFrame([cripto])
-
-                    # Atualizar preços usando a função get_current_prices
-                    atualizado_df = get_current_prices(cripto_temp_df)
-
-                    # Extrair informações do DataFrame atualizado
-                    valor_investido = atualizado_df.iloc[0]["valor_investido_br"]
-                    preco_compra = atualizado_df.iloc[0]["preco_compra_br"]
-                    preco_atual = atualizado_df.iloc[0]["preco_atual_br"]
-
-                    # Calcular valor atual baseado na diferença de preço
-                    if preco_compra > 0:
-                        valor_atual = (valor_investido / preco_compra) * preco_atual
-                    else:
-                        valor_atual = (
-                            valor_investido  # Fallback se preço de compra for zero
-                        )
-
-                    # Calcular rentabilidade baseada na variação de preço
-                    rentabilidade = (
-                        (preco_atual / preco_compra) - 1 if preco_compra > 0 else 0
-                    )
-
-                    investimentos.append(
-                        {
-                            "id": cripto["id_cripto"],
-                            "nome": cripto["nome"],
-                            "tipo": "Cripto",
-                            "valor_investido": valor_investido,
-                            "valor_atual": valor_atual,
-                            "perfil_risco": cripto["perfil_risco"],
-                            "rentabilidade": rentabilidade,
-                            "data_aplicacao": cripto["data_aplicacao"],
-                        }
-                    )
-
-            # Obter todas as ações vinculadas a este ID de investimento diretamente do banco de dados
-            acoes = get_acoes_by_id_investimento(id_investimento)
-
-            # Processar cada ação individualmente
-            for _, acao in acoes.iterrows():
-                # Verificar se o investimento está ativo
-                data_enc = acao.get("data_encerramento", None)
-                ativo = True
+    if df_investimentos.empty:
+        return CONTEXTO_VAZIO._replace(perfil_cliente=perfil_cliente)
+
+    # Alocação atual por perfil de risco, pelo valor investido e pelo valor atual
+    alocacao_atual_investido = calcular_alocacao(df_investimentos, "valor_investido")
+    alocacao_atual = calcular_alocacao(df_investimentos, "valor_atual")
+
+    return ContextoCarteira(
+        investimentos=df_investimentos,
+        alocacao_atual=alocacao_atual,
+        perfil_cliente=perfil_cliente,
+        alocacao_atual_investido=alocacao_atual_investido,
+        fundos=avaliada.fundos,
+        criptos=avaliada.criptos,
+        acoes=avaliada.acoes,
+        # Todas as posições, inclusive as encerradas: a evolução do patrimônio conta
+        # cada uma no período em que esteve aplicada
+        posicoes={tipo: carteira[tipo] for tipo in ("fundos", "criptos", "acoes")},
+        snapshot_cotacoes=snapshot,
+        sem_cotacao=avaliada.sem_cotacao,
+    )
 
-                if pd.notna(data_enc):
-                    data_enc = pd.to_datetime(data_enc)
-                    ativo = data_enc > datetime.now()
 
-                if ativo:
-                    # Criar um DataFrame temporário com esta ação para atualizar o preço
-                    acao_temp_df = pd.DataFrame([acao])
+def carteira_em_cache(id_conta):
+    """Retorna a carteira guardada na sessão para a conta, ou None se ausente ou expirada."""
+    carteira = st.session_state.get("carteiras", {}).get(id_conta)
+    if carteira is None or time.monotonic() - carteira.instante >= TTL_CARTEIRA_SESSAO:
+        return None
+    return carteira
 
-                    # Atualizar preços usando a função get_current_prices_acoes
-                    atualizado_df = get_current_prices_acoes(acao_temp_df)
 
-                    # Extrair informações do DataFrame atualizado
-                    quantidade = atualizado_df.iloc[0]["quantidade"]
-                    preco_inicial = atualizado_df.iloc[0]["preco_inicial"]
-                    preco_atual = atualizado_df.iloc[0]["preco_atual_br"]
+def obter_carteira_sessao(id_conta):
+    """
+    Retorna a carteira da conta guardada na sessão, carregando-a se necessário.
 
-                    # Calcular valor investido e valor atual
-                    valor_investido = quantidade * preco_inicial
-                    valor_atual = quantidade * preco_atual
+    A carteira é carregada (API, banco e cotações) apenas na primeira execução,
+    depois de `CARTEIRA_TTL_SESSAO` segundos ou após `invalidar_carteira`. Cargas
+    que falharam ou sem investimentos não são guardadas.
 
-                    # Calcular rentabilidade baseada na variação de preço
-                    rentabilidade = (
-                        (preco_atual / preco_inicial) - 1 if preco_inicial > 0 else 0
-                    )
+    Returns:
+        CarteiraSessao: Contexto da carteira e horário em que foi carregada.
+    """
+    carteira = carteira_em_cache(id_conta)
+    if carteira is not None:
+        return carteira
+
+    carteira = CarteiraSessao(
+        contexto=obter_investimentos_cliente(id_conta),
+        carregada_em=datetime.now(),
+        instante=time.monotonic(),
+    )
+    carteiras = st.session_state.setdefault("carteiras", {})
+    if carteira.contexto.investimentos is not None:
+        carteiras[id_conta] = carteira
+    else:
+        carteiras.pop(id_conta, None)
+    return carteira
 
-                    investimentos.append(
-                        {
-                            "id": acao["id_acoes"],
-                            "nome": acao["nome"],
-                            "tipo": "Ações",
-                            "valor_investido": valor_investido,
-                            "valor_atual": valor_atual,
-                            "perfil_risco": acao["perfil_risco"],
-                            "rentabilidade": rentabilidade,
-                            "data_aplicacao": acao["data_aplicacao"],
-                        }
-                    )
 
-    # Criar DataFrame com os investimentos
-    df_investimentos = pd.DataFrame(investimentos)
+def obter_patrimonio_sessao(id_conta, posicoes):
+    """
+    Retorna a evolução diária do patrimônio da conta, calculando-a se necessário.
 
-    if df_investimentos.empty:
-        return None, None, perfil_cliente, None
+    A série lê o histórico inteiro dos ativos da carteira, então é calculada apenas
+    pela aba "Evolução" e guardada na sessão separadamente da carteira: recargas da
+    carteira não a recalculam enquanto o dia, as posições e os históricos do ETL
+    forem os mesmos.
 
-    # Calcular alocação atual por perfil de risco baseado no valor investido
-    alocacao_atual_investido = (
-        df_investimentos.groupby("perfil_risco")["valor_investido"].sum().reset_index()
-    )
-    total_investido = alocacao_atual_investido["valor_investido"].sum()
-    alocacao_atual_investido["percentual"] = (
-        alocacao_atual_investido["valor_investido"] / total_investido
-    ) * 100
+    Args:
+        id_conta (int): ID da conta.
+        posicoes (dict): DataFrames 'fundos', 'criptos' e 'acoes' de `get_carteira`.
 
-    # Calcular alocação atual por perfil de risco baseado no valor atual
-    alocacao_atual = (
-        df_investimentos.groupby("perfil_risco")["valor_atual"]
-        .sum()
-        .reset_index()
-        .rename(columns={"valor_atual": "valor_investido"})
+    Returns:
+        DataFrame: Série de `carteira.nav.serie_patrimonio`.
+    """
+    from carteira.nav import serie_patrimonio
+    from etl.armazenamento import versao_historico
+
+    chave = (
+        datetime.now().date(),
+        tuple(
+            int(pd.util.hash_pandas_object(df, index=False).sum()) if not df.empty else 0
+            for df in posicoes.values()
+        ),
+        tuple(versao_historico(classe) for classe in ("acoes", "criptomoedas", "cambio")),
     )
-    total_atual = alocacao_atual["valor_investido"].sum()
-    alocacao_atual["percentual"] = (
-        alocacao_atual["valor_investido"] / total_atual
-    ) * 100
-
-    return df_investimentos, alocacao_atual, perfil_cliente, alocacao_atual_investido
-
-
-# Função para calcular a alocação ideal com base no perfil
-def calcular_alocacao_ideal(perfil, total_investido):
-    if perfil == "CONSERVADOR":
-        return pd.DataFrame(
-            {
-                "perfil_risco": ["BAIXO", "MODERADO", "ALTO"],
-                "percentual": [70, 30, 0],
-                "valor_investido": [total_investido * 0.7, total_investido * 0.3, 0],
-            }
-        )
-    elif perfil == "MODERADO":
-        return pd.DataFrame(
-            {
-                "perfil_risco": ["BAIXO", "MODERADO", "ALTO"],
-                "percentual": [40, 50, 10],
-                "valor_investido": [
-                    total_investido * 0.4,
-                    total_investido * 0.5,
-                    total_investido * 0.1,
-                ],
-            }
-        )
-    else:  # ARROJADO
-        return pd.DataFrame(
-            {
-                "perfil_risco": ["BAIXO", "MODERADO", "ALTO"],
-                "percentual": [20, 30, 50],
-                "valor_investido": [
-                    total_investido * 0.2,
-                    total_investido * 0.3,
-                    total_investido * 0.5,
-                ],
-            }
+    patrimonios = st.session_state.setdefault("patrimonios", {})
+    patrimonio = patrimonios.get(id_conta)
+    if patrimonio is None or patrimonio.chave != chave:
+        patrimonio = PatrimonioSessao(
+            chave=chave,
+            serie=serie_patrimonio(posicoes["fundos"], posicoes["criptos"], posicoes["acoes"]),
         )
+        patrimonios[id_conta] = patrimonio
+    return patrimonio.serie
+
+
+def invalidar_carteira(id_conta=None):
+    """Descarta a carteira guardada na sessão para a conta (ou todas, se id_conta for None)."""
+    carteiras = st.session_state.get("carteiras", {})
+    if id_conta is None:
+        carteiras.clear()
+    else:
+        carteiras.pop(id_conta, None)
 
 
 # Função para criar o gráfico de barras comparativo
@@ -522,10 +475,64 @@ def criar_grafico_pizza_ideal(alocacao_ideal):
     return fig
 
 
+# Função para criar o gráfico da evolução do patrimônio
+def criar_grafico_patrimonio(df_patrimonio):
+    fig = go.Figure()
+
+    # Áreas empilhadas com o valor de cada tipo de investimento
+    for coluna, nome, cor in [
+        ("fundos", "Fundos", COLORS["primary"]),
+        ("criptos", "Criptos", COLORS["secondary"]),
+        ("acoes", "Ações", COLORS["accent"]),
+    ]:
+        fig.add_trace(
+            go.Scatter(
+                x=df_patrimonio.index,
+                y=df_patrimonio[coluna],
+                name=nome,
+                mode="lines",
+                stackgroup="patrimonio",
+                line=dict(width=0.5, color=cor),
+            )
+        )
+
+    # Linha do valor aplicado nas posições abertas
+    fig.add_trace(
+        go.Scatter(
+            x=df_patrimonio.index,
+            y=df_patrimonio["investido"],
+            name="Valor Investido",
+            mode="lines",
+            line=dict(color=COLORS["text"], dash="dash"),
+        )
+    )
+
+    fig.update_layout(
+        title="Evolução do Patrimônio",
+        xaxis_title="Data",
+        yaxis_title="Valor (R$)",
+        template="plotly_dark",
+        plot_bgcolor=COLORS["background_graph"],
+        paper_bgcolor=COLORS["background"],
+        font=dict(color=COLORS["text"]),
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        hovermode="x unified",
+        height=450,
+    )
+
+    return fig
+
+
 # Interface de usuário
 if "token" not in st.session_state:
     st.session_state.usuario_autenticado = False
     st.session_state.dados_usuario = None
+elif st.session_state.get("dados_usuario") and carteira_em_cache(
+    st.session_state.dados_usuario["id_conta"]
+):
+    # Token validado na última carga da carteira, que ainda está na sessão:
+    # a validação é refeita junto com a próxima carga
+    pass
 else:
     # Se já temos um token, verificar se ainda é válido obtendo os dados do usuário
     dados_usuario = obter_dados_usuario()
@@ -540,6 +547,7 @@ else:
         # Token inválido ou expirado
         st.session_state.usuario_autenticado = False
         st.session_state.dados_usuario = None
+        invalidar_carteira()
         if "token" in st.session_state:
             del st.session_state.token
 
@@ -565,6 +573,7 @@ if not st.session_state.usuario_autenticado:
                     if dados_usuario["autenticado"]:
                         st.session_state.usuario_autenticado = True
                         st.session_state.dados_usuario = dados_usuario
+                        invalidar_carteira()
                         st.success(f"Bem-vindo(a), {dados_usuario['nome']}!")
                         st.rerun()
                     else:
@@ -581,6 +590,7 @@ else:
     if st.sidebar.button("Sair"):
         st.session_state.usuario_autenticado = False
         st.session_state.dados_usuario = None
+        invalidar_carteira()
         if "token" in st.session_state:
             del st.session_state.token
         st.rerun()
@@ -601,53 +611,76 @@ else:
     #     else:
     #         st.session_state.debug_mode = False
 
-    # # Botão para recarregar os dados
-    # if st.sidebar.button("🔄 Atualizar Dados"):
-    #     st.cache_data.clear()
-    #     st.rerun()
-
-    # Obter investimentos do cliente usando o ID da conta
-    df_investimentos, alocacao_atual, perfil_cliente, alocacao_atual_investido = (
-        obter_investimentos_cliente(st.session_state.dados_usuario["id_conta"])
+    # Botão para recarregar os dados: descarta apenas a carteira desta conta, antes
+    # da reexecução (o callback roda antes do script)
+    st.sidebar.button(
+        "🔄 Atualizar Dados",
+        on_click=invalidar_carteira,
+        args=(st.session_state.dados_usuario["id_conta"],),
     )
 
+    # Inicia (uma vez por processo) a atualização das cotações em segundo plano
+    from etl.atualizador_cotacoes import iniciar_atualizador, idade_snapshot
+
+    iniciar_atualizador()
+
+    # Obter investimentos do cliente usando o ID da conta (guardados na sessão)
+    carteira_sessao = obter_carteira_sessao(st.session_state.dados_usuario["id_conta"])
+    contexto = carteira_sessao.contexto
+    df_investimentos = contexto.investimentos
+    alocacao_atual = contexto.alocacao_atual
+    perfil_cliente = contexto.perfil_cliente
+    alocacao_atual_investido = contexto.alocacao_atual_investido
+
     # Exibir informações de debug
     if st.session_state.get("debug_mode", False):
         st.sidebar.info(
             f"Buscando investimentos para a conta ID: {st.session_state.dados_usuario['id_conta']}"
         )
 
+        # Tempo das consultas ao banco e uso do pool de conexões
+        from db.db import estatisticas_pool
+        from db.metricas import registro_consultas
+
+        with st.sidebar.expander("Consultas ao banco"):
+            st.dataframe(registro_consultas.estatisticas(), hide_index=True)
+            st.json(estatisticas_pool())
+
     if df_investimentos is None:
         st.warning("Você não possui investimentos ativos.")
     else:
         # Mostrar o perfil de investimento do cliente
         st.info(f"Seu perfil de investimento: **{perfil_cliente}**")
 
+        # Idade das cotações do snapshot usado na carga da carteira (não da carga em si)
+        snapshot_cotacoes = contexto.snapshot_cotacoes
+        idade_cotacoes = idade_snapshot(snapshot_cotacoes)
+        if idade_cotacoes is None:
+            st.caption("Cotações obtidas na carga da carteira; a atualização automática está em andamento.")
+        else:
+            st.caption(
+                f"Cotações atualizadas há {idade_cotacoes:.0f}s "
+                f"(versão {snapshot_cotacoes.versao})."
+            )
+        if contexto.sem_cotacao:
+            st.warning(
+                f"Sem cotação para {', '.join(contexto.sem_cotacao)}: esses ativos estão "
+                "avaliados pelo preço de compra."
+            )
+        st.caption(
+            f"Posição em {carteira_sessao.carregada_em:%d/%m/%Y %H:%M:%S}. "
+            f"Os dados são recarregados a cada {TTL_CARTEIRA_SESSAO / 60:.0f} min "
+            "ou pelo botão 🔄 Atualizar Dados."
+        )
+
         # Calcular total investido usando os mesmos valores da aba de detalhes
         # Vamos primeiro obter os dados para as tabelas da aba detalhes
         # Fundos
         df_fundos_tab = df_investimentos[df_investimentos["tipo"] == "Fundo"].copy()
 
-        # Criptomoedas
-        _, _, _, _, _, df_cripto_original, df_acoes_original = get_all_dataframes()
-        ids_cripto = df_investimentos[df_investimentos["tipo"] == "Cripto"][
-            "id"
-        ].tolist()
-        df_cripto_tab = df_cripto_original[
-            df_cripto_original["id_cripto"].isin(ids_cripto)
-        ].copy()
-        from etl.criptomoedas import get_current_prices
-
-        cripto_df_tab = get_current_prices(df_cripto_tab.copy(deep=True))
-
-        # Ações
-        ids_acoes = df_investimentos[df_investimentos["tipo"] == "Ações"]["id"].tolist()
-        df_acoes_tab = df_acoes_original[
-            df_acoes_original["id_acoes"].isin(ids_acoes)
-        ].copy()
-        from etl.acoes import get_current_prices_acoes
-
-        acoes_df_tab = get_current_prices_acoes(df_acoes_tab.copy(deep=True))
+        # Criptomoedas e ações já cotadas no contexto da página
+        cripto_df_tab = contexto.criptos
+        acoes_df_tab = contexto.acoes
 
         # Agora somamos os valores investidos de cada tipo de investimento
         total_fundos = df_fundos_tab["valor_investido"].sum()
@@ -691,7 +724,7 @@ else:
         alocacao_ideal = calcular_alocacao_ideal(perfil_cliente, total_investido)
 
         # Criar abas para os diferentes gráficos e tabelas
-        tab1, tab2, tab3 = st.tabs(["Comparativo", "Composição", "Detalhes"])
+        tab1, tab2, tab3, tab4 = st.tabs(["Comparativo", "Composição", "Detalhes", "Evolução"])
 
         with tab1:
             # Calcular alocação atual baseada nos valores atuais - agrupar por perfil_risco
@@ -1174,36 +1207,12 @@ else:
             # Adicionar lógica para gerar 3 tabelas quando selecionado 'todos' e atualizar individualmente
             if tipo_filtro == "Todos":
                 df_fundos = df_investimentos[df_investimentos["tipo"] == "Fundo"]
-                # Carregar diretamente do banco para ter acesso a todas as colunas necessárias
-                _, _, _, _, _, df_cripto_original, df_acoes_original = (
-                    get_all_dataframes()
-                )
-
-                # Filtrar apenas as criptomoedas relevantes baseado nos investimentos
-                ids_cripto = df_investimentos[df_investimentos["tipo"] == "Cripto"][
-                    "id"
-                ].tolist()
-                df_cripto = df_cripto_original[
-                    df_cripto_original["id_cripto"].isin(ids_cripto)
-                ].copy()
+                # Criptomoedas do cliente, já cotadas no contexto da página
+                df_cripto = contexto.criptos
 
-                # Calcular meses decorridos para cada investimento
-                # Criar uma cópia explícita para evitar SettingWithCopyWarning
+                # O valor atual dos fundos (juros compostos pelos meses decorridos)
+                # já vem calculado no contexto da página
                 df_fundos = df_fundos.copy()
-                df_fundos.loc[:, "data_aplicacao"] = pd.to_datetime(
-                    df_fundos["data_aplicacao"]
-                )
-                hoje = datetime.now()
-                df_fundos.loc[:, "meses_decorridos"] = df_fundos[
-                    "data_aplicacao"
-                ].apply(lambda x: (hoje.year - x.year) * 12 + (hoje.month - x.month))
-
-                # Cálculo usando juros compostos, exatamente igual ao da função obter_investimentos_cliente()
-                df_fundos.loc[:, "valor_atual"] = df_fundos.apply(
-                    lambda x: x["valor_investido"]
-                    * (1 + x["rentabilidade"]) ** x["meses_decorridos"],
-                    axis=1,
-                )
 
                 # Calcular variação percentual
                 df_fundos.loc[:, "variacao"] = (
@@ -1248,19 +1257,10 @@ else:
                     )
                 with col2:
                     st.write("Criptos")
-                    # Importar a função get_current_prices para atualizar os preços
-                    from etl.criptomoedas import get_current_prices
-
                     # Criar uma cópia segura do DataFrame
                     cripto_df = df_cripto.copy(deep=True)
 
-                    # Atualizar preços e calcular variações
-                    cripto_df = get_current_prices(cripto_df)
-
-                    # Calcular valor atual usando .loc para evitar SettingWithCopyWarning
-                    cripto_df.loc[:, "valor_atual"] = (
-                        cripto_df["valor_investido_br"] / cripto_df["preco_compra_br"]
-                    ) * cripto_df["preco_atual_br"]
+                    # Valor atual da avaliação (o valor investido, para criptos sem cotação)
                     tabela_cripto = cripto_df[
                         [
                             "nome",
@@ -1290,27 +1290,10 @@ else:
                     )
                 with col3:
                     st.write("Ações")
-                    # Filtrar apenas as ações relevantes baseado nos investimentos
-                    ids_acoes = df_investimentos[df_investimentos["tipo"] == "Ações"][
-                        "id"
-                    ].tolist()
-                    df_acoes = df_acoes_original[
-                        df_acoes_original["id_acoes"].isin(ids_acoes)
-                    ].copy()
+                    # Ações do cliente, já cotadas no contexto da página
+                    acoes_df = contexto.acoes.copy(deep=True)
 
-                    # Importar a função get_current_prices_acoes para atualizar os preços
-                    from etl.acoes import get_current_prices_acoes
-
-                    # Criar uma cópia segura do DataFrame
-                    acoes_df = df_acoes.copy(deep=True)
-
-                    # Atualizar preços e calcular variações
-                    acoes_df = get_current_prices_acoes(acoes_df)
-
-                    # Calcular valor atual
-                    acoes_df.loc[:, "valor_atual"] = (
-                        acoes_df["quantidade"] * acoes_df["preco_atual_br"]
-                    )
+                    # Valor atual da avaliação (pelo preço de compra, para ações sem cotação)
 
                     # Selecionar colunas para exibição
                     tabela_acoes = acoes_df[
@@ -1356,29 +1339,13 @@ else:
 
                     # Se o tipo for Cripto, usar a mesma lógica da aba Detalhes
                     if tipo_filtro == "Cripto":
-                        # Carregar diretamente do banco para ter acesso a todas as colunas necessárias
-                        _, _, _, _, _, df_cripto_original, _ = get_all_dataframes()
-
-                        # Filtrar apenas as criptomoedas relevantes baseado nos investimentos
+                        # Criptomoedas filtradas, já cotadas no contexto da página
                         ids_cripto = df_filtrado["id"].tolist()
-                        df_cripto = df_cripto_original[
-                            df_cripto_original["id_cripto"].isin(ids_cripto)
+                        cripto_df = contexto.criptos[
+                            contexto.criptos["id_cripto"].isin(ids_cripto)
                         ].copy()
 
-                        # Importar a função get_current_prices para atualizar os preços
-                        from etl.criptomoedas import get_current_prices
-
-                        # Criar uma cópia segura do DataFrame
-                        cripto_df = df_cripto.copy(deep=True)
-
-                        # Atualizar preços e calcular variações
-                        cripto_df = get_current_prices(cripto_df)
-
-                        # Calcular valor atual usando .loc para evitar SettingWithCopyWarning
-                        cripto_df.loc[:, "valor_atual"] = (
-                            cripto_df["valor_investido_br"]
-                            / cripto_df["preco_compra_br"]
-                        ) * cripto_df["preco_atual_br"]
+                        # Valor atual da avaliação (o valor investido, para criptos sem cotação)
 
                         # Selecionar colunas para exibição
                         tabela_cripto = cripto_df[
@@ -1416,7 +1383,8 @@ else:
                                 "Preço Atual (BR)": "R$ {:.2f}",
                                 "Variação Percentual": "{:.2f}%",
                                 "Valor Atual (BR)": "R$ {:.2f}",
-                            }
+                            },
+                            na_rep="Sem cotação",
                         )
 
                         # Exibir a tabela formatada
@@ -1431,28 +1399,13 @@ else:
 
                     # Se o tipo for Ações, usar a mesma lógica da aba Detalhes
                     elif tipo_filtro == "Ações":
-                        # Carregar diretamente do banco para ter acesso a todas as colunas necessárias
-                        _, _, _, _, _, _, df_acoes_original = get_all_dataframes()
-
-                        # Filtrar apenas as ações relevantes baseado nos investimentos
+                        # Ações filtradas, já cotadas no contexto da página
                         ids_acoes = df_filtrado["id"].tolist()
-                        df_acoes = df_acoes_original[
-                            df_acoes_original["id_acoes"].isin(ids_acoes)
+                        acoes_df = contexto.acoes[
+                            contexto.acoes["id_acoes"].isin(ids_acoes)
                         ].copy()
 
-                        # Importar a função get_current_prices_acoes para atualizar os preços
-                        from etl.acoes import get_current_prices_acoes
-
-                        # Criar uma cópia segura do DataFrame
-                        acoes_df = df_acoes.copy(deep=True)
-
-                        # Atualizar preços e calcular variações
-                        acoes_df = get_current_prices_acoes(acoes_df)
-
-                        # Calcular valor atual
-                        acoes_df.loc[:, "valor_atual"] = (
-                            acoes_df["quantidade"] * acoes_df["preco_atual_br"]
-                        )
+                        # Valor atual da avaliação (pelo preço de compra, para ações sem cotação)
 
                         # Selecionar colunas para exibição
                         tabela_acoes = acoes_df[
@@ -1492,7 +1445,8 @@ else:
                                 "Preço Atual (BR)": "R$ {:.2f}",
                                 "Variação Percentual": "{:.2f}%",
                                 "Valor Atual (BR)": "R$ {:.2f}",
-                            }
+                            },
+                            na_rep="Sem cotação",
                         )
 
                         # Exibir a tabela formatada
@@ -1607,5 +1561,23 @@ else:
                     # Exibir tabela
                     st.dataframe(df_exibicao, use_container_width=True, hide_index=True)
 
+        with tab4:
+            # Série diária calculada só nesta aba (guardada na sessão à parte da carteira)
+            with st.spinner("Calculando a evolução do patrimônio..."):
+                df_patrimonio = obter_patrimonio_sessao(
+                    st.session_state.dados_usuario["id_conta"], contexto.posicoes
+                )
+            if df_patrimonio.empty:
+                st.info("Não há histórico de preços para as posições da carteira.")
+            else:
+                st.plotly_chart(
+                    criar_grafico_patrimonio(df_patrimonio), use_container_width=True
+                )
+                st.caption(
+                    "Valores diários de cada posição, da aplicação ao encerramento (resgates "
+                    "e vendas saem da série na data de encerramento), pelos preços de fechamento do histórico do ETL (criptos convertidas pelo "
+                    "dólar do dia) e pelos juros compostos dos fundos."
+                )
+
 # Adicionar o footer
 add_footer()
@@ -4,6 +4,7 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import os
 from etl.cambio import obter_variacao_cambio, baixar_historico_cambio
+from etl.armazenamento import ler_historico, listar_simbolos
 from style.style_config import apply_custom_style, COLORS, add_footer
 
 # Aplicar estilo customizado
@@ -16,19 +17,15 @@ st.title("Câmbio em relação ao real(R$)")
 #     st.warning('Baixando histórico do câmbio... Isso pode levar alguns minutos.')
 #     baixar_historico_cambio()
 
-# Obter caminho absoluto para o arquivo
-base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-historico_path = os.path.join(base_path, "results", "historico_cambio.csv")
-
-# Carregar dados históricos
-df_cambio = pd.read_csv(historico_path)
+# Carregar apenas a lista de moedas disponíveis (símbolo e nome)
+df_moedas = listar_simbolos("cambio")
 
 # Variável para armazenar o período selecionado
 if "periodo_analise" not in st.session_state:
     st.session_state.periodo_analise = "1y"
 
 # Criar dicionário de moedas (Nome -> Símbolo)
-moedas_dict = df_cambio.groupby('Nome_Moeda')['Simbolo'].first().to_dict()
+moedas_dict = df_moedas.groupby('Nome_Moeda')['Simbolo'].first().to_dict()
 
 # Campo de seleção da moeda usando o nome
 nome_moeda_selecionada = st.selectbox("Selecione uma moeda:", list(moedas_dict.keys()))
@@ -48,8 +45,8 @@ with col3:
     if st.button("Anual"):
         st.session_state.periodo_analise = "1y"
 
-# Filtrar dados da moeda selecionada
-dados_moeda = df_cambio[df_cambio["Simbolo"] == moeda_selecionada].copy()
+# Carregar apenas o histórico da moeda selecionada
+dados_moeda = ler_historico("cambio", simbolos=[moeda_selecionada])
 dados_moeda["Data"] = pd.to_datetime(dados_moeda["Data"])
 dados_moeda = dados_moeda.sort_values("Data")
 
@@ -5,6 +5,7 @@ from datetime import datetime, timedelta
 import numpy as np
 import os
 from etl.acoes import obter_melhores_e_piores_acoes, baixar_historico_acoes
+from etl.armazenamento import ler_historico, listar_simbolos
 from style.style_config import apply_custom_style, COLORS, add_footer
 
 # Aplicar estilo customizado
@@ -12,12 +13,8 @@ apply_custom_style()
 
 st.title("Ações Brasileiras")
 
-# Obter caminho absoluto para o arquivo
-base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-historico_path = os.path.join(base_path, 'results', 'historico_acoes.csv')
-
-# Carregar dados históricos
-df_acoes = pd.read_csv(historico_path)
+# Carregar apenas a lista de ações disponíveis
+df_acoes = listar_simbolos('acoes')
 
 # Variável para armazenar o período selecionado
 if 'periodo_analise' not in st.session_state:
@@ -41,8 +38,8 @@ with col3:
     if st.button('Anual'):
         st.session_state.periodo_analise = '1y'
 
-# Filtrar dados da ação selecionada
-dados_acao = df_acoes[df_acoes['Simbolo'] == acao_selecionada].copy()
+# Carregar apenas o histórico da ação selecionada
+dados_acao = ler_historico('acoes', simbolos=[acao_selecionada])
 dados_acao['Data'] = pd.to_datetime(dados_acao['Data'])
 dados_acao = dados_acao.sort_values('Data')
 
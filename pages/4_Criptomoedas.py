@@ -4,6 +4,7 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import os
 from etl.criptomoedas import obter_melhores_e_piores_cripto, baixar_historico_cripto, get_usdbrl_rate
+from etl.armazenamento import ler_historico, listar_simbolos
 from style.style_config import apply_custom_style, COLORS, add_footer
 
 # Aplicar estilo customizado
@@ -16,12 +17,8 @@ st.title("Criptomoedas")
 #     st.warning('Baixando histórico das criptomoedas... Isso pode levar alguns minutos.')
 #     baixar_historico_cripto()
 
-# Obter caminho absoluto para o arquivo
-base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-historico_path = os.path.join(base_path, 'results', 'historico_criptomoedas.csv')
-
-# Carregar dados históricos
-df_cripto = pd.read_csv(historico_path)
+# Carregar apenas a lista de criptomoedas disponíveis
+df_cripto = listar_simbolos('criptomoedas')
 
 # Variável para armazenar o período selecionado
 if 'periodo_analise' not in st.session_state:
@@ -45,8 +42,8 @@ with col3:
     if st.button('Anual'):
         st.session_state.periodo_analise = '1y'
 
-# Filtrar dados da criptomoeda selecionada
-dados_cripto = df_cripto[df_cripto['Simbolo'] == cripto_selecionada].copy()
+# Carregar apenas o histórico da criptomoeda selecionada
+dados_cripto = ler_historico('criptomoedas', simbolos=[cripto_selecionada])
 dados_cripto['Data'] = pd.to_datetime(dados_cripto['Data'])
 dados_cripto = dados_cripto.sort_values('Data')
 
@@ -4,6 +4,7 @@ import plotly.graph_objects as go
 from datetime import datetime
 import os
 from style.style_config import apply_custom_style, COLORS, add_footer
+from etl.armazenamento import ler_dados_economicos
 import numpy as np
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_absolute_percentage_error, mean_squared_error
@@ -73,42 +74,20 @@ def carregar_dados():
     base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     dados_path = os.path.join(base_path, "results", "dados_economicos.csv")
 
-    # Carregar dados
-    df = pd.read_csv(dados_path, parse_dates=["Date"])
+    # Carregar dados (formato longo: uma linha por data e indicador, na
+    # frequência original de cada série)
+    df = ler_dados_economicos(dados_path)
 
     # Criar DataFrames individuais para cada indicador
-    selic_df = df[["Date", "SELIC"]].copy()
-    selic_df = selic_df.dropna().reset_index(drop=True)
-    selic_df["SELIC"] = pd.to_numeric(selic_df["SELIC"], errors="coerce")
-
-    ipca_df = df[["Date", "IPCA"]].copy()
-    ipca_df = ipca_df.dropna().reset_index(drop=True)
-    ipca_df["IPCA"] = pd.to_numeric(ipca_df["IPCA"], errors="coerce")
-
-    igpm_df = df[["Date", "IGP-M"]].copy()
-    igpm_df = igpm_df.dropna().reset_index(drop=True)
-    igpm_df["IGP-M"] = pd.to_numeric(igpm_df["IGP-M"], errors="coerce")
-
-    inpc_df = df[["Date", "INPC"]].copy()
-    inpc_df = inpc_df.dropna().reset_index(drop=True)
-    inpc_df["INPC"] = pd.to_numeric(inpc_df["INPC"], errors="coerce")
-
-    cdi_df = df[["Date", "CDI"]].copy()
-    cdi_df = cdi_df.dropna().reset_index(drop=True)
-    cdi_df["CDI"] = pd.to_numeric(cdi_df["CDI"], errors="coerce")
-
-    pib_df = df[["Date", "PIB_MENSAL"]].copy()
-    pib_df = pib_df.dropna().reset_index(drop=True)
-    pib_df["PIB_MENSAL"] = pd.to_numeric(pib_df["PIB_MENSAL"], errors="coerce")
+    series = {
+        nome: grupo[["Date", "Valor"]].rename(columns={"Valor": nome}).reset_index(drop=True)
+        for nome, grupo in df.groupby("Indicador", sort=False)
+    }
 
     # Criar dicionário com todos os dataframes
     dataframes = {
-        "SELIC": selic_df,
-        "IPCA": ipca_df,
-        "IGP-M": igpm_df,
-        "INPC": inpc_df,
-        "CDI": cdi_df,
-        "PIB_MENSAL": pib_df,
+        nome: series.get(nome, pd.DataFrame(columns=["Date", nome]))
+        for nome in ["SELIC", "IPCA", "IGP-M", "INPC", "CDI", "PIB_MENSAL"]
     }
 
     return dataframes